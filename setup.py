@@ -54,7 +54,6 @@ setup(
     tests_require=TESTS_REQUIRE,
     install_requires=[
         'setuptools',
-        'collective.monkeypatcher',
         'gevent',
         'nti.analytics',
         'nti.app.assessment',
@@ -73,6 +72,9 @@ setup(
     ],
     extras_require={
         'test': TESTS_REQUIRE,
+        'layout': [
+            'numpy',
+        ],
         'docs': [
             'Sphinx',
             'repoze.sphinx.autointerface',
@@ -10,6 +10,9 @@ from __future__ import absolute_import
  
 import csv
 import six
+import time
+from functools import partial
+from bisect import bisect_right
 from io import BytesIO
 from datetime import datetime
 from datetime import timedelta
@@ -18,6 +21,8 @@ from collections import OrderedDict
 
 from pyramid import httpexceptions as hexc
 
+from pyramid.response import FileResponse
+
 from pyramid.view import view_config
 
 from requests.structures import CaseInsensitiveDict
@@ -26,19 +31,52 @@ from zope import component
 
 from zope.cachedescriptors.property import Lazy
 
+from zope.component.hooks import getSite
+
+from zope.intid.interfaces import IIntIds
+
 from nti.app.externalization.error import raise_json_error
 
+from nti.app.learning_network.aggregates import SurveyAggregate
+from nti.app.learning_network.aggregates import DEFAULT_CROSSTAB_BUCKETS
+
+from nti.app.learning_network.catalog import iter_catalog_entries
+
 from nti.app.learning_network.connections import get_connection_graphs
 
-from nti.analytics.users import get_user_record
+from nti.app.learning_network.filters import UserExclusionFilter
+
+from nti.app.learning_network.jobs import JOB_SUCCESS
+
+from nti.app.learning_network.jobs import get_job_status
+from nti.app.learning_network.jobs import queue_export_job
+from nti.app.learning_network.jobs import get_job_output_path
+
+from nti.app.learning_network.render import get_graph_renderer
+
+from nti.app.learning_network.stats import STATS_BATCH_SIZE
+
+from nti.app.learning_network.stats import StatsWorkerPool
+
+from nti.app.learning_network.stats import iter_chunks
+from nti.app.learning_network.stats import get_schema_key
+from nti.app.learning_network.stats import get_source_schema
+from nti.app.learning_network.stats import get_stats_for_users
 
-from nti.analytics.boards import get_topic_views
-from nti.analytics.boards import get_forum_comments
+from nti.app.learning_network.counters import verify_counters
+from nti.app.learning_network.counters import update_view_counters
+from nti.app.learning_network.counters import get_stats_with_counters
 
-from nti.analytics.resource_tags import get_note_views
+from nti.app.learning_network.snapshots import get_stats_with_snapshots
 
-from nti.analytics.stats.interfaces import IStats
-from nti.analytics.stats.interfaces import IAnalyticsStatsSource
+from nti.app.learning_network.social import iter_social_edges
+
+from nti.app.learning_network.streams import create_view
+from nti.app.learning_network.streams import iter_in_transaction
+
+from nti.app.learning_network.surveys import get_course_survey_submissions
+
+from nti.app.learning_network.users import prefetch_users
 
 from nti.app.assessment.interfaces import IUsersCourseInquiry
 
@@ -53,84 +91,65 @@ from nti.contentfragments.interfaces import IPlainTextContentFragment
 
 from nti.contenttypes.courses.interfaces import ES_CREDIT
 
-from nti.contenttypes.courses.interfaces import ICourseCatalog
 from nti.contenttypes.courses.interfaces import ICourseInstance
 from nti.contenttypes.courses.interfaces import ICourseEnrollments
 from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
 
 from nti.dataserver import authorization as nauth
 
-from nti.dataserver.authorization_acl import has_permission
-
 from nti.dataserver.interfaces import IUser
 from nti.dataserver.interfaces import IDataserverFolder
 from nti.dataserver.interfaces import IEnumerableEntityContainer
 
-from nti.dataserver.users.interfaces import IUserProfile
-
 from nti.dataserver.users.users import User
 
 from nti.externalization.interfaces import LocatedExternalDict
 from nti.externalization.interfaces import StandardExternalFields
 
-from nti.learning_network.interfaces import IAccessStatsSource
-from nti.learning_network.interfaces import IOutcomeStatsSource
-from nti.learning_network.interfaces import IProductionStatsSource
-from nti.learning_network.interfaces import IInteractionStatsSource
-
-from nti.mailer.interfaces import IEmailAddressable
+from nti.externalization.representation import to_json_representation
+from nti.externalization.representation import to_json_representation_externalized
 
 from nti.ntiids.ntiids import find_object_with_ntiid
 
+ITEMS = StandardExternalFields.ITEMS
+TOTAL = StandardExternalFields.TOTAL
 ITEM_COUNT = StandardExternalFields.ITEM_COUNT
 
 STATS_VIEW_NAME = "LearningNetworkStats"
 CONNECTIONS_VIEW_NAME = "LearningNetworkConnections"
+VERIFY_COUNTERS_VIEW_NAME = "VerifyLearningNetworkCounters"
 SURVEY_STATS_VIEW_NAME = "SurveyLearningNetworkStats"
+EXPORT_JOB_STATUS_VIEW_NAME = "LearningNetworkExportStatus"
+EXPORT_JOB_DOWNLOAD_VIEW_NAME = "LearningNetworkExportDownload"
+
+#: The number of buffered bytes at which a streamed csv is flushed.
+STREAM_CHUNK_SIZE = 64 * 1024
 
 logger = __import__('logging').getLogger(__name__)
 
 
-def _get_stat_source(iface, user, course, timestamp=None, max_timestamp=None):
-    if course and timestamp and max_timestamp:
-        stats_source = component.queryMultiAdapter((user, course, timestamp, max_timestamp), 
-                                                   iface)
-    elif course and timestamp:
-        stats_source = component.queryMultiAdapter((user, course, timestamp),
-                                                   iface)
-    elif course:
-        stats_source = component.queryMultiAdapter((user, course), iface)
-    else:
-        stats_source = iface(user, None)
-    return stats_source
-
-
-def _get_subscribers(user, course):
-    return component.subscribers((user, course), IAnalyticsStatsSource)
-
-
-def _get_stats_for_user(user, course, timestamp=None,
-                        max_timestamp=None, exclude_outcome=False):
-    access_source = _get_stat_source(IAccessStatsSource, user, course, 
-                                     timestamp, max_timestamp)
-    prod_source = _get_stat_source(IProductionStatsSource, user, course, 
-                                   timestamp, max_timestamp)
-    social_source = _get_stat_source(IInteractionStatsSource, user, course, 
-                                     timestamp, max_timestamp)
-    stats = _get_subscribers(user, course)
-    stats.append(access_source)
-    stats.append(prod_source)
-    stats.append(social_source)
-    if not exclude_outcome:
-        outcome_source = _get_stat_source(IOutcomeStatsSource, user, course)
-        stats.append(outcome_source)
-    return stats
-
-
-def _add_stats_to_user_dict(user_dict, user, course, timestamp):
-    stats = _get_stats_for_user(user, course, timestamp)
-    for stat in stats:
-        user_dict[stat.display_name] = stat
+def _get_user_stats(request, course, users, timestamp=None):
+    """
+    Return a list of (user, {source type: stats}) for the users, in order.
+    Stats are read from the stat counters (if requested and there is no
+    time window), from snapshots or computed.
+    """
+    params = CaseInsensitiveDict(request.params)
+    result = {}
+    if      course is not None \
+        and timestamp is None \
+        and is_true(params.get('Counters', False)):
+        update_view_counters(course)
+        for user in users:
+            stats = get_stats_with_counters(user, course)
+            if stats is not None:
+                result[user.username] = OrderedDict((x.display_name, x) for x in stats)
+    missing = [x for x in users if x.username not in result]
+    refresh = is_true(params.get('Refresh', False))
+    for user, stats in get_stats_with_snapshots(course, missing, timestamp,
+                                                refresh=refresh):
+        result[user.username] = stats
+    return [(x, result[x.username]) for x in users]
 
 
 class _AbstractCSVView(AbstractAuthenticatedView):
@@ -143,11 +162,45 @@ class _AbstractCSVView(AbstractAuthenticatedView):
         self.opaque_id = bool(params.get('OpaqueUserId', True))
         self.instructors = bool(params.get('Instructors', False))
         self.exclude_user_parts = request.params.getall('ExcludeUserFilter')
+        self.user_filter = UserExclusionFilter(self.exclude_user_parts)
         self.exclude_outcome_stats = bool(params.get('ExcludeOutcomeStats', False))
-        # pylint: disable=no-member
+        self.stream_response = is_true(params.get('Stream', False))
+        self.concurrency = int(params.get('Concurrency') or 1)
+        self.async_job = is_true(params.get('Async', False))
         self._set_times(params)
         self._set_course_day_delta(params)
 
+    def _set_course_day_delta(self, params):
+        # pylint: disable=attribute-defined-outside-init
+        self.day_delta_param = params.get('CourseStartDayDelta')
+        self.day_delta = timedelta(days=int(self.day_delta_param)) if self.day_delta_param else None
+        # Only courses started after this date.
+        course_start_time = params.get('CourseStartTime')
+        course_start_time = float(course_start_time) if course_start_time else None
+        self.course_start_time = datetime.utcfromtimestamp(course_start_time) if course_start_time else None
+
+    def _set_times(self, params):
+        # pylint: disable=attribute-defined-outside-init
+        start_time = params.get('StartTime')
+        start_time = float(start_time) if start_time else None
+        end_time = params.get('EndTime')
+        end_time = float(end_time) if end_time else None
+        self.start_time = datetime.utcfromtimestamp(start_time) if start_time else None
+        self.end_time = datetime.utcfromtimestamp(end_time) if end_time else None
+
+    def _get_time_window(self, entry):
+        """
+        The (start, end) window of the stats for the given course entry.
+        """
+        start_time = self.start_time
+        end_time = self.end_time
+        if      not start_time \
+            and not end_time \
+            and self.day_delta is not None:
+            start_time = entry.StartDate - self.day_delta
+            end_time = entry.StartDate + self.day_delta
+        return start_time, end_time
+
     def accept_course_entry(self, entry):
         # pylint: disable=no-member
         # Skip if no course, no match, or we have a course start param that
@@ -158,6 +211,106 @@ class _AbstractCSVView(AbstractAuthenticatedView):
            and (   self.course_start_time is None
                 or self.course_start_time < entry.StartDate)
 
+    def _iter_courses(self):
+        """
+        Yield the (entry, course) pairs accepted by our course filter.
+        """
+        # The catalog index narrows down to the (few) matching entries
+        # before any entry or course is loaded.
+        entries = iter_catalog_entries(self.course_filter,
+                                       self.course_start_time)
+        for entry, course in entries:
+            if self.accept_course_entry(entry):
+                yield entry, course
+
+    def _get_filename(self):
+        raise NotImplementedError()
+
+    def _get_export_total(self):
+        """
+        The number of progress units (rows yielded by `_write_csv`) we
+        expect to write, used to report on export jobs.
+        """
+        return len(tuple(self._iter_courses()))
+
+    def _write_csv(self, stream):
+        """
+        A generator writing our csv into the given stream, yielding True
+        when the output should be flushed, False as each unit of work
+        completes and None as other rows are written.
+        """
+        raise NotImplementedError()
+
+    def _iter_csv_chunks(self, stream, rows):
+        """
+        Drain the `rows` generator, which writes csv data into `stream`,
+        yielding the buffered bytes as they accumulate. A truthy value
+        from `rows` flushes immediately (e.g. once the headers are known).
+        """
+        for flush in rows:
+            if flush or stream.tell() >= STREAM_CHUNK_SIZE:
+                yield stream.getvalue()
+                stream.seek(0)
+                stream.truncate()
+        if stream.tell():
+            yield stream.getvalue()
+
+    def _set_csv_body(self, response):
+        """
+        Set our csv as the response body; either streamed via `app_iter`
+        or buffered in full.
+        """
+        if self.stream_response:
+            # The stream is written once the request is over, so the view
+            # is re-created in its own transaction in our site.
+            rows_factory = partial(_iter_view_csv_chunks, type(self),
+                                   self.request.query_string)
+            response.app_iter = iter_in_transaction(rows_factory,
+                                                    getSite().__name__)
+        else:
+            stream = BytesIO()
+            for _ in self._write_csv(stream):
+                pass
+            stream.flush()
+            stream.seek(0)
+            response.body_file = stream
+        return response
+
+    def _queue_job(self):
+        try:
+            job = queue_export_job(type(self), self.request, self._get_filename())
+        except ValueError as e:
+            raise_json_error(self.request,
+                             hexc.HTTPServerError,
+                             {
+                                 'message': u"Cannot queue export job; %s" % e,
+                             },
+                             None)
+        result = LocatedExternalDict(job.to_dict())
+        result['href'] = '/dataserver2/@@%s?JobId=%s' % (EXPORT_JOB_STATUS_VIEW_NAME,
+                                                         job.job_id)
+        return result
+
+    def __call__(self):
+        if self.async_job:
+            return self._queue_job()
+        response = self.request.response
+        response.content_encoding = str('identity')
+        response.content_type = str('text/csv; charset=UTF-8')
+        filename = self._get_filename()
+        response.content_disposition = str('attachment; filename="%s"' % filename)
+        return self._set_csv_body(response)
+
+
+def _iter_view_csv_chunks(factory, query_string):
+    """
+    Yield the csv chunks of the view `factory` re-created for the query.
+    """
+    # pylint: disable=protected-access
+    view = create_view(factory, query_string)
+    stream = BytesIO()
+    return view._iter_csv_chunks(stream, view._write_csv(stream))
+
 
 @view_config(route_name='objects.generic.traversal',
              renderer='rest',
@@ -195,108 +348,77 @@ class LearningNetworkCSVStats(_AbstractCSVView):
 
             ExcludeUserFilter - excludes usernames containing any parts of filter
 
-    """
+            Stream - stream the csv in chunks as users are processed, rather
+                    than buffering the entire result (defaults to False)
 
-    type_stat_statvar_map = None
+            Concurrency - the number of users to compute stats for concurrently
+                    (defaults to 1); rows are still written in enrollment order
 
-    def _get_source_str(self, source):
-        return getattr(source, 'display_name', '')
-
-    def _get_stat_str(self, source_type, stat_name, stat_var):
-        result = '%s_%s_%s' % (source_type, stat_name, stat_var)
-        return result
+            Async - queue a background job writing the csv, returning the job
+                    id; see :class:`LearningNetworkExportJobStatus`
+                    (defaults to False)
 
-    def _get_type_stat_statvar_map(self, sources):
-        """
-        Build up a consistent map of type->stat->stat_field so
-        our data points match up consistently for all users.
-        We lazily create the header row using the first data sources we get.
-        This allows us to dynamically generate headers based on stat fields.
-        """
-        if not self.type_stat_statvar_map:
-            type_stat_statvar_map = {}
-            for source in sources:
-                source_type = self._get_source_str(source)
-                type_stat_statvar_map[source_type] = stat_map = {}
-                for source_var in dir(source):
-                    if source_var.startswith('_'):
-                        continue
-                    stat = getattr(source, source_var)
-                    if IStats.providedBy(stat):
-                        stat_map[source_var] = source_stats = []
-                        for stat_var in vars(stat):
-                            # How do we get 'parameters'?
-                            if not stat_var.startswith('_') and stat_var != 'parameters':
-                                source_stats.append(stat_var)
+    """
 
-            self.type_stat_statvar_map = type_stat_statvar_map
-        return self.type_stat_statvar_map
+    def _get_user_headers(self):
+        header_labels = ['course_title', 'course_ntiid']
+        if self.opaque_id:
+            header_labels.append('user_id')
+        if self.user_info:
+            header_labels.extend(('username', 'username2', 'email',
+                                  'enrollment_date', 'last_login_time',
+                                  'account_create_date'))
+        return header_labels
 
-    def _get_row_for_user(self, user, record, course, sources):
+    def _get_user_values(self, user_info, record, entry):
         """
-        Gather the data dict for the user from the given sources.
+        The course and user column values, in the order of our user headers.
         """
-        type_stat_statvar_map = self._get_type_stat_statvar_map(sources)
-        user_results = {}
-
-        entry = ICourseCatalogEntry(course)
-        user_results['course_title'] = entry.title
-        user_results['course_ntiid'] = entry.ntiid
-        user_record = get_user_record(user)
-        if user_record is None:
-            return
-        # First user info
+        user = user_info.user
+        user_record = user_info.user_record
+        result = [entry.title, entry.ntiid]
+        if self.opaque_id:
+            result.append(user_record.user_id)
         if self.user_info:
-            addr = IEmailAddressable(user, None)
-            email = addr and addr.email
-            user_results.update({'username': user.username,
-                                 'username2': user_record.username2,
-                                 'email': email})
-            account_create_date = getattr(user, 'created', None)
             last_login = getattr(user, 'lastLoginTime', None)
             if last_login:
                 last_login = datetime.utcfromtimestamp(last_login)
-            user_results['last_login_time'] = last_login
-            user_results['account_create_date'] = account_create_date
-            user_results['enrollment_date'] = record.created if record else None
-        if self.opaque_id:
-            user_results['user_id'] = user_record.user_id
+            result.extend((user.username,
+                           user_record.username2,
+                           user_info.email,
+                           record.created if record else None,
+                           last_login,
+                           getattr(user, 'created', None)))
+        return result
+
+    def _get_row_for_user(self, user_info, record, course, sources):
+        """
+        Gather the row (a list ordered by our headers) for the
+        :class:`.UserInfo` from the given sources.
+        """
+        if user_info.user_record is None:
+            return
+        entry = ICourseCatalogEntry(course)
+        row = self._get_user_values(user_info, record, entry)
+        row.extend([''] * (self._column_count - len(row)))
 
         # Then stat data
         for source in sources:
-            source_type = self._get_source_str(source)
-            stat_map = type_stat_statvar_map.get(self._get_source_str(source))
-            for stat_name, stat_vars in stat_map.items():
-                stat = getattr(source, stat_name)
-                for stat_var in stat_vars:
-                    stat_value = getattr(stat, stat_var) if stat is not None else ''
-                    header_label = self._get_stat_str(source_type, stat_name, stat_var)
-                    # Google sheets users a ' to signify we do not want
-                    # auto-conversion by type.
-                    stat_value = "'%s" % stat_value
-                    user_results[header_label] = stat_value
-        return user_results
-
-    def _write_stats_for_user(self, writer, user, record, course, sources):
-        user_results = self._get_row_for_user(user, record, course, sources)
-        __traceback_info__ = user_results  # pylint: disable=unused-variable
-        writer.writerow(user_results)
-
-    def _set_course_day_delta(self, params):
-        # pylint: disable=attribute-defined-outside-init
-        self.day_delta_param = params.get('CourseStartDayDelta')
-        self.day_delta = timedelta(days=int(self.day_delta_param)) if self.day_delta_param else None
-        # Only courses started after this date.
-        course_start_time = params.get('CourseStartTime')
-        course_start_time = float(course_start_time) if course_start_time else None
-        self.course_start_time = datetime.utcfromtimestamp(course_start_time) if course_start_time else None
+            offset, schema = self._source_schemas.get(get_schema_key(source),
+                                                      (None, None))
+            if offset is None:
+                # Not a source we have headers for.
+                continue
+            # Google sheets users a ' to signify we do not want
+            # auto-conversion by type.
+            row[offset:offset + len(schema.headers)] = ["'%s" % x for x in schema.values(source)]
+        return row
 
-    def _set_times(self, params):
-        # pylint: disable=attribute-defined-outside-init
-        start_time = params.get('StartTime')
-        end_time = params.get('EndTime')
-        self.start_time = datetime.utcfromtimestamp(start_time) if start_time else None
-        self.end_time = datetime.utcfromtimestamp(end_time) if end_time else None
+    def _write_stats_for_user(self, writer, user_info, record, course, sources):
+        row = self._get_row_for_user(user_info, record, course, sources)
+        __traceback_info__ = row  # pylint: disable=unused-variable
+        if row is not None:
+            writer.writerow(row)
 
     def _get_headers(self, sources):
         """
@@ -305,109 +427,143 @@ class LearningNetworkCSVStats(_AbstractCSVView):
                 * user data
                 * additional headers
                 * stats
-        """
-        header_labels = ['course_title', 'course_ntiid']
-        if self.opaque_id:
-            header_labels.append('user_id')
-        if self.user_info:
-            header_labels.extend(('username', 'username2', 'email',
-                                  'enrollment_date', 'last_login_time',
-                                  'account_create_date'))
-
-        type_stat_statvar_map = self._get_type_stat_statvar_map(sources)
 
+        Each source's stat columns are contiguous, so we store their
+        offsets (and the schema the headers came from) to fill rows
+        positionally.
+        """
+        header_labels = self._get_user_headers()
+        # pylint: disable=attribute-defined-outside-init
+        # Schema key -> (offset, schema)
+        self._source_schemas = {}
         for source in sources:
-            source_headers = []
-            source_type = self._get_source_str(source)
-            stat_map = type_stat_statvar_map.get(source_type)
-            for stat_name, stat_vars in stat_map.items():
-                for stat_var in stat_vars:
-                    header_label = self._get_stat_str(source_type, stat_name, stat_var)
-                    source_headers.append(header_label)
-            source_headers = sorted(source_headers)
-            header_labels.extend(source_headers)
+            schema = get_source_schema(source)
+            self._source_schemas[get_schema_key(source)] = (len(header_labels), schema)
+            header_labels.extend(schema.headers)
         return header_labels
 
-    def _filter_user(self, user):
+    def _set_headers(self, writer, sources):
+        headers = self._get_headers(sources)
+        # pylint: disable=attribute-defined-outside-init
+        self._column_count = len(headers)
+        writer.writerow(headers)
+
+    def _get_filename(self):
+        return '%s_stats.csv' % (self.course_filter.lower())
+
+    def _get_user_records(self, course):
+        # pylint: disable=too-many-function-args,not-an-iterable
+        if self.instructors:
+            return ((x, None) for x in course.instructors)
+        return ((x.Principal, x)
+                for x in ICourseEnrollments(course).iter_enrollments())
+
+    def _get_export_total(self):
+        # Every user record is a unit of work, whether exported or skipped.
+        result = 0
+        for _, course in self._iter_courses():
+            if self.instructors:
+                result += len(course.instructors)
+            else:
+                # pylint: disable=too-many-function-args
+                result += ICourseEnrollments(course).count_enrollments()
+        return result
+
+    def _iter_accepted_users(self, user_records):
         """
-        Filter any username containing items in our request param.
+        Yield, for each chunk of the user records, the list of
+        (:class:`.UserInfo`, record) pairs we should export stats for and
+        the number of records skipped (filtered out or not found),
+        resolving each chunk of users in a batch.
+        """
+        user_filter = self.user_filter
+        for chunk in iter_chunks(user_records, STATS_BATCH_SIZE):
+            size = len(chunk)
+            # Usernames are filtered before any user or profile is loaded.
+            chunk = [(user, record) for user, record in chunk
+                     if not user_filter.exclude_username(getattr(user, 'username', user))]
+            accepted = []
+            if chunk:
+                user_infos = prefetch_users([user for user, _ in chunk])
+                for user_info, (_, record) in zip(user_infos, chunk):
+                    if      user_info is not None \
+                        and not user_filter.exclude_email(user_info.profile_email):
+                        accepted.append((user_info, record))
+            yield accepted, size - len(accepted)
+        user_filter.log_summary(self.course_filter)
+
+    def _prepare_course(self, course):
+        """
+        Load anything needed, in bulk, before writing the rows of the
+        given course.
         """
-        for user_exclude_part in self.exclude_user_parts or ():
-            if user_exclude_part in user.username:
-                logger.info('Filtering user (%s)', user.username)
-                return True
-        return False
-
-    def __call__(self):
-        course = self.context
-        response = self.request.response
-        response.content_encoding = str('identity')
-        response.content_type = str('text/csv; charset=UTF-8')
-        filename = '%s_stats.csv' % (self.course_filter.lower())
-        response.content_disposition = str('attachment; filename="%s"' % filename)
-        stream = BytesIO()
-        writer = None
-
-        catalog = component.getUtility(ICourseCatalog)
 
-        for entry in catalog.iterCatalogEntries():
-            course = ICourseInstance(entry, None)
-            if course is None or not self.accept_course_entry(entry):
-                continue
+    def _write_csv(self, stream):
+        """
+        Write our stats csv into the given stream, yielding after the
+        headers and after each user row. Headers come from the stat
+        sources of the first user, so nothing is written if every user is
+        filtered out.
+        """
+        writer = csv.writer(stream)
+        has_headers = False
+        user_count = 0
+        start = time.time()
+        pool = StatsWorkerPool(self.concurrency) if self.concurrency > 1 else None
 
+        for entry, course in self._iter_courses():
             logger.info('Fetching stat data for %s', entry.ntiid)
 
-            # pylint: disable=too-many-function-args,not-an-iterable
-            if self.instructors:
-                user_records = ((x, None) for x in course.instructors)
-            else:
-                user_records = ((x.Principal, x)
-                                for x in ICourseEnrollments(course).iter_enrollments())
-
-            start_time = self.start_time
-            end_time = self.end_time
-            if      not start_time \
-                and not end_time \
-                and self.day_delta is not None:
-                start_time = entry.StartDate - self.day_delta
-                end_time = entry.StartDate + self.day_delta
-
-            for user, record in user_records:
-                if isinstance(user, six.string_types):
-                    user = User.get_user(user)
-                username = user.username
-                user_profile = IUserProfile(user)
-                email = getattr(user_profile, 'email', '') or ''
-                if      user is not None \
-                    and not username.endswith('@nextthought.com') \
-                    and not email.endswith('@nextthought.com') \
-                    and not self._filter_user(user):
-
-                    sources = _get_stats_for_user(user,
-                                                  course, start_time,
-                                                  end_time,
-                                                  self.exclude_outcome_stats)
-                    if writer is None:
+            user_records = self._get_user_records(course)
+            self._prepare_course(course)
+            start_time, end_time = self._get_time_window(entry)
+
+            for chunk, skipped in self._iter_accepted_users(user_records):
+                # Skipped users are counted in our export total, so they
+                # are units of work too.
+                for _ in range(skipped):
+                    yield False
+                if not chunk:
+                    continue
+                users = [user_info.user for user_info, _ in chunk]
+                user_stats = get_stats_for_users(course, users,
+                                                 start_time, end_time,
+                                                 self.exclude_outcome_stats,
+                                                 pool)
+                user_count += len(users)
+                for (user_info, record), (_, sources) in zip(chunk, user_stats):
+                    if not has_headers:
                         # We defer writing headers until we get our stat
                         # sources.
-                        headers = self._get_headers(sources)
-                        writer = csv.DictWriter(stream, headers)
-                        writer.writeheader()
+                        self._set_headers(writer, sources)
+                        has_headers = True
+                        yield True
                     self._write_stats_for_user(
-                        writer, user, record, course, sources)
+                        writer, user_info, record, course, sources)
+                    yield False
 
-        stream.flush()
-        stream.seek(0)
-        response.body_file = stream
-        return response
+        elapsed = time.time() - start
+        logger.info('Exported stats for %s users in %.2fs (%.2f users/s, concurrency=%s)',
+                    user_count, elapsed, user_count / elapsed if elapsed else 0,
+                    self.concurrency)
 
 
 _QuestionPartKeys = namedtuple("QuestionPartKeys", ("original_part_key", "part_keys"))
 
+#: A compiled survey question part: its keys, the (plain text) labels of its
+#: choices and its column offset within the survey headers.
+_PartPlan = namedtuple("PartPlan", ("index", "part", "keys", "choice_labels", "offset"))
+
+#: A compiled survey question and its part plans.
+_QuestionPlan = namedtuple("QuestionPlan", ("ntiid", "parts"))
+
 
 class DefaultSurveyHeaderProvider(object):
     """
     Provides question column headers.
+
+    The survey is compiled once into an immutable plan (see :attr:`plan`)
+    so that processing each submission only looks values up.
     """
 
     def __init__(self, survey, survey_title):
@@ -434,29 +590,50 @@ class DefaultSurveyHeaderProvider(object):
         result = _QuestionPartKeys(result, None)
         return result
 
-    def _get_headers_for_question(self, question):
+    def _get_choice_labels(self, unused_part):
+        return None
+
+    def _get_part_columns(self, question_keys):
+        """
+        The column headers of a question part, in order.
+        """
+        return tuple(question_keys.part_keys or ()) + (question_keys.original_part_key,)
+
+    @Lazy
+    def plan(self):
+        """
+        The compiled survey: a tuple of question plans, each with the keys,
+        choice labels and column offset of its parts.
+        """
         result = []
-        part_length = len(question.parts or ())
-        for idx, part in enumerate(question.parts or ()):
-            question_keys = self._get_survey_question_part_keys(question, part,
-                                                                idx, part_length)
-            if question_keys.part_keys:
-                result.extend(question_keys.part_keys)
-            result.append(question_keys.original_part_key)
-        return result
+        offset = 0
+        for question in self.survey.questions or ():
+            parts = []
+            part_length = len(question.parts or ())
+            for idx, part in enumerate(question.parts or ()):
+                question_keys = self._get_survey_question_part_keys(question, part,
+                                                                    idx, part_length)
+                parts.append(_PartPlan(idx, part, question_keys,
+                                       self._get_choice_labels(part), offset))
+                offset += len(self._get_part_columns(question_keys))
+            result.append(_QuestionPlan(question.ntiid, tuple(parts)))
+        return tuple(result)
+
+    @Lazy
+    def headers(self):
+        result = []
+        for question_plan in self.plan:
+            for part_plan in question_plan.parts:
+                result.extend(self._get_part_columns(part_plan.keys))
+        return tuple(result)
 
     def get_survey_headers(self):
         """
         Traverse the survey, building and storing reproducible keys (headers).
         """
-        result = []
-        for question in self.survey.questions or ():
-            headers = self._get_headers_for_question(question)
-            result.extend(headers)
-        return result
+        return list(self.headers)
 
-    def _get_part_submission_results(self, question_keys, unused_part, response):
-        result = {}
+    def _get_response_display(self, response):
         if IQModeledContentResponse.providedBy(response):
             responses = response.value
         else:
@@ -474,7 +651,31 @@ class DefaultSurveyHeaderProvider(object):
         response_display = ' - '.join(response_values) if response_values else ''
         if response_display and isinstance(response_display, six.text_type):
             response_display = response_display.encode('utf-8')
-        result[question_keys.original_part_key] = response_display
+        return response_display
+
+    def _get_part_values(self, unused_part_plan, response):
+        """
+        The column values for a response to a question part, in the order
+        of the part columns.
+        """
+        return (self._get_response_display(response),)
+
+    def get_row_values(self, submission):
+        """
+        For the submission, return the values of each of our headers, in
+        order (empty if there is no submission).
+        """
+        result = [''] * len(self.headers)
+        if submission is not None:
+            # Now store our user's response for each question part.
+            for question_plan, sub_question in zip(self.plan,
+                                                   submission.Submission.parts):
+                assert question_plan.ntiid == sub_question.inquiryId
+                for part_plan in question_plan.parts:
+                    response = sub_question.parts[part_plan.index]
+                    values = self._get_part_values(part_plan, response)
+                    offset = part_plan.offset
+                    result[offset:offset + len(values)] = values
         return result
 
     def get_results_for_submission(self, submission):
@@ -484,22 +685,7 @@ class DefaultSurveyHeaderProvider(object):
         """
         result = {}
         if submission is not None:
-            # Now store our user's response for each question part.
-            # Must make sure we map to keys stored in the writer.
-            for question, sub_question in zip(self.survey.questions,
-                                              submission.Submission.parts):
-                assert question.ntiid == sub_question.inquiryId
-                part_length = len(question.parts or ())
-                for idx, part in enumerate(question.parts or ()):
-                    question_keys = self._get_survey_question_part_keys(question,
-                                                                        part,
-                                                                        idx,
-                                                                        part_length)
-                    response = sub_question.parts[idx]
-                    student_results = self._get_part_submission_results(question_keys,
-                                                                        part,
-                                                                        response)
-                    result.update(student_results)
+            result.update(zip(self.headers, self.get_row_values(submission)))
         return result
 
 
@@ -517,6 +703,11 @@ class ByAnswerSurveyHeaderProvider(DefaultSurveyHeaderProvider):
             choice = choice.encode('utf-8')
         return choice
 
+    def _get_choice_labels(self, part):
+        if IQNonGradableMultipleChoicePart.providedBy(part):
+            return tuple(self._get_choice_str(x) for x in part.choices or ())
+        return None
+
     def _get_survey_question_part_keys(self, question, part, *args):  # pylint: disable=arguments-differ
         """
         Build our header name: '[survey] question [part] [choice]'.
@@ -529,33 +720,28 @@ class ByAnswerSurveyHeaderProvider(DefaultSurveyHeaderProvider):
             # Order matters here since we tag by index
             question_part_key = question_part_keys.original_part_key
             part_keys = []
-            for choice in part.choices or ():
-                choice = self._get_choice_str(choice)
+            for choice in self._get_choice_labels(part):
                 choice = '%s [%s]' % (question_part_key, choice)
                 part_keys.append(choice)
             result = _QuestionPartKeys(question_part_key, part_keys)
         return result
 
-    def _get_part_submission_results(self, question_keys, part, response):
+    def _get_part_values(self, part_plan, response):
         """
-        Get a binary result for each multiple choice response.
+        Get a binary result for each multiple choice response, followed by
+        the summary of the chosen answers.
         """
-        if IQNonGradableMultipleChoicePart.providedBy(part):
-            assert len(question_keys.part_keys or ()) == len(part.choices or ())
-            result = {}
-            if isinstance(response, six.integer_types):
-                response = (response,)
-            aggregate_response = []
-            for response_idx in response or ():
-                choice_response = self._get_choice_str(part.choices[response_idx])
-                aggregate_response.append(choice_response)
-            result[question_keys.original_part_key] = ', '.join(aggregate_response)
-            for idx, question_key in enumerate(question_keys.part_keys or ()):
-                result[question_key] = '1' if response and idx in response else '0'
-        else:
-            result = super(ByAnswerSurveyHeaderProvider, self)._get_part_submission_results(question_keys,
-                                                                                            part,
-                                                                                            response)
+        choice_labels = part_plan.choice_labels
+        if choice_labels is None:
+            return super(ByAnswerSurveyHeaderProvider, self)._get_part_values(part_plan,
+                                                                              response)
+        assert len(part_plan.keys.part_keys or ()) == len(choice_labels)
+        if isinstance(response, six.integer_types):
+            response = (response,)
+        aggregate_response = [choice_labels[idx] for idx in response or ()]
+        result = ['1' if response and idx in response else '0'
+                  for idx in range(len(choice_labels))]
+        result.append(', '.join(aggregate_response))
         return result
 
 
@@ -581,11 +767,24 @@ class LearningNetworkSurveyCSVStats(LearningNetworkCSVStats):
                     in the final survey as a choice per column, with a binary (0/1)
                     whether the user chose that response or not (default False).
 
+            Aggregate - return (as json) per-choice counts and response rates
+                    for each survey, rather than a row per user (default False).
+
+            CrossTabStat - with Aggregate, a stat column header
+                    (e.g. Production_note_stats_count) to cross-tab the choices
+                    against.
+
+            CrossTabBuckets - the comma separated lower bounds of the stat
+                    buckets to cross-tab against (default 1,5,10,25).
+
     """
 
     def __init__(self, request):
         super(LearningNetworkSurveyCSVStats, self).__init__(request)
         params = CaseInsensitiveDict(request.params)
+        self.aggregate = is_true(params.get('Aggregate'))
+        self.crosstab_stat = params.get('CrossTabStat')
+        self.crosstab_buckets = self._get_crosstab_buckets(params.get('CrossTabBuckets'))
 
         self.survey_ids = self.request.params.getall('PostSurveyNTIID') \
                        or self.request.params.getall('surveyId')
@@ -598,11 +797,28 @@ class LearningNetworkSurveyCSVStats(LearningNetworkCSVStats):
                              None)
         answer_by_column = params.get('SurveyMultipleChoiceAnswerByColumn', False)
         answer_by_column = is_true(answer_by_column)
-        factory = ByAnswerSurveyHeaderProvider if answer_by_column else DefaultSurveyHeaderProvider
+        # Aggregates count by choice, so need the by-answer column model.
+        factory = ByAnswerSurveyHeaderProvider \
+            if answer_by_column or self.aggregate else DefaultSurveyHeaderProvider
         # Useful to keep a consistent order.
         self.header_providers = OrderedDict()
         for survey in self.surveys:  # pylint: disable=not-an-iterable
             self.header_providers[survey.ntiid] = factory(survey, survey.title)
+        # Survey ntiid -> username -> submission, for the current course
+        self._submissions = None
+
+    def _get_crosstab_buckets(self, buckets):
+        if not buckets:
+            return DEFAULT_CROSSTAB_BUCKETS
+        try:
+            return tuple(sorted(float(x) for x in buckets.split(',') if x.strip()))
+        except ValueError:
+            raise_json_error(self.request,
+                             hexc.HTTPUnprocessableEntity,
+                             {
+                                 'message': u"Invalid CrossTabBuckets.",
+                             },
+                             None)
 
     @Lazy
     def surveys(self):
@@ -616,13 +832,27 @@ class LearningNetworkSurveyCSVStats(LearningNetworkCSVStats):
 
     def _get_headers(self, *args, **kwargs):  # pylint: disable=arguments-differ
         headers = super(LearningNetworkSurveyCSVStats, self)._get_headers(*args, **kwargs)
-        for provider in self.header_providers.values():
-            survey_headers = provider.get_survey_headers()
-            headers.extend(survey_headers)
+        # pylint: disable=attribute-defined-outside-init
+        # Survey ntiid -> the offset of its first column
+        self._survey_offsets = {}
+        for survey_ntiid, provider in self.header_providers.items():
+            self._survey_offsets[survey_ntiid] = len(headers)
+            headers.extend(provider.get_survey_headers())
         return headers
 
+    def _prepare_course(self, course):
+        # pylint: disable=attribute-defined-outside-init
+        # Inquiry items are keyed by the survey ntiid, which may not be the
+        # one requested.
+        survey_ntiids = [x.ntiid for x in self.surveys]  # pylint: disable=not-an-iterable
+        self._submissions = get_course_survey_submissions(course, survey_ntiids)
+
     # pylint: disable=arguments-differ
     def _get_survey_submission(self, survey, user, course):
+        if self._submissions is not None:
+            survey_submissions = self._submissions.get(survey.ntiid) or {}
+            return survey_submissions.get(user.username.lower())
+        # No catalog; look up the user's submission directly.
         course_inquiry = component.getMultiAdapter((course, user),
                                                    IUsersCourseInquiry)
         result = None
@@ -633,21 +863,80 @@ class LearningNetworkSurveyCSVStats(LearningNetworkCSVStats):
         return result
 
     # pylint: disable=arguments-differ
-    def _get_row_for_user(self, user, record, course, *args, **kwargs):
+    def _get_row_for_user(self, user_info, record, course, *args, **kwargs):
         """
-        Gather the data dict for the user from the given sources.
+        Gather the row for the user from the given sources and surveys.
         """
-        user_results = super(LearningNetworkSurveyCSVStats, self)._get_row_for_user(user,
-                                                                                    record,
-                                                                                    course,
-                                                                                    *args,
-                                                                                    **kwargs)
+        row = super(LearningNetworkSurveyCSVStats, self)._get_row_for_user(user_info,
+                                                                           record,
+                                                                           course,
+                                                                           *args,
+                                                                           **kwargs)
+        if row is None:
+            return
         for survey in self.surveys:  # pylint: disable=not-an-iterable
-            submission = self._get_survey_submission(survey, user, course)
+            submission = self._get_survey_submission(survey, user_info.user, course)
             provider = self.header_providers[survey.ntiid]
-            survey_results = provider.get_results_for_submission(submission)
-            user_results.update(survey_results)
-        return user_results
+            offset = self._survey_offsets[survey.ntiid]
+            values = provider.get_row_values(submission)
+            row[offset:offset + len(values)] = values
+        return row
+
+    @Lazy
+    def _crosstab_schemas(self):
+        # Schema key -> StatSourceSchema, for this request.
+        return {}
+
+    def _get_crosstab_value(self, sources):
+        """
+        The value of our cross-tab stat column among the given sources.
+        """
+        for source in sources or ():
+            schema = get_source_schema(source, self._crosstab_schemas)
+            if self.crosstab_stat in schema.headers:
+                values = schema.values(source)
+                return values[schema.headers.index(self.crosstab_stat)]
+        return None
+
+    def _get_aggregates(self):
+        """
+        Aggregate the survey submissions of our users in a single pass,
+        keeping only counters.
+        """
+        bounds = self.crosstab_buckets if self.crosstab_stat else None
+        aggregates = OrderedDict((ntiid, SurveyAggregate(provider, bounds))
+                                 for ntiid, provider in self.header_providers.items())
+        pool = StatsWorkerPool(self.concurrency) if self.concurrency > 1 else None
+        for entry, course in self._iter_courses():
+            logger.info('Aggregating survey data for %s', entry.ntiid)
+            self._prepare_course(course)
+            start_time, end_time = self._get_time_window(entry)
+            for chunk, _ in self._iter_accepted_users(self._get_user_records(course)):
+                chunk = [x for x in chunk if x[0].user_record is not None]
+                users = [user_info.user for user_info, _ in chunk]
+                if self.crosstab_stat:
+                    user_stats = get_stats_for_users(course, users,
+                                                     start_time, end_time,
+                                                     self.exclude_outcome_stats,
+                                                     pool)
+                else:
+                    user_stats = [(user, None) for user in users]
+                for user, sources in user_stats:
+                    value = self._get_crosstab_value(sources) if bounds else None
+                    for survey in self.surveys:  # pylint: disable=not-an-iterable
+                        aggregate = aggregates[survey.ntiid]
+                        submission = self._get_survey_submission(survey, user, course)
+                        aggregate.add(submission, aggregate.get_bucket(value))
+        result = LocatedExternalDict()
+        result[ITEMS] = [x.to_external() for x in aggregates.values()]
+        result['CrossTabStat'] = self.crosstab_stat
+        result[ITEM_COUNT] = len(result[ITEMS])
+        return result
+
+    def __call__(self):
+        if self.aggregate:
+            return self._get_aggregates()
+        return super(LearningNetworkSurveyCSVStats, self).__call__()
 
 
 @view_config(route_name='objects.generic.traversal',
@@ -660,11 +949,112 @@ class LearningNetworkCourseStats(AbstractAuthenticatedView):
     """
     For the given course (and possibly user or timestamp), return
     the learning network stats for each user enrolled in the course.
+
+    Users are ordered by username and can be paged through with
+    `batchStart`/`batchSize`, or by passing the `NextCursor` of the
+    previous page as `batchAfter`. With `Stream=true` the result is
+    rendered as json one user at a time.
+
+    Stats are served from snapshots while they are fresh; pass
+    `Refresh=true` to recompute them. Without a `Timestamp`,
+    `Counters=true` reads the counted stats from the incremental stat
+    counters for users whose counters are seeded.
+
+    Enrolled users may be excluded with `ExcludeUserFilter` substrings
+    and `ExcludeInternalUsers=true` (by username or profile email).
     """
 
+    def _get_user_filter(self, params):
+        """
+        The username filter for the `ExcludeUserFilter` (and, if
+        `ExcludeInternalUsers`, internal user) params, if any.
+        """
+        exclude_parts = self.request.params.getall('ExcludeUserFilter')
+        exclude_internal = is_true(params.get('ExcludeInternalUsers', False))
+        if not exclude_parts and not exclude_internal:
+            return None
+        return UserExclusionFilter(exclude_parts, exclude_internal)
+
+    def _filter_usernames(self, usernames, user_filter, params):
+        """
+        The usernames that pass the filter; as with the csv exports,
+        internal users are also excluded by their profile email, which is
+        only loaded for the users whose username passes.
+        """
+        usernames = [x for x in usernames if not user_filter.exclude_username(x)]
+        if not is_true(params.get('ExcludeInternalUsers', False)):
+            return usernames
+        result = []
+        for chunk in iter_chunks(usernames, STATS_BATCH_SIZE):
+            user_infos = prefetch_users(chunk, records=False, profiles=True)
+            for username, user_info in zip(chunk, user_infos):
+                # Missing users are kept, and logged as not found.
+                if     user_info is None \
+                    or not user_filter.exclude_email(user_info.profile_email):
+                    result.append(username)
+        return result
+
+    def _iter_user_stats(self, course, usernames, timestamp):
+        """
+        Yield (username, {source type: stats}) for the usernames, in order.
+        """
+        for chunk in iter_chunks(usernames, STATS_BATCH_SIZE):
+            users = []
+            user_infos = prefetch_users(chunk, records=False, profiles=False)
+            for username, user_info in zip(chunk, user_infos):
+                if user_info is not None:
+                    users.append(user_info.user)
+                else:
+                    logger.info('User (%s) in course not found.', username)
+            user_stats = dict((user.username, stats) for user, stats in
+                              _get_user_stats(self.request, course, users, timestamp))
+            for username, user_info in zip(chunk, user_infos):
+                stats = user_stats[user_info.username] if user_info is not None else {}
+                yield username, stats
+
+    def _get_batch(self, usernames, params):
+        """
+        Return the page of (sorted) usernames requested by the batch params,
+        along with the paging info.
+        """
+        usernames = sorted(usernames)
+        batch_start = int(params.get('batchStart') or 0)
+        batch_size = params.get('batchSize')
+        batch_size = int(batch_size) if batch_size else None
+        cursor = params.get('batchAfter')
+        if cursor:
+            # Resume after the last user of the previous page.
+            batch_start = bisect_right(usernames, cursor)
+        batch_end = batch_start + batch_size if batch_size else len(usernames)
+        batch = usernames[batch_start:batch_end]
+        info = {TOTAL: len(usernames), ITEM_COUNT: len(batch)}
+        if batch and batch_end < len(usernames):
+            info['NextBatchStart'] = batch_end
+            info['NextCursor'] = batch[-1]
+        return batch, info
+
+    def _iter_json(self, user_stats, info):
+        """
+        Render our result as json, one user at a time.
+        """
+        yield b'{'
+        separator = ''
+        for username, stats in user_stats:
+            value = '%s%s: %s' % (separator,
+                                  to_json_representation(username),
+                                  to_json_representation_externalized(stats))
+            separator = ','
+            yield value.encode('utf-8')
+        for key, value in sorted(info.items()):
+            value = '%s%s: %s' % (separator,
+                                  to_json_representation(key),
+                                  to_json_representation(value))
+            separator = ','
+            yield value.encode('utf-8')
+        yield b'}'
+
     def __call__(self):
         # For beer-200, 3k students, 650s (5 students/s) with 55k loads.
-        result = LocatedExternalDict()
         course = self.context
         params = CaseInsensitiveDict(self.request.params)
         username = params.get('Username')
@@ -684,16 +1074,89 @@ class LearningNetworkCourseStats(AbstractAuthenticatedView):
             usernames = (username,)
         else:
             enrollments = ICourseEnrollments(course)
-            usernames = enrollments.iter_principals()  # pylint: disable=too-many-function-args
+            # pylint: disable=too-many-function-args
+            usernames = enrollments.iter_principals()
+            user_filter = self._get_user_filter(params)
+            if user_filter is not None:
+                usernames = self._filter_usernames(usernames, user_filter, params)
+                user_filter.log_summary(course)
+
+        usernames, info = self._get_batch(usernames, params)
+        if is_true(params.get('Stream', False)):
+            # The stream is written once the request is over, so the view
+            # is re-created in its own transaction in our site.
+            intids = component.getUtility(IIntIds)
+            json_factory = partial(_iter_view_json, type(self),
+                                   self.request.query_string,
+                                   intids.getId(course), usernames,
+                                   timestamp, info)
+            response = self.request.response
+            response.content_type = str('application/json; charset=UTF-8')
+            response.app_iter = iter_in_transaction(json_factory,
+                                                    getSite().__name__)
+            return response
+        user_stats = self._iter_user_stats(course, usernames, timestamp)
+        result = LocatedExternalDict()
+        for username, stats in user_stats:
+            result[username] = stats
+        result.update(info)
+        return result
 
-        for username in usernames:
-            result[username] = user_dict = {}
-            user = User.get_user(username)
-            if user is not None:
-                _add_stats_to_user_dict(user_dict, user, course, timestamp)
-            else:
-                logger.info('User (%s) in course not found.', username)
-        result[ITEM_COUNT] = len(usernames)
+
+def _iter_view_json(factory, query_string, course_id, usernames, timestamp, info):
+    """
+    Yield the json chunks of the course stats view `factory` re-created
+    for the query.
+    """
+    # pylint: disable=protected-access
+    course = component.getUtility(IIntIds).getObject(course_id)
+    view = create_view(factory, query_string, context=course)
+    user_stats = view._iter_user_stats(course, usernames, timestamp)
+    return view._iter_json(user_stats, info)
+
+
+@view_config(route_name='objects.generic.traversal',
+             renderer='rest',
+             request_method='GET',
+             context=ICourseInstance,
+             permission=nauth.ACT_NTI_ADMIN,
+             name=VERIFY_COUNTERS_VIEW_NAME)
+@view_config(route_name='objects.generic.traversal',
+             renderer='rest',
+             request_method='POST',
+             context=ICourseInstance,
+             permission=nauth.ACT_NTI_ADMIN,
+             name=VERIFY_COUNTERS_VIEW_NAME)
+class VerifyLearningNetworkCounters(AbstractAuthenticatedView):
+    """
+    Compare the incremental stat counters of a sample of the users enrolled
+    in the course against a full computation of their stats. A POST also
+    reseeds the counters of any user that does not match.
+
+    params:
+
+            SampleSize - the number of users to check (defaults to 20); 0
+                    checks everyone
+    """
+
+    def __call__(self):
+        course = self.context
+        params = CaseInsensitiveDict(self.request.params)
+        sample_size = int(params.get('SampleSize') or 20)
+        repair = self.request.method == 'POST'
+        enrollments = ICourseEnrollments(course)
+        # pylint: disable=too-many-function-args
+        usernames = tuple(enrollments.iter_principals())
+        users = [x.user for x in prefetch_users(usernames, records=False, profiles=False)
+                 if x is not None]
+        checked, mismatches = verify_counters(course, users,
+                                              sample_size=sample_size,
+                                              repair=repair)
+        result = LocatedExternalDict()
+        result['Checked'] = len(checked)
+        result['Repaired'] = repair
+        result['Mismatches'] = mismatches
+        result[ITEM_COUNT] = len(mismatches)
         return result
 
 
@@ -708,9 +1171,15 @@ class SocialConnectionsCSVStats(_AbstractCSVView):
     Fetches and outputs stats in a CSV. Useful for generating data
     for research purposes.
 
-    This just shows comment/notes views by for-credit students.
-    Could add filters by type of viewing/commenting student as well
-    as easily fetching the comment social connections (creator/reply-to).
+    This just shows comment/notes views by for-credit students, as an
+    edge list ordered by timestamp. Other kinds of connections
+    (e.g. creator/reply-to) can be added as
+    :class:`.ISocialEdgeSource` subscribers.
+
+    Accepts the `filter`, `StartTime`, `EndTime`, `CourseStartTime`,
+    `CourseStartDayDelta`, `Stream` and `Async` params of
+    :class:`LearningNetworkCSVStats`; views outside the time window are
+    not exported.
     """
 
     def _get_scope_usernames(self, scope):
@@ -748,100 +1217,40 @@ class SocialConnectionsCSVStats(_AbstractCSVView):
         result = self._get_scope_usernames(scope)
         return result & all_students
 
-    def _write_topic_views(self, writer, course, for_credit_usernames):
+    def _get_for_credit_users(self, for_credit_usernames):
         """
-        Write out those for credit students that have viewed
-        comments to show social connections.
+        Map the analytics user ids of our for credit students to their
+        usernames, resolved in batches.
         """
-        views = get_topic_views(course=course)
-        comments_created = get_forum_comments(course=course)
-        topic_comments = dict()
-        for comment in comments_created:
-            comments = topic_comments.setdefault(comment.topic_id, [])
-            comments.append(comment)
+        result = {}
+        for chunk in iter_chunks(sorted(for_credit_usernames), STATS_BATCH_SIZE):
+            for user_info in prefetch_users(chunk, profiles=False):
+                if user_info is not None and user_info.user_record is not None:
+                    result[user_info.user_record.user_id] = user_info.username
+        return result
 
-        seen_comments = set()
-        for view in views:
-            comments = topic_comments.get(view.topic_id, ())
-            if not comments:
-                continue
-            # Comment created before view.
-            view_comments = (
-                x for x in comments if x.timestamp < view.timestamp
-            )
-            for view_comment in view_comments:
-                # User only sees comment the first time?
-                key = (view.user_id, view_comment.comment_id)
-                if key in seen_comments:
-                    continue
-                seen_comments.add(key)
-                if view.user is None:
-                    logger.warning('User is None: %s', view.user_id)
-                    continue
-                if view.user.username.lower() in for_credit_usernames:
-                    writer.writerow((view.user_id,
-                                     view_comment.user_id,
-                                     view.timestamp,
-                                     'CommentViewed'))
+    def _get_filename(self):
+        return '%s_social_stats.csv' % (self.course_filter.lower())
 
-    def _write_note_views(self, writer, course, for_credit_usernames):
+    def _write_csv(self, stream):
         """
-        Write out those for credit students that have viewed
-        notes to show social connections.
+        Write our connections csv into the given stream, yielding as rows
+        are written and after each course.
         """
-        views = get_note_views(course=course)
-        seen_notes = set()
-        for view in views:
-            if view.Note is None:
-                continue
-            notes = (view.Note,) + tuple(view.Note.referents)
-            for note in notes:
-                # Viewed if created and readable (which could have changed)...
-                # pylint: disable=protected-access
-                key = (view.user_id, note._ds_intid)
-                if key in seen_notes:
-                    continue
-                seen_notes.add(key)
-                if view.user is None:
-                    logger.warning('User is None: %s', view.user_id)
-                    continue
-                if      note.created < view.timestamp \
-                    and view.user.username.lower() in for_credit_usernames \
-                    and has_permission(nauth.ACT_READ, note, view.user.username):
-                    user_record = get_user_record(note.creator)
-                    writer.writerow((view.user_id,
-                                     user_record.user_id,
-                                     view.timestamp,
-                                     'NoteViewed'))
-
-    def __call__(self):
-        # pylint: disable=no-member
-        self._initialize()
-        course = self.context
-        response = self.request.response
-        response.content_encoding = str('identity')
-        response.content_type = str('text/csv; charset=UTF-8')
-        filename = '%s_social_stats.csv' % (self.course_filter.lower())
-        response.content_disposition = str('attachment; filename="%s"' % filename)
-        stream = BytesIO()
         writer = csv.writer(stream)
-
-        catalog = component.getUtility(ICourseCatalog)
-        for entry in catalog.iterCatalogEntries():
+        for entry, course in self._iter_courses():
             # pylint: disable=attribute-defined-outside-init
-            course = self.course = ICourseInstance(entry, None)
-            if course is None or not self.accept_course_entry(entry):
-                continue
+            self.course = course
             writer.writerow(('source', 'target', 'timestamp', 'label'))
+            start_time, end_time = self._get_time_window(entry)
             all_students = self._get_all_students(course)
             for_credit_usernames = self._get_for_credit_usernames(course, all_students)
-            self._write_topic_views(writer, course, for_credit_usernames)
-            self._write_note_views(writer, course, for_credit_usernames)
-
-        stream.flush()
-        stream.seek(0)
-        response.body_file = stream
-        return response
+            for_credit_users = self._get_for_credit_users(for_credit_usernames)
+            for edge in iter_social_edges(course, for_credit_users,
+                                          start_time, end_time):
+                writer.writerow(edge)
+                yield
+            yield False
 
 
 @view_config(route_name='objects.generic.traversal',
@@ -854,6 +1263,11 @@ class LearningNetworkUserStats(AbstractAuthenticatedView):
     """
     For the given user (and possibly course or timestamp), return
     the learning network stats.
+
+    Stats are served from snapshots while they are fresh; pass
+    `Refresh=true` to recompute them. Without a `Timestamp`,
+    `Counters=true` reads the counted stats from the incremental stat
+    counters for users whose counters are seeded.
     """
 
     def __call__(self):
@@ -874,7 +1288,8 @@ class LearningNetworkUserStats(AbstractAuthenticatedView):
                                  },
                                  None)
         result = LocatedExternalDict()
-        _add_stats_to_user_dict(result, user, course, timestamp)
+        user_stats = _get_user_stats(self.request, course, (user,), timestamp)
+        result.update(user_stats[0][1])
         return result
 
 
@@ -888,15 +1303,33 @@ class CourseConnectionGraph(AbstractAuthenticatedView):
     """
     For the given course (and possibly timestamp), return the connections
     (in graph or gif form?).
+
+    params:
+
+            Renderer - 'graphviz' (png) or 'builtin' (svg); by default
+            graphviz, if pygraphviz is available
     """
 
+    def _get_renderer(self, params):
+        name = params.get('Renderer')
+        renderer = get_graph_renderer(name)
+        if renderer is None:
+            raise_json_error(self.request,
+                             hexc.HTTPUnprocessableEntity,
+                             {
+                                 'message': u"Unknown graph renderer %s." % name,
+                             },
+                             None)
+        return renderer
+
     def __call__(self):
         course = self.context
         params = CaseInsensitiveDict(self.request.params)
         timestamp = params.get('Timestamp')
         timestamp = datetime.utcfromtimestamp(timestamp) if timestamp else None
+        renderer = self._get_renderer(params)
         try:
-            get_connection_graphs(course, timestamp)
+            get_connection_graphs(course, timestamp, renderer)
         except TypeError:
             raise_json_error(self.request,
                              hexc.HTTPServerError,
@@ -906,3 +1339,74 @@ class CourseConnectionGraph(AbstractAuthenticatedView):
                              None)
         # What do we want to return, gif?. TODO:
         return hexc.HTTPNoContent()
+
+
+def _get_job_status_or_raise(request):
+    params = CaseInsensitiveDict(request.params)
+    job_id = params.get('JobId')
+    result = get_job_status(job_id)
+    if result is None:
+        raise_json_error(request,
+                         hexc.HTTPNotFound,
+                         {
+                             'message': u"No export job found for %s." % job_id,
+                         },
+                         None)
+    return result
+
+
+@view_config(route_name='objects.generic.traversal',
+             renderer='rest',
+             request_method='GET',
+             context=IDataserverFolder,
+             permission=nauth.ACT_NTI_ADMIN,
+             name=EXPORT_JOB_STATUS_VIEW_NAME)
+class LearningNetworkExportJobStatus(AbstractAuthenticatedView):
+    """
+    Return the status of an asynchronous export job, including the number
+    of items done of the total and the estimated seconds remaining.
+
+    params:
+
+            JobId - the job id returned when the export was queued
+    """
+
+    def __call__(self):
+        status = _get_job_status_or_raise(self.request)
+        result = LocatedExternalDict(status)
+        if status['Status'] == JOB_SUCCESS:
+            result['href'] = '/dataserver2/@@%s?JobId=%s' % (EXPORT_JOB_DOWNLOAD_VIEW_NAME,
+                                                             status['JobId'])
+        return result
+
+
+@view_config(route_name='objects.generic.traversal',
+             request_method='GET',
+             context=IDataserverFolder,
+             permission=nauth.ACT_NTI_ADMIN,
+             name=EXPORT_JOB_DOWNLOAD_VIEW_NAME)
+class LearningNetworkExportJobDownload(AbstractAuthenticatedView):
+    """
+    Download the csv written by a finished asynchronous export job.
+
+    params:
+
+            JobId - the job id returned when the export was queued
+    """
+
+    def __call__(self):
+        status = _get_job_status_or_raise(self.request)
+        if status['Status'] != JOB_SUCCESS:
+            raise_json_error(self.request,
+                             hexc.HTTPConflict,
+                             {
+                                 'message': u"Export job is not finished.",
+                                 'Status': status['Status'],
+                             },
+                             None)
+        path = get_job_output_path(status['JobId'])
+        response = FileResponse(path,
+                                request=self.request,
+                                content_type=str('text/csv; charset=UTF-8'))
+        response.content_disposition = str('attachment; filename="%s"' % status['Filename'])
+        return response
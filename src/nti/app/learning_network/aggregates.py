@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Single pass survey aggregates: per-choice counts, response rates and
+cross-tabs of choices against learning network stat buckets.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from bisect import bisect_right
+
+import six
+
+#: The default bucket bounds for cross-tabs against a stat.
+DEFAULT_CROSSTAB_BUCKETS = (1, 5, 10, 25)
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _to_text(value):
+    if isinstance(value, six.binary_type):
+        value = value.decode('utf-8')
+    return value
+
+
+def _rate(count, total):
+    return count / total if total else None
+
+
+def get_bucket_bounds(bounds):
+    """
+    Return the list of (min, max) bounds of the buckets defined by the
+    given (sorted) lower bounds; the first bucket has no min and the
+    last no max.
+    """
+    bounds = tuple(bounds)
+    mins = (None,) + bounds
+    maxes = bounds + (None,)
+    return list(zip(mins, maxes))
+
+
+class _PartAggregate(object):
+    """
+    The counter arrays for a single survey question part.
+    """
+
+    def __init__(self, part_plan, bucket_count):
+        self.part_plan = part_plan
+        self.choice_labels = part_plan.choice_labels
+        self.responses = 0
+        choice_count = len(self.choice_labels or ())
+        self.counts = [0] * choice_count
+        self.bucket_responses = [0] * bucket_count
+        self.bucket_counts = [[0] * choice_count for _ in range(bucket_count)]
+
+    def add(self, response, bucket):
+        if response is None:
+            return
+        self.responses += 1
+        if bucket is not None:
+            self.bucket_responses[bucket] += 1
+        if self.choice_labels is None:
+            return
+        if isinstance(response, six.integer_types):
+            response = (response,)
+        for idx in set(response or ()):
+            if 0 <= idx < len(self.counts):
+                self.counts[idx] += 1
+                if bucket is not None:
+                    self.bucket_counts[bucket][idx] += 1
+
+    def to_external(self, total, bounds):
+        result = {
+            'Label': _to_text(self.part_plan.keys.original_part_key),
+            'Responses': self.responses,
+            'ResponseRate': _rate(self.responses, total),
+        }
+        if self.choice_labels is None:
+            return result
+        result['Choices'] = [{'Label': _to_text(label),
+                              'Count': count,
+                              'Rate': _rate(count, self.responses)}
+                             for label, count in zip(self.choice_labels, self.counts)]
+        if bounds:
+            result['CrossTab'] = [{'Responses': responses, 'Counts': counts}
+                                  for responses, counts in zip(self.bucket_responses,
+                                                               self.bucket_counts)]
+        return result
+
+
+class SurveyAggregate(object):
+    """
+    Aggregates the submissions to a survey, as compiled in the plan of a
+    survey header provider, without keeping any per-user state.
+
+    With bucket bounds, each user may be placed in a stat bucket (see
+    :meth:`get_bucket`) and each choice is also counted per bucket.
+    """
+
+    def __init__(self, provider, bounds=None):
+        self.provider = provider
+        self.bounds = tuple(sorted(bounds or ()))
+        bucket_count = len(self.bounds) + 1 if self.bounds else 0
+        self.total = 0
+        self.bucket_totals = [0] * bucket_count
+        self.questions = [(question_plan,
+                           [_PartAggregate(x, bucket_count) for x in question_plan.parts])
+                          for question_plan in provider.plan]
+
+    def get_bucket(self, value):
+        """
+        Return the bucket index of the stat value, or None if it cannot
+        be bucketed.
+        """
+        if not self.bounds or value is None or value == '':
+            return None
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+        return bisect_right(self.bounds, value)
+
+    def add(self, submission, bucket=None):
+        """
+        Count a user, with their (possibly None) survey submission.
+        """
+        self.total += 1
+        if bucket is not None:
+            self.bucket_totals[bucket] += 1
+        if submission is None:
+            return
+        for (question_plan, part_aggregates), sub_question in zip(self.questions,
+                                                                   submission.Submission.parts):
+            assert question_plan.ntiid == sub_question.inquiryId
+            for part_aggregate in part_aggregates:
+                response = sub_question.parts[part_aggregate.part_plan.index]
+                part_aggregate.add(response, bucket)
+
+    def to_external(self):
+        survey = self.provider.survey
+        result = {
+            'NTIID': survey.ntiid,
+            'Title': _to_text(self.provider.survey_title),
+            'Total': self.total,
+        }
+        if self.bounds:
+            result['Buckets'] = [{'Min': low, 'Max': high, 'Total': total}
+                                 for (low, high), total in zip(get_bucket_bounds(self.bounds),
+                                                               self.bucket_totals)]
+        questions = []
+        for question_plan, part_aggregates in self.questions:
+            parts = [x.to_external(self.total, self.bounds) for x in part_aggregates]
+            questions.append({'NTIID': question_plan.ntiid, 'Parts': parts})
+        result['Questions'] = questions
+        return result
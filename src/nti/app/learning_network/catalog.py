@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+A cached index of the course catalog, to find the entries matching an
+export's course filter without iterating (and waking) the catalog.
+
+The catalog is only scanned to build a site's index the first time it is
+used (and after a sync); it is then kept up to date from the course
+added, removed and modified events.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import re
+
+from bisect import bisect_left
+from bisect import bisect_right
+
+from itertools import count
+
+from zope import component
+
+from zope.component.hooks import getSite
+
+from zope.lifecycleevent.interfaces import IObjectAddedEvent
+from zope.lifecycleevent.interfaces import IObjectRemovedEvent
+from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+
+from nti.contenttypes.courses.interfaces import ICourseCatalog
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+from nti.contenttypes.courses.interfaces import ICourseCatalogDidSyncEvent
+
+_TOKEN_PATTERN = re.compile(r'[^:_\-.]+')
+
+#: Site name -> CourseCatalogIndex
+_indexes = {}
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _get_tokens(ntiid):
+    return set(_TOKEN_PATTERN.findall(ntiid))
+
+
+class CourseCatalogIndex(object):
+    """
+    The ntiids of the catalog entries, indexed by their ntiid tokens and
+    sorted by `StartDate`.
+    """
+
+    def __init__(self, catalog=None):
+        # The sync of the catalog we scanned
+        self.synced = getattr(catalog, 'lastSynchronized', None)
+        self._sequence = count()
+        # ntiid -> position in the catalog (entries added later are last)
+        self.order = dict()
+        # ntiid token -> set of ntiids
+        self.tokens = dict()
+        # ntiid -> StartDate
+        self._start_dates = dict()
+        # Sorted (StartDate, ntiid) and their StartDates
+        self.starts = []
+        self.start_dates = []
+        if catalog is not None:
+            for entry in catalog.iterCatalogEntries():
+                self.add(entry)
+
+    def add(self, entry):
+        """
+        Index the catalog entry, or reindex it in place if it is indexed.
+        """
+        ntiid = entry.ntiid
+        if ntiid in self.order:
+            self._remove_start_date(ntiid)
+        else:
+            self.order[ntiid] = next(self._sequence)
+            for token in _get_tokens(ntiid):
+                self.tokens.setdefault(token, set()).add(ntiid)
+        start_date = entry.StartDate
+        if start_date is not None:
+            self._start_dates[ntiid] = start_date
+            idx = bisect_right(self.starts, (start_date, ntiid))
+            self.starts.insert(idx, (start_date, ntiid))
+            self.start_dates.insert(idx, start_date)
+
+    def remove(self, ntiid):
+        if self.order.pop(ntiid, None) is None:
+            return
+        self._remove_start_date(ntiid)
+        for token in _get_tokens(ntiid):
+            ntiids = self.tokens[token]
+            ntiids.discard(ntiid)
+            if not ntiids:
+                del self.tokens[token]
+
+    def _remove_start_date(self, ntiid):
+        start_date = self._start_dates.pop(ntiid, None)
+        if start_date is not None:
+            idx = bisect_left(self.starts, (start_date, ntiid))
+            del self.starts[idx]
+            del self.start_dates[idx]
+
+    def _get_candidates(self, course_filter):
+        """
+        The ntiids that may contain the filter; if the filter holds whole
+        tokens, only those ntiids with all of them.
+        """
+        tokens = _get_tokens(course_filter)
+        # Only tokens fully inside the filter must match whole.
+        inner = [x for x in tokens
+                 if not course_filter.startswith(x) and not course_filter.endswith(x)]
+        if not inner:
+            return self.order
+        result = None
+        for token in inner:
+            ntiids = self.tokens.get(token, ())
+            result = set(ntiids) if result is None else result & ntiids
+        return result
+
+    def query(self, course_filter, course_start_time=None):
+        """
+        Return the ntiids of the entries containing the filter
+        and, if given, starting after `course_start_time`.
+        """
+        if not course_filter:
+            return []
+        result = {x for x in self._get_candidates(course_filter)
+                  if course_filter in x}
+        if course_start_time is not None:
+            idx = bisect_right(self.start_dates, course_start_time)
+            result.intersection_update(x[1] for x in self.starts[idx:])
+        # In catalog order
+        return sorted(result, key=self.order.get)
+
+
+def get_catalog_index(catalog=None):
+    """
+    Return the (cached) :class:`CourseCatalogIndex` of the current site's
+    course catalog, scanning the catalog if there is none or the catalog
+    was synced (perhaps in another process) since.
+    """
+    catalog = catalog if catalog is not None else component.getUtility(ICourseCatalog)
+    key = getattr(getSite(), '__name__', None)
+    result = _indexes.get(key)
+    if      result is None \
+        or result.synced != getattr(catalog, 'lastSynchronized', None):
+        result = _indexes[key] = CourseCatalogIndex(catalog)
+    return result
+
+
+def clear_catalog_indexes():
+    _indexes.clear()
+
+
+def iter_catalog_entries(course_filter, course_start_time=None):
+    """
+    Yield the (entry, course) pairs matching the filter (and starting
+    after `course_start_time`); only matching entries are loaded.
+    """
+    catalog = component.getUtility(ICourseCatalog)
+    index = get_catalog_index(catalog)
+    for ntiid in index.query(course_filter, course_start_time):
+        try:
+            entry = catalog.getCatalogEntry(ntiid)
+        except KeyError:
+            # Removed since we indexed
+            entry = None
+        course = ICourseInstance(entry, None)
+        if course is not None:
+            yield entry, course
+
+
+def _update_catalog_index(entry, removed=False):
+    """
+    Apply a change of the entry to the current site's index. The catalogs
+    of other sites may (or may not) hold the entry, so their indexes are
+    dropped, to be scanned when next used.
+    """
+    ntiid = getattr(entry, 'ntiid', None)
+    key = getattr(getSite(), '__name__', None)
+    index = _indexes.get(key)
+    clear_catalog_indexes()
+    if index is not None and ntiid:
+        _indexes[key] = index
+        if removed:
+            index.remove(ntiid)
+        else:
+            index.add(entry)
+
+
+@component.adapter(ICourseCatalogDidSyncEvent)
+def _on_catalog_synced(unused_event):
+    clear_catalog_indexes()
+
+
+@component.adapter(ICourseInstance, IObjectAddedEvent)
+def _on_course_added(course, unused_event):
+    _update_catalog_index(ICourseCatalogEntry(course, None))
+
+
+@component.adapter(ICourseInstance, IObjectRemovedEvent)
+def _on_course_removed(course, unused_event):
+    _update_catalog_index(ICourseCatalogEntry(course, None), removed=True)
+
+
+@component.adapter(ICourseCatalogEntry, IObjectModifiedEvent)
+def _on_entry_modified(entry, unused_event):
+    _update_catalog_index(entry)
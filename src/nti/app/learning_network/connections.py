@@ -9,19 +9,28 @@ from __future__ import print_function
 from __future__ import absolute_import
 
 import os
+import sqlite3
+from bisect import bisect_right
+from datetime import datetime
+from datetime import timedelta
 from calendar import timegm as _calendar_timegm
 
-try:
-    from pygraphviz import AGraph
-except ImportError:  # PyPy?
-    AGraph = None
-
 from zope.component.hooks import getSite
 
+from nti.app.learning_network.render import get_graph_renderer
+
 from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
 
 from nti.learning_network.interfaces import IConnectionsSource
 
+#: The name of the (sqlite) edge index file in a course's connections dir.
+EDGE_INDEX_NAME = 'edges.db'
+
+#: How far before the edge index watermark connections are re-read; they
+#: are recorded asynchronously, so may arrive late (or share the
+#: watermark's timestamp). Re-reading indexed connections is harmless.
+EDGE_INDEX_LOOKBACK = timedelta(days=1)
+
 logger = __import__('logging').getLogger(__name__)
 
 
@@ -30,30 +39,224 @@ def _get_boundary(timestamp):
     return beginning
 
 
-def _do_accum(graph_dict):
+class EdgeLog(object):
     """
-    Accumulate all previous connections into current bucket.
-    Our last bucket should contain all edges.
+    An append-only log of the unique (source, target) connection edges,
+    in the order (and with the day) they were first seen. The graph as of
+    any day is a prefix of the log, so memory grows with the number of
+    unique edges rather than days times edges.
     """
-    accum = {}
-    for timestamp in sorted(graph_dict.keys()):
-        vals = graph_dict[timestamp]
-        for username, targets in vals.items():
-            # Losing weight
-            accum.setdefault(username, {}).update(targets)
-        graph_dict[timestamp] = dict(accum)
 
+    def __init__(self):
+        self.edges = []
+        # The day each edge was first seen, parallel to (and as sorted as)
+        # our edges.
+        self.first_days = []
+        self._seen = set()
+
+    def add(self, day, source, target):
+        """
+        Log the edge, if new; days must be added in order.
+        """
+        if self.first_days and day < self.first_days[-1]:
+            raise ValueError("Edges must be logged in day order")
+        edge = (source, target)
+        if edge not in self._seen:
+            self._seen.add(edge)
+            self.edges.append(edge)
+            self.first_days.append(day)
+
+    @property
+    def days(self):
+        """
+        The (sorted) days on which new edges were seen.
+        """
+        result = []
+        for day in self.first_days:
+            if not result or result[-1] != day:
+                result.append(day)
+        return result
 
-def _build_timestamp_nodes_edges_dict(connections):
-    # Bucket into dailies
-    results = {}
+    def get_edges(self, day=None):
+        """
+        The edges seen on or before the given day (or all edges).
+        """
+        if day is None:
+            return self.edges[:]
+        return self.edges[:bisect_right(self.first_days, day)]
+
+    def get_nodes_edges(self, day=None):
+        """
+        The source -> {target: label} graph dict as of the given day.
+        """
+        result = {}
+        for source, target in self.get_edges(day):
+            result.setdefault(source, {})[target] = None  # Label
+        return result
+
+
+def build_edge_log(connections):
+    """
+    Build the :class:`EdgeLog` of the given connections, bucketed by day.
+    """
+    days = {}
     for connection in connections:
-        timestamp = _get_boundary(connection.Timestamp)
-        node_dict = results.setdefault(timestamp, {})
-        target_dict = node_dict.setdefault(connection.Source, {})
-        target_dict[connection.Target] = None  # Label
-    _do_accum(results)
-    return results
+        day = _get_boundary(connection.Timestamp)
+        days.setdefault(day, []).append((connection.Source, connection.Target))
+    result = EdgeLog()
+    for day in sorted(days):
+        for source, target in days[day]:
+            result.add(day, source, target)
+    return result
+
+
+def _to_epoch(timestamp):
+    return _calendar_timegm(timestamp.utctimetuple())
+
+
+class ConnectionEdgeIndex(object):
+    """
+    A persistent (sqlite) index of the unique connection edges of a
+    course, with the first and last day each was seen. It is updated
+    incrementally from (shortly before) the latest connection timestamp
+    indexed (our watermark), so only recent connections are read from the
+    source.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS edges (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                first_seen INTEGER NOT NULL,
+                last_seen INTEGER NOT NULL,
+                PRIMARY KEY (source, target))""")
+        connection.execute("""
+            CREATE INDEX IF NOT EXISTS edges_first_seen ON edges (first_seen)""")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value REAL)""")
+        return connection
+
+    def _get_watermark(self, connection):
+        row = connection.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return row[0] if row else None
+
+    @property
+    def watermark(self):
+        """
+        The timestamp of the latest connection indexed, or None.
+        """
+        connection = self._connect()
+        try:
+            watermark = self._get_watermark(connection)
+        finally:
+            connection.close()
+        return datetime.utcfromtimestamp(watermark) if watermark is not None else None
+
+    def update(self, connections):
+        """
+        Index the given connections, returning the number read and the
+        earliest day whose graph changed (an edge was added or first seen
+        earlier), or None.
+        """
+        connection = self._connect()
+        count = 0
+        changed = None
+        try:
+            with connection:
+                watermark = self._get_watermark(connection)
+                for item in connections:
+                    day = _to_epoch(_get_boundary(item.Timestamp))
+                    edge = (item.Source, item.Target)
+                    row = connection.execute("""
+                        SELECT first_seen FROM edges
+                        WHERE source = ? AND target = ?""", edge).fetchone()
+                    if row is None or day < row[0]:
+                        changed = min(changed, day) if changed is not None else day
+                    connection.execute("""
+                        INSERT OR IGNORE INTO edges (source, target, first_seen, last_seen)
+                        VALUES (?, ?, ?, ?)""", edge + (day, day))
+                    connection.execute("""
+                        UPDATE edges SET first_seen = MIN(first_seen, ?),
+                                         last_seen = MAX(last_seen, ?)
+                        WHERE source = ? AND target = ?""", (day, day) + edge)
+                    timestamp = _calendar_timegm(item.Timestamp.utctimetuple()) \
+                              + item.Timestamp.microsecond / 1e6
+                    watermark = max(watermark, timestamp) if watermark is not None else timestamp
+                    count += 1
+                if watermark is not None:
+                    connection.execute("""
+                        INSERT OR REPLACE INTO meta (key, value)
+                        VALUES ('watermark', ?)""", (watermark,))
+        finally:
+            connection.close()
+        changed = datetime.utcfromtimestamp(changed) if changed is not None else None
+        return count, changed
+
+    def get_edge_log(self, since=None, until=None):
+        """
+        Return the :class:`EdgeLog` of the edges seen between the given
+        days (inclusive). Edges first seen before `since` (and seen
+        again since) are logged on the `since` day.
+        """
+        clauses = []
+        params = []
+        since = _to_epoch(_get_boundary(since)) if since is not None else None
+        if since is not None:
+            clauses.append('last_seen >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('first_seen <= ?')
+            params.append(_to_epoch(_get_boundary(until)))
+        query = 'SELECT source, target, first_seen FROM edges'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY first_seen, rowid'
+        result = EdgeLog()
+        connection = self._connect()
+        try:
+            for source, target, first_seen in connection.execute(query, params):
+                if since is not None:
+                    first_seen = max(first_seen, since)
+                result.add(datetime.utcfromtimestamp(first_seen), source, target)
+        finally:
+            connection.close()
+        return result
+
+
+def get_edge_index(course):
+    """
+    Return the :class:`ConnectionEdgeIndex` of the course, stored next to
+    its rendered graphs.
+    """
+    path = _initialize_dirs(course)
+    return ConnectionEdgeIndex(os.path.join(path, EDGE_INDEX_NAME))
+
+
+def update_edge_index(course):
+    """
+    Read any connections newer than (the lookback before) the course edge
+    index watermark into the index, removing the rendered graphs of the
+    days that changed, and returning the index.
+    """
+    index = get_edge_index(course)
+    watermark = index.watermark
+    since = watermark - EDGE_INDEX_LOOKBACK if watermark is not None else None
+    connection_source = IConnectionsSource(course)
+    count, changed = index.update(connection_source.get_connections(since))
+    logger.info('Indexed %s connections (%s) since %s',
+                count, ICourseCatalogEntry(course).ntiid, since)
+    if changed is not None:
+        removed = _remove_graphs(os.path.dirname(index.path), changed)
+        logger.info('Removed %s connection graphs since %s (%s)',
+                    removed, changed, ICourseCatalogEntry(course).ntiid)
+    return index
 
 
 def _initialize_dirs(context):
@@ -73,51 +276,61 @@ def _initialize_dirs(context):
     return path
 
 
-def _do_store(timestamp, graph, course):
-    # Store our graph persistently
-    path = _initialize_dirs(course)
+def _get_graph_path(path, timestamp, renderer):
+    # Namespaced by renderer, since they may write the same extensions.
     timestamp = _calendar_timegm(timestamp.timetuple())
-    file_path = os.path.join(path, '%s.png' % timestamp)
-    # Once a file exists, we assume it will never be updated.
-    if not os.path.exists(file_path):
-        graph.layout()
-        graph.draw(file_path, prog='neato')
-
+    return os.path.join(path, '%s.%s.%s' % (timestamp, renderer.name,
+                                            renderer.extension))
 
-def _format_graph(graph):
-    graph.edge_attr['color'] = '#494949'
-
-    graph.node_attr['shape'] = 'circle'
-    graph.node_attr['fixedsize'] = 'true'
-    graph.node_attr['label'] = ' '  # space is important
-    graph.node_attr['fontcolor'] = '#494949'
-    graph.node_attr['fontsize'] = '10'
-    graph.node_attr['width'] = '.2'
-    graph.node_attr['height'] = '.2'
-    graph.node_attr['fillcolor'] = '#757474'
-
-    graph.graph_attr['label'] = 'Connections'
-    graph.graph_attr['fontcolor'] = '#494949'
-    graph.graph_attr['fontsize'] = '10'
-    graph.graph_attr['size'] = '7.75,10.25'
 
+def _remove_graphs(path, since):
+    """
+    Remove the graph files of the days on or after `since`, returning the
+    number removed.
+    """
+    since = _calendar_timegm(since.timetuple())
+    result = 0
+    for name in os.listdir(path):
+        stem = name.split('.')[0]
+        if stem.isdigit() and int(stem) >= since:
+            os.remove(os.path.join(path, name))
+            result += 1
+    return result
 
-def _get_graphs(connections, course):
-    if AGraph is None:
-        raise TypeError("pygraphviz is not avaiable")
 
+def _get_graphs(edge_log, course, renderer):
+    """
+    Return the (day, file path) of the daily graphs of the edge log,
+    building and rendering only those not yet stored.
+    """
+    path = _initialize_dirs(course)
     graphs = []
-    timestamp_dict = _build_timestamp_nodes_edges_dict(connections)
-    for timestamp, nodes_edges in timestamp_dict.items():
-        graph = AGraph(nodes_edges)
-        _format_graph(graph)
-        _do_store(timestamp, graph, course)
-        graphs.append(graph)
+    missing = []
+    for timestamp in edge_log.days:
+        file_path = _get_graph_path(path, timestamp, renderer)
+        graphs.append((timestamp, file_path))
+        # Files are removed as their day's edges change.
+        if not os.path.exists(file_path):
+            missing.append((timestamp, file_path))
+
+    if missing:
+        # Graph dicts are built as the renderer consumes them.
+        jobs = ((edge_log.get_nodes_edges(timestamp), file_path)
+                for timestamp, file_path in missing)
+        rendered = renderer.render(jobs)
+        logger.info('Rendered %s of %s connection graphs (%s missing) (%s)',
+                    len(rendered), len(graphs), len(missing), path)
     return graphs
 
 
-def get_connection_graphs(course, timestamp=None):
-    connection_source = IConnectionsSource(course)
-    connections = connection_source.get_connections(timestamp)
-    graphs = _get_graphs(connections, course)
+def get_connection_graphs(course, timestamp=None, renderer=None):
+    """
+    Return the (day, file path) of the daily connection graphs of the
+    course (since the timestamp), rendering any that are missing with the
+    given (or default) :class:`.IConnectionGraphRenderer`.
+    """
+    renderer = renderer if renderer is not None else get_graph_renderer()
+    index = update_edge_index(course)
+    edge_log = index.get_edge_log(since=timestamp)
+    graphs = _get_graphs(edge_log, course, renderer)
     return graphs
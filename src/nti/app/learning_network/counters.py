@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Incremental per-(user, course) stat counters, updated as activity is
+recorded, that can stand in for the computation of the stats they cover
+when no time window is requested.
+
+Production counters follow the notes, comments and assignment
+submissions added to (and removed from) a course, once the transaction
+recording them commits. Access counters follow the topic views recorded
+by analytics, which are counted in batches as the counters are read.
+Interaction stats are counts of distinct users, which cannot be kept
+from increments (nor seeded from a full computation), so are always
+computed.
+
+Counters are only served for a user once they have been seeded (see
+:func:`verify_counters`), and only for stats whose fields they cover
+(see :data:`COUNTER_FIELDS`); otherwise we fall back to the stat sources.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import time
+import random
+
+from calendar import timegm
+
+from collections import OrderedDict
+
+from datetime import datetime
+
+import transaction
+
+from zope import component
+from zope import interface
+
+from zope.intid.interfaces import IIntIdAddedEvent
+from zope.intid.interfaces import IIntIdRemovedEvent
+
+from nti.analytics.boards import get_topic_views
+
+from nti.analytics.stats.interfaces import IStats
+
+from nti.externalization.externalization import to_external_object
+
+from nti.app.assessment.interfaces import IUsersCourseAssignmentHistoryItem
+
+from nti.app.learning_network.interfaces import IStatCounters
+
+from nti.app.learning_network.stats import get_stat_source
+from nti.app.learning_network.stats import get_stat_fields
+from nti.app.learning_network.stats import get_subscribers
+from nti.app.learning_network.stats import get_stats_for_user
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.dataserver.contenttypes.forums.interfaces import IGeneralForumComment
+
+from nti.dataserver.interfaces import INote
+from nti.dataserver.interfaces import IRedisClient
+
+from nti.learning_network.interfaces import IAccessStatsSource
+from nti.learning_network.interfaces import IOutcomeStatsSource
+from nti.learning_network.interfaces import IProductionStatsSource
+from nti.learning_network.interfaces import IInteractionStatsSource
+
+from nti.ntiids.ntiids import find_object_with_ntiid
+
+from nti.traversal.traversal import find_interface
+
+#: The (source type, stat name) counters we maintain.
+NOTE_COUNTER = ('Production', 'note_stats')
+COMMENT_COUNTER = ('Production', 'comment_stats')
+ASSIGNMENT_COUNTER = ('Production', 'assignment_stats')
+TOPIC_VIEW_COUNTER = ('Access', 'forum_stats')
+
+COUNTERS = (NOTE_COUNTER, COMMENT_COUNTER, ASSIGNMENT_COUNTER,
+            TOPIC_VIEW_COUNTER)
+
+#: The stat fields a counter holds; stats with any other field are
+#: always computed.
+COUNTER_FIELDS = frozenset(('count', 'parameters'))
+
+#: The sources counters can stand in for, in the order of our stats.
+SOURCE_TYPES = OrderedDict((('Access', IAccessStatsSource),
+                            ('Production', IProductionStatsSource),
+                            ('Interaction', IInteractionStatsSource)))
+
+#: The number of seconds we leave analytics to (asynchronously) record
+#: views before we count them.
+VIEW_COUNTER_LAG = 10 * 60
+
+#: The number of seconds a process may hold a course's view count update.
+VIEW_COUNTER_LOCK_TIMEOUT = 5 * 60
+
+SEEDED_FIELD = '__seeded__'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _get_field(counter):
+    return '%s/%s' % counter
+
+
+def _get_text(value):
+    # Redis returns bytes on py3.
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _get_epoch(timestamp):
+    return timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1000000.0
+
+
+@interface.implementer(IStatCounters)
+class StatCounters(object):
+    """
+    Stores counters as redis hashes per (course, user). The hash holds the
+    time the user was seeded.
+    """
+
+    prefix = 'learning_network/counters'
+
+    @property
+    def redis(self):
+        return component.queryUtility(IRedisClient)
+
+    def _get_course_key(self, course):
+        entry = ICourseCatalogEntry(course)
+        return '%s/%s' % (self.prefix, entry.ntiid)
+
+    def _get_key(self, course, username):
+        return '%s/%s' % (self._get_course_key(course), username.lower())
+
+    def increment(self, course, username, counter, amount=1):
+        redis = self.redis
+        if redis is not None:
+            redis.hincrby(self._get_key(course, username),
+                          _get_field(counter), amount)
+
+    def get(self, course, username):
+        redis = self.redis
+        if redis is None:
+            return None
+        values = redis.hgetall(self._get_key(course, username))
+        values = {_get_text(k): v for k, v in (values or {}).items()}
+        if SEEDED_FIELD not in values:
+            return None
+        result = {}
+        for counter in COUNTERS:
+            result[counter] = int(values.get(_get_field(counter)) or 0)
+        return result
+
+    def get_seed_time(self, course, username):
+        redis = self.redis
+        value = redis.hget(self._get_key(course, username), SEEDED_FIELD) \
+            if redis is not None else None
+        return float(value) if value is not None else None
+
+    def seed(self, course, username, values):
+        redis = self.redis
+        if redis is None:
+            return
+        mapping = {_get_field(counter): value for counter, value in values.items()}
+        mapping[SEEDED_FIELD] = time.time()
+        key = self._get_key(course, username)
+        pipe = redis.pipeline()
+        pipe.delete(key)
+        pipe.hmset(key, mapping)
+        pipe.execute()
+
+    def get_view_watermark(self, course):
+        redis = self.redis
+        value = redis.get('%s/__views__' % self._get_course_key(course)) \
+            if redis is not None else None
+        return float(value) if value is not None else None
+
+    def set_view_watermark(self, course, watermark):
+        redis = self.redis
+        if redis is not None:
+            redis.set('%s/__views__' % self._get_course_key(course), watermark)
+
+    def lock_views(self, course, timeout=VIEW_COUNTER_LOCK_TIMEOUT):
+        redis = self.redis
+        if redis is None:
+            return False
+        key = '%s/__views_lock__' % self._get_course_key(course)
+        return bool(redis.set(key, 1, nx=True, ex=timeout))
+
+    def unlock_views(self, course):
+        redis = self.redis
+        if redis is not None:
+            redis.delete('%s/__views_lock__' % self._get_course_key(course))
+
+
+@interface.implementer(IStats)
+class CounterStats(object):
+
+    __external_class_name__ = 'CounterStats'
+
+    def __init__(self, count):
+        self.count = count
+
+    def toExternalObject(self, **unused_kwargs):
+        return {'Class': self.__external_class_name__, 'count': self.count}
+
+
+def _is_counted(source, stat_name):
+    """
+    Whether our counter holds every field of the named stat of the source.
+    """
+    fields = get_stat_fields(source, stat_name)
+    return fields is not None and COUNTER_FIELDS.issuperset(fields)
+
+
+class CounterStatsSource(object):
+    """
+    A (computed) stat source with the stats our counters cover read from
+    the counters; its other stats are computed by the source as usual.
+    """
+
+    def __init__(self, source, stats):
+        self._source = source
+        self._stats = {name: stat for name, stat in stats.items()
+                       if _is_counted(source, name)}
+        interface.directlyProvides(self, interface.providedBy(source))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._stats[name]
+        except KeyError:
+            return getattr(self._source, name)
+
+    def __dir__(self):
+        return dir(self._source)
+
+    @property
+    def __class__(self):
+        # So we share the source's csv schema (see `get_schema_key`).
+        return type(self._source)
+
+    @property
+    def __external_class_name__(self):
+        return getattr(self._source, '__external_class_name__',
+                       type(self._source).__name__)
+
+    def toExternalObject(self, **kwargs):
+        result = {'Class': self.__external_class_name__,
+                  'display_name': getattr(self, 'display_name', None)}
+        for name in dir(self):
+            if not name.startswith('_'):
+                stat = getattr(self, name)
+                if IStats.providedBy(stat):
+                    result[name] = to_external_object(stat, **kwargs)
+        return result
+
+
+def _get_course(obj):
+    if obj is None:
+        return None
+    return find_interface(obj, ICourseInstance, strict=False) \
+        or ICourseInstance(obj, None)
+
+
+def _get_note_course(note):
+    """
+    Notes are stored with their creator, so their course is that of the
+    content (or other container) they are on.
+    """
+    container_id = getattr(note, 'containerId', None)
+    container = find_object_with_ntiid(container_id) if container_id else None
+    return _get_course(container)
+
+
+def _do_increment(success, course, username, counter, amount):
+    if success:
+        counters = component.queryUtility(IStatCounters)
+        if counters is not None:
+            counters.increment(course, username, counter, amount)
+
+
+def increment_stat_counter(user, course, counter, amount=1):
+    """
+    Count activity by the user in the course toward the given
+    (source type, stat name) counter once (and only if) the current
+    transaction commits, so aborted and retried transactions are not
+    counted.
+    """
+    username = getattr(user, 'username', user)
+    if course is not None and username:
+        transaction.get().addAfterCommitHook(_do_increment,
+                                             args=(course, username,
+                                                   counter, amount))
+
+
+@component.adapter(INote, IIntIdAddedEvent)
+def _on_note_added(note, unused_event):
+    increment_stat_counter(note.creator, _get_note_course(note), NOTE_COUNTER)
+
+
+@component.adapter(INote, IIntIdRemovedEvent)
+def _on_note_removed(note, unused_event):
+    increment_stat_counter(note.creator, _get_note_course(note), NOTE_COUNTER, -1)
+
+
+@component.adapter(IGeneralForumComment, IIntIdAddedEvent)
+def _on_comment_added(comment, unused_event):
+    increment_stat_counter(comment.creator, _get_course(comment), COMMENT_COUNTER)
+
+
+@component.adapter(IGeneralForumComment, IIntIdRemovedEvent)
+def _on_comment_removed(comment, unused_event):
+    increment_stat_counter(comment.creator, _get_course(comment), COMMENT_COUNTER, -1)
+
+
+@component.adapter(IUsersCourseAssignmentHistoryItem, IIntIdAddedEvent)
+def _on_assignment_submitted(item, unused_event):
+    increment_stat_counter(item.creator, _get_course(item), ASSIGNMENT_COUNTER)
+
+
+@component.adapter(IUsersCourseAssignmentHistoryItem, IIntIdRemovedEvent)
+def _on_assignment_removed(item, unused_event):
+    increment_stat_counter(item.creator, _get_course(item), ASSIGNMENT_COUNTER, -1)
+
+
+def update_view_counters(course, now=None):
+    """
+    Count the topic views analytics recorded in the course since we last
+    did, up to :data:`VIEW_COUNTER_LAG` seconds ago, returning the number
+    counted. Views before a user was seeded were counted by the seed.
+    """
+    counters = component.queryUtility(IStatCounters)
+    if counters is None or not counters.lock_views(course):
+        # Another process is counting.
+        return 0
+    try:
+        until = (now if now is not None else time.time()) - VIEW_COUNTER_LAG
+        since = counters.get_view_watermark(course)
+        if since is None:
+            # Earlier views are only counted by seeding.
+            counters.set_view_watermark(course, until)
+            return 0
+        if until <= since:
+            return 0
+        views = get_topic_views(course=course,
+                                timestamp=datetime.utcfromtimestamp(since),
+                                max_timestamp=datetime.utcfromtimestamp(until))
+        # Username -> (seed time, count)
+        user_counts = {}
+        for view in views:
+            timestamp = _get_epoch(view.timestamp)
+            username = getattr(view.user, 'username', None)
+            if not since < timestamp <= until or not username:
+                continue
+            if username not in user_counts:
+                user_counts[username] = [counters.get_seed_time(course, username), 0]
+            seeded = user_counts[username][0]
+            if seeded is not None and timestamp > seeded:
+                user_counts[username][1] += 1
+        result = 0
+        for username, (_, count) in user_counts.items():
+            if count:
+                counters.increment(course, username, TOPIC_VIEW_COUNTER, count)
+                result += count
+        counters.set_view_watermark(course, until)
+        return result
+    finally:
+        counters.unlock_views(course)
+
+
+def get_stats_with_counters(user, course):
+    """
+    Return the user's stats, with the counted stats of each source read
+    from the counters; or None if the user's counters have not been
+    seeded.
+    """
+    counters = component.queryUtility(IStatCounters)
+    values = counters.get(course, user.username) if counters is not None else None
+    if values is None:
+        return None
+    counted = OrderedDict()
+    for (source_type, stat_name), value in values.items():
+        counted.setdefault(source_type, {})[stat_name] = CounterStats(value)
+    stats = get_subscribers(user, course)
+    for source_type, iface in SOURCE_TYPES.items():
+        source = get_stat_source(iface, user, course)
+        if source is not None and source_type in counted:
+            source = CounterStatsSource(source, counted[source_type])
+        stats.append(source)
+    stats.append(get_stat_source(IOutcomeStatsSource, user, course))
+    return stats
+
+
+def _get_computed_counts(user, course):
+    sources = {getattr(x, 'display_name', None): x
+               for x in get_stats_for_user(user, course)}
+    result = {}
+    for source_type, stat_name in COUNTERS:
+        stat = getattr(sources.get(source_type), stat_name, None)
+        result[(source_type, stat_name)] = getattr(stat, 'count', None) or 0
+    return result
+
+
+def verify_counters(course, users, sample_size=None, repair=False):
+    """
+    Compare the counters of (a random sample of) the given users against a
+    full computation, returning the users checked and a dict of username to
+    mismatched counters.
+    With `repair`, counters that mismatch (or were never seeded) are
+    reseeded with the computed values.
+    """
+    counters = component.getUtility(IStatCounters)
+    update_view_counters(course)
+    users = list(users)
+    if sample_size and sample_size < len(users):
+        users = random.sample(users, sample_size)
+    result = {}
+    for user in users:
+        computed = _get_computed_counts(user, course)
+        current = counters.get(course, user.username)
+        if current == computed:
+            continue
+        mismatches = {}
+        for counter, value in computed.items():
+            current_value = current.get(counter) if current is not None else None
+            if current_value != value:
+                mismatches[_get_field(counter)] = {'Counter': current_value,
+                                                   'Computed': value}
+        result[user.username] = mismatches
+        if repair:
+            counters.seed(course, user.username, computed)
+    return users, result
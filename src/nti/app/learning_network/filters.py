@@ -8,10 +8,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
 
+import re
+
 from zope import interface
 
 from nti.dataserver.interfaces import ICreatableObjectFilter
 
+#: The email domain of internal users, never exported.
+INTERNAL_DOMAIN = u'@nextthought.com'
+
 logger = __import__('logging').getLogger(__name__)
 
 
@@ -29,3 +34,41 @@ class _LearningNetworkContentObjectFilter(object):
             if name.startswith(self.PREFIX_1) or name.startswith(self.PREFIX_2):
                 terms.pop(name, None)
         return terms
+
+
+class UserExclusionFilter(object):
+    """
+    The user exclusion rules of an export (the internal domain and any
+    `ExcludeUserFilter` substrings), compiled once into a single regex.
+    Usernames should be checked before any profile is loaded; the email
+    only needs checking for the users that pass.
+    """
+
+    def __init__(self, exclude_parts=(), exclude_internal=True):
+        patterns = [re.escape(x) for x in exclude_parts or () if x]
+        if exclude_internal:
+            patterns.append(re.escape(INTERNAL_DOMAIN) + '$')
+        self._username_search = re.compile('|'.join(patterns)).search if patterns else None
+        self._email_search = re.compile(re.escape(INTERNAL_DOMAIN) + '$').search \
+            if exclude_internal else None
+        self.excluded = 0
+
+    def _exclude(self, search, value):
+        if search is not None and value and search(value) is not None:
+            self.excluded += 1
+            return True
+        return False
+
+    def exclude_username(self, username):
+        return self._exclude(self._username_search, username)
+
+    def exclude_email(self, email):
+        return self._exclude(self._email_search, email)
+
+    def log_summary(self, context):
+        """
+        Log (and reset) the count of users excluded so far.
+        """
+        if self.excluded:
+            logger.info('Filtered %s users (%s)', self.excluded, context)
+        self.excluded = 0
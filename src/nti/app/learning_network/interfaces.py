@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from zope import interface
+
+
+class IStatsSnapshots(interface.Interface):
+    """
+    A store of computed (externalized) stat sources, keyed by course,
+    user, time window and source type, that are served until they expire.
+    """
+
+    ttl = interface.Attribute("The number of seconds a snapshot is served for.")
+
+    def get(course, usernames, window):
+        """
+        Return a mapping of username to an ordered mapping of source type to
+        externalized stats, for those users with a complete snapshot.
+        """
+
+    def set(course, username, window, sources):
+        """
+        Snapshot the given stat sources for the user.
+        """
+
+
+class IStatCounters(interface.Interface):
+    """
+    Incremental per-(course, user) counters keyed by
+    ``(source type, stat name)``.
+    """
+
+    def increment(course, username, counter, amount=1):
+        """
+        Increment the counter for the user in the course.
+        """
+
+    def get(course, username):
+        """
+        Return a mapping of counter to value for the user, or None if the
+        user's counters have not been seeded.
+        """
+
+    def seed(course, username, values):
+        """
+        Replace the user's counters with the given values, marking them as
+        seeded.
+        """
+
+    def get_seed_time(course, username):
+        """
+        Return the time the user's counters were seeded, or None.
+        """
+
+    def get_view_watermark(course):
+        """
+        Return the time up to which views in the course have been counted,
+        or None.
+        """
+
+    def set_view_watermark(course, watermark):
+        """
+        Record the time up to which views in the course have been counted.
+        """
+
+    def lock_views(course, timeout):
+        """
+        Try to take the lock on counting the course's views, returning
+        whether it was taken. The lock expires after `timeout` seconds.
+        """
+
+    def unlock_views(course):
+        """
+        Release the lock on counting the course's views.
+        """
+
+
+class ISocialEdgeSource(interface.Interface):
+    """
+    A stream of one kind of social connection in a course, registered as
+    a subscriber on the course.
+    """
+
+    def iter_edges(users, start_time=None, end_time=None):
+        """
+        Yield the :class:`nti.app.learning_network.social.SocialEdge` from
+        the given users (a mapping of analytics user id to username), in
+        the time window, ordered by timestamp.
+        """
+
+
+class IConnectionGraphRenderer(interface.Interface):
+    """
+    Lays out and renders connection graphs to image files. Registered as
+    named utilities, selectable per request.
+    """
+
+    name = interface.Attribute("The name we are registered with, which "
+                               "namespaces the files we render.")
+
+    extension = interface.Attribute("The extension of the files we render.")
+
+    available = interface.Attribute("Whether we can render here.")
+
+    def render(jobs):
+        """
+        Render the given (source -> {target: label} graph dict, file path)
+        jobs, returning the file paths of those rendered successfully.
+        """
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Background csv export jobs. The job state and output are spooled to
+files under ``DATASERVER_DIR`` so any dataserver process can report on,
+and serve, a job started by another.
+
+Jobs only run in the process that queued them, which marks them alive
+with a heartbeat; a job whose process goes away (e.g. on restart) is
+reported as failed once its heartbeat is stale. Finished jobs, and their
+output, expire after a day.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import re
+import json
+import time
+import uuid
+
+import gevent
+
+from gevent.lock import BoundedSemaphore
+
+from zope import component
+
+from zope.component.hooks import getSite
+
+from nti.app.learning_network.streams import create_view
+
+from nti.dataserver.interfaces import IDataserverTransactionRunner
+
+#: The number of export jobs we run at once in a process; others queue.
+MAX_CONCURRENT_EXPORT_JOBS = 2
+
+#: How often (in seconds) we persist the progress of a running job.
+PROGRESS_INTERVAL = 5
+
+#: How often (in seconds) the process owning an unfinished job marks it
+#: as alive.
+HEARTBEAT_INTERVAL = 30
+
+#: The number of seconds without a heartbeat after which an unfinished
+#: job is taken to be abandoned.
+STALE_JOB_TIMEOUT = 10 * HEARTBEAT_INTERVAL
+
+#: The number of seconds the status and output of a finished (or
+#: abandoned) job are kept for.
+JOB_EXPIRY = 24 * 60 * 60
+
+JOB_PENDING = u'Pending'
+JOB_RUNNING = u'Running'
+JOB_SUCCESS = u'Success'
+JOB_FAILED = u'Failed'
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+_export_semaphore = BoundedSemaphore(MAX_CONCURRENT_EXPORT_JOBS)
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _get_spool_dir():
+    dataserver_dir = os.getenv('DATASERVER_DIR')
+    if not dataserver_dir:
+        raise ValueError("DATASERVER_DIR is not set; cannot spool export jobs.")
+    path = os.path.join(dataserver_dir,
+                        'data', 'learning_network', 'exports')
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+
+def is_valid_job_id(job_id):
+    return bool(job_id and _JOB_ID_PATTERN.match(job_id))
+
+
+def get_job_output_path(job_id):
+    return os.path.join(_get_spool_dir(), '%s.csv' % job_id)
+
+
+def _get_job_status_path(job_id):
+    return os.path.join(_get_spool_dir(), '%s.json' % job_id)
+
+
+def get_job_status(job_id):
+    """
+    Return the status dict for the job, or None if there is no such job.
+    Unfinished jobs whose heartbeat is stale are reported as failed.
+    """
+    if not is_valid_job_id(job_id):
+        return None
+    try:
+        with open(_get_job_status_path(job_id), 'r') as f:
+            result = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if      result['Status'] in (JOB_PENDING, JOB_RUNNING) \
+        and time.time() - (result.get('Updated') or 0) > STALE_JOB_TIMEOUT:
+        result['Status'] = JOB_FAILED
+        result['Message'] = u'Export job was abandoned by its process (%s).' % result.get('Pid')
+    return result
+
+
+def expire_jobs():
+    """
+    Remove the status and output of jobs finished (or abandoned) more than
+    :data:`JOB_EXPIRY` seconds ago. Unfinished jobs are touched by their
+    heartbeat, so are never expired.
+    """
+    path = _get_spool_dir()
+    cutoff = time.time() - JOB_EXPIRY
+    for name in os.listdir(path):
+        file_path = os.path.join(path, name)
+        try:
+            if os.path.getmtime(file_path) < cutoff:
+                os.remove(file_path)
+        except OSError:
+            # Removed by another process
+            pass
+
+
+class ExportJob(object):
+    """
+    Tracks (and persists) the progress of an export job.
+    """
+
+    def __init__(self, filename, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.filename = filename
+        self.status = JOB_PENDING
+        self.message = None
+        self.total = None
+        self.done = 0
+        self.pid = os.getpid()
+        self.created = time.time()
+        self.updated = None
+        self.started = None
+        self.finished = None
+        self._last_saved = 0
+
+    @property
+    def eta(self):
+        if not self.started or not self.done or not self.total:
+            return None
+        elapsed = time.time() - self.started
+        return max(0, elapsed / self.done * (self.total - self.done))
+
+    def to_dict(self):
+        return {
+            'JobId': self.job_id,
+            'Filename': self.filename,
+            'Status': self.status,
+            'Message': self.message,
+            'Total': self.total,
+            'Done': self.done,
+            'ETA': self.eta,
+            'Pid': self.pid,
+            'Created': self.created,
+            'Updated': self.updated,
+            'Started': self.started,
+            'Finished': self.finished,
+        }
+
+    def save(self):
+        self.updated = time.time()
+        # Write then rename, so readers never see a partial status.
+        path = _get_job_status_path(self.job_id)
+        tmp_path = '%s.tmp' % path
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.rename(tmp_path, path)
+        self._last_saved = self.updated
+
+    def start(self, total):
+        self.status = JOB_RUNNING
+        self.started = time.time()
+        self.total = total
+        self.save()
+
+    def step(self):
+        self.done += 1
+        if time.time() - self._last_saved >= PROGRESS_INTERVAL:
+            self.save()
+
+    def finish(self, status, message=None):
+        self.status = status
+        self.message = message
+        self.finished = time.time()
+        self.save()
+
+
+def _run_export(job, factory, query_string):
+    """
+    Re-create the view from the original request params and write its
+    csv into our spool directory.
+    """
+    view = create_view(factory, query_string)
+    # pylint: disable=protected-access
+    job.start(view._get_export_total())
+    output_path = get_job_output_path(job.job_id)
+    tmp_path = '%s.tmp' % output_path
+    with open(tmp_path, 'wb') as stream:
+        for flush in view._write_csv(stream):
+            # Only completed units of work (not flushed headers or other
+            # rows) count as progress.
+            if flush is False:
+                job.step()
+    os.rename(tmp_path, output_path)
+
+
+def _heartbeat(job):
+    while True:
+        gevent.sleep(HEARTBEAT_INTERVAL)
+        job.save()
+
+
+def _do_export_job(job, factory, query_string, site_name):
+    heartbeat = gevent.spawn(_heartbeat, job)
+    try:
+        _run_export_job(job, factory, query_string, site_name)
+    finally:
+        heartbeat.kill()
+
+
+def _run_export_job(job, factory, query_string, site_name):
+    with _export_semaphore:
+        runner = component.getUtility(IDataserverTransactionRunner)
+        try:
+            runner(lambda: _run_export(job, factory, query_string),
+                   site_names=(site_name,),
+                   side_effect_free=True)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.exception('Export job (%s) failed', job.job_id)
+            job.finish(JOB_FAILED, str(e))
+        else:
+            logger.info('Export job (%s) finished (%s items in %.2fs)',
+                        job.job_id, job.done, time.time() - job.started)
+            job.finish(JOB_SUCCESS)
+
+
+def queue_export_job(factory, request, filename):
+    """
+    Queue a background job writing the csv of the view `factory` for the
+    given request, returning the :class:`ExportJob`. Expired jobs are
+    removed as we go.
+    """
+    expire_jobs()
+    job = ExportJob(filename)
+    job.save()
+    gevent.spawn(_do_export_job, job, factory,
+                 request.query_string, getSite().__name__)
+    return job
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+A built-in force-directed (Fruchterman-Reingold) layout and SVG writer
+for connection graphs, needing neither Graphviz nor pygraphviz.
+
+The layout is vectorized with numpy when it is installed, with a pure
+python fallback (e.g. on PyPy).
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import math
+import random
+
+try:
+    import numpy
+except ImportError:  # PyPy?
+    numpy = None
+
+from xml.sax.saxutils import escape
+
+#: The styles of our connection graphs (as Graphviz attributes).
+GRAPH_ATTRS = {
+    'label': 'Connections',
+    'fontcolor': '#494949',
+    'fontsize': '10',
+    'size': '7.75,10.25',
+}
+
+NODE_ATTRS = {
+    'shape': 'circle',
+    'fixedsize': 'true',
+    'label': ' ',  # space is important
+    'fontcolor': '#494949',
+    'fontsize': '10',
+    'width': '.2',
+    'height': '.2',
+    'fillcolor': '#757474',
+}
+
+EDGE_ATTRS = {
+    'color': '#494949',
+}
+
+#: The number of layout iterations.
+LAYOUT_ITERATIONS = 50
+
+#: The number of nodes whose pairwise repulsion is computed at once,
+#: bounding the memory of large layouts.
+LAYOUT_BLOCK_SIZE = 512
+
+#: Points per inch, the unit of our SVG coordinates.
+POINTS = 72
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def get_nodes_and_edges(nodes_edges):
+    """
+    Return the (sorted) nodes and the (source, target) node index pairs of
+    the given source -> {target: label} graph dict.
+    """
+    nodes = set(nodes_edges)
+    for targets in nodes_edges.values():
+        nodes.update(targets)
+    nodes = sorted(nodes)
+    index = {node: idx for idx, node in enumerate(nodes)}
+    edges = [(index[source], index[target])
+             for source, targets in sorted(nodes_edges.items())
+             for target in sorted(targets)
+             if source != target]
+    return nodes, edges
+
+
+def _layout_numpy(count, edges, iterations, seed):
+    rand = numpy.random.RandomState(seed)
+    positions = rand.uniform(-0.5, 0.5, (count, 2))
+    k = math.sqrt(1.0 / count)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    edges = numpy.array(edges, dtype=int).reshape(-1, 2)
+    for _ in range(iterations):
+        # Repulsion between every pair of nodes, a block of rows at a time.
+        displacement = numpy.empty_like(positions)
+        for start in range(0, count, LAYOUT_BLOCK_SIZE):
+            block = positions[start:start + LAYOUT_BLOCK_SIZE]
+            delta = block[:, numpy.newaxis, :] - positions[numpy.newaxis, :, :]
+            distance = numpy.sqrt((delta ** 2).sum(axis=-1))
+            numpy.clip(distance, 0.01, None, out=distance)
+            force = (k * k / distance ** 2)[:, :, numpy.newaxis]
+            displacement[start:start + len(block)] = (delta * force).sum(axis=1)
+        # Attraction along edges.
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            distance = numpy.sqrt((delta ** 2).sum(axis=-1))
+            numpy.clip(distance, 0.01, None, out=distance)
+            force = delta * (distance / k)[:, numpy.newaxis]
+            numpy.subtract.at(displacement, edges[:, 0], force)
+            numpy.add.at(displacement, edges[:, 1], force)
+        # Move, limited by the temperature.
+        length = numpy.sqrt((displacement ** 2).sum(axis=-1))
+        numpy.clip(length, 0.01, None, out=length)
+        scale = numpy.minimum(length, temperature) / length
+        positions += displacement * scale[:, numpy.newaxis]
+        temperature -= cooling
+    return [tuple(x) for x in positions.tolist()]
+
+
+def _layout_python(count, edges, iterations, seed):
+    rand = random.Random(seed)
+    positions = [[rand.uniform(-0.5, 0.5), rand.uniform(-0.5, 0.5)]
+                 for _ in range(count)]
+    k = math.sqrt(1.0 / count)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        displacement = [[0.0, 0.0] for _ in range(count)]
+        for i in range(count):
+            xi, yi = positions[i]
+            for j in range(i + 1, count):
+                dx = xi - positions[j][0]
+                dy = yi - positions[j][1]
+                distance = max(math.hypot(dx, dy), 0.01)
+                force = k * k / distance ** 2
+                displacement[i][0] += dx * force
+                displacement[i][1] += dy * force
+                displacement[j][0] -= dx * force
+                displacement[j][1] -= dy * force
+        for source, target in edges:
+            dx = positions[source][0] - positions[target][0]
+            dy = positions[source][1] - positions[target][1]
+            distance = max(math.hypot(dx, dy), 0.01)
+            force = distance / k
+            displacement[source][0] -= dx * force
+            displacement[source][1] -= dy * force
+            displacement[target][0] += dx * force
+            displacement[target][1] += dy * force
+        for position, (dx, dy) in zip(positions, displacement):
+            length = max(math.hypot(dx, dy), 0.01)
+            scale = min(length, temperature) / length
+            position[0] += dx * scale
+            position[1] += dy * scale
+        temperature -= cooling
+    return [tuple(x) for x in positions]
+
+
+def force_layout(count, edges, iterations=LAYOUT_ITERATIONS, seed=0):
+    """
+    Return the (x, y) positions of `count` nodes connected by the given
+    (source, target) index pairs. Layouts are deterministic for a seed.
+    """
+    if count == 0:
+        return []
+    if count == 1:
+        return [(0.0, 0.0)]
+    if numpy is not None:
+        return _layout_numpy(count, edges, iterations, seed)
+    return _layout_python(count, edges, iterations, seed)
+
+
+def _get_scaled(positions, width, height, margin):
+    xs = [x for x, _ in positions]
+    ys = [y for _, y in positions]
+    span_x = (max(xs) - min(xs)) or 1
+    span_y = (max(ys) - min(ys)) or 1
+    scale = min((width - 2 * margin) / span_x, (height - 2 * margin) / span_y)
+    return [(margin + (x - min(xs)) * scale, margin + (y - min(ys)) * scale)
+            for x, y in positions]
+
+
+def to_svg(nodes_edges, iterations=LAYOUT_ITERATIONS, seed=0):
+    """
+    Lay out the source -> {target: label} graph dict and return it as an
+    SVG document, styled as our Graphviz graphs.
+    """
+    nodes, edges = get_nodes_and_edges(nodes_edges)
+    positions = force_layout(len(nodes), edges, iterations, seed)
+    width, height = (float(x) * POINTS for x in GRAPH_ATTRS['size'].split(','))
+    radius = float(NODE_ATTRS['width']) * POINTS / 2
+    label_size = float(GRAPH_ATTRS['fontsize'])
+    label_height = label_size * 2
+    if positions:
+        positions = _get_scaled(positions, width, height - label_height, radius * 2)
+
+    result = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+              '<svg xmlns="http://www.w3.org/2000/svg" width="%dpt" height="%dpt" '
+              'viewBox="0 0 %d %d">' % (width, height, width, height),
+              '<g stroke="%s" stroke-width="1">' % EDGE_ATTRS['color']]
+    for source, target in edges:
+        (x1, y1), (x2, y2) = positions[source], positions[target]
+        result.append('<line x1="%.2f" y1="%.2f" x2="%.2f" y2="%.2f"/>' % (x1, y1, x2, y2))
+    result.append('</g>')
+    result.append('<g fill="%s" stroke="%s">' % (NODE_ATTRS['fillcolor'],
+                                                 NODE_ATTRS['fontcolor']))
+    for node, (x, y) in zip(nodes, positions):
+        result.append('<circle cx="%.2f" cy="%.2f" r="%.2f"><title>%s</title></circle>'
+                      % (x, y, radius, escape(u'%s' % node)))
+    result.append('</g>')
+    result.append('<text x="%.2f" y="%.2f" text-anchor="middle" font-size="%s" '
+                  'fill="%s">%s</text>' % (width / 2, height - label_size / 2,
+                                           GRAPH_ATTRS['fontsize'],
+                                           GRAPH_ATTRS['fontcolor'],
+                                           escape(GRAPH_ATTRS['label'])))
+    result.append('</svg>')
+    return u'\n'.join(result)
@@ -1,9 +0,0 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*
-"""
-.. $Id$
-"""
-
-from __future__ import division
-from __future__ import print_function
-from __future__ import absolute_import
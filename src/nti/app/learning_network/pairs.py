@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Compact sets of integer pairs, for de-duplicating the (user, object)
+connections we export.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from array import array
+
+from bisect import bisect_left
+
+import six
+
+#: A signed 64-bit array typecode ('q' is not available on Python 2,
+#: where 'l' is 64 bits on the platforms we run on).
+INT64_TYPECODE = 'q' if six.PY3 else 'l'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class IntPairSet(object):
+    """
+    A set of (int, int) pairs, stored as a sorted array of 64-bit second
+    values per first value. Each pair costs 8 bytes (plus the array
+    overhead per first value), rather than a tuple and two ints in a
+    hash set.
+
+    Intended for pairs such as (user id, object id), where there are far
+    fewer first values than pairs and each array stays small enough that
+    inserting in place is cheap.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._len = 0
+
+    def add(self, first, second):
+        """
+        Add the pair, returning True if it was not already present.
+        """
+        values = self._values.get(first)
+        if values is None:
+            values = self._values[first] = array(INT64_TYPECODE)
+        idx = bisect_left(values, second)
+        if idx < len(values) and values[idx] == second:
+            return False
+        values.insert(idx, second)
+        self._len += 1
+        return True
+
+    def __contains__(self, pair):
+        first, second = pair
+        values = self._values.get(first)
+        if not values:
+            return False
+        idx = bisect_left(values, second)
+        return idx < len(values) and values[idx] == second
+
+    def __len__(self):
+        return self._len
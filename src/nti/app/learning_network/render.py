@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Rendering of connection graphs.
+
+Graphviz renders in separate (cooperative) processes so many graphs can
+be laid out in parallel without blocking the gevent hub; where pygraphviz
+is not available we lay graphs out ourselves and write svg, in a pool of
+long-lived worker processes.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+import multiprocessing
+
+import six
+
+try:
+    from pygraphviz import AGraph
+except ImportError:  # PyPy?
+    AGraph = None
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+from gevent.pool import Pool
+
+from gevent.queue import Empty
+from gevent.queue import Queue
+
+from gevent.select import select
+
+from gevent.subprocess import PIPE
+from gevent.subprocess import Popen
+from gevent.subprocess import TimeoutExpired
+
+from zope import component
+from zope import interface
+
+from nti.app.learning_network.interfaces import IConnectionGraphRenderer
+
+from nti.app.learning_network.layout import to_svg
+from nti.app.learning_network.layout import EDGE_ATTRS
+from nti.app.learning_network.layout import NODE_ATTRS
+from nti.app.learning_network.layout import GRAPH_ATTRS
+
+#: The number of seconds a single graph may take to render.
+RENDER_TIMEOUT = 120
+
+GRAPHVIZ_RENDERER = 'graphviz'
+BUILTIN_RENDERER = 'builtin'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _get_default_concurrency():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _format_graph(graph):
+    graph.edge_attr.update(EDGE_ATTRS)
+    graph.node_attr.update(NODE_ATTRS)
+    graph.graph_attr.update(GRAPH_ATTRS)
+
+
+def _build_graph(nodes_edges):
+    graph = AGraph(nodes_edges)
+    _format_graph(graph)
+    return graph
+
+
+def _write_atomic(file_path, data):
+    # Written aside and renamed so a partial file is never taken
+    # as rendered.
+    tmp_path = '%s.tmp' % file_path
+    with open(tmp_path, 'wb') as fp:
+        fp.write(data)
+    os.rename(tmp_path, file_path)
+
+
+@interface.implementer(IConnectionGraphRenderer)
+class GraphvizRenderer(object):
+    """
+    Renders graphs to png with a Graphviz layout program, running at
+    most `concurrency` processes at once; further jobs queue in our pool.
+    """
+
+    name = GRAPHVIZ_RENDERER
+
+    extension = 'png'
+
+    def __init__(self, concurrency=None, timeout=RENDER_TIMEOUT, prog='neato'):
+        self.concurrency = max(1, int(concurrency or _get_default_concurrency()))
+        self.timeout = timeout
+        self.prog = prog
+        self.pool = Pool(self.concurrency)
+
+    @property
+    def available(self):
+        return AGraph is not None
+
+    def _render(self, job):
+        nodes_edges, file_path = job
+        source = _build_graph(nodes_edges).string()
+        if isinstance(source, six.text_type):
+            source = source.encode('utf-8')
+        # Written aside and renamed so a partial file is never taken
+        # as rendered.
+        tmp_path = '%s.tmp' % file_path
+        try:
+            process = Popen([self.prog, '-Tpng', '-o', tmp_path],
+                            stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        except OSError:
+            logger.exception('Cannot run %s', self.prog)
+            return None
+        try:
+            _, err = process.communicate(source, timeout=self.timeout)
+        except TimeoutExpired:
+            process.kill()
+            process.communicate()
+            logger.warning('Timed out rendering graph (%s) after %ss',
+                           file_path, self.timeout)
+        else:
+            if process.returncode == 0:
+                os.rename(tmp_path, file_path)
+                return file_path
+            logger.warning('Cannot render graph (%s): %s', file_path, err)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    def render(self, jobs):
+        """
+        Render the (graph dict, file path) jobs, returning the paths of
+        those rendered.
+        """
+        if not self.available:
+            raise TypeError("pygraphviz is not avaiable")
+        return [x for x in self.pool.imap_unordered(self._render, jobs)
+                if x is not None]
+
+
+def _get_png_path(file_path):
+    return '%s.png' % os.path.splitext(file_path)[0]
+
+
+def _write_svg(nodes_edges, file_path):
+    """
+    Lay out and write the graph as svg (and, if cairosvg is installed,
+    png alongside).
+    """
+    svg = to_svg(nodes_edges).encode('utf-8')
+    if cairosvg is not None:
+        _write_atomic(_get_png_path(file_path), cairosvg.svg2png(bytestring=svg))
+    _write_atomic(file_path, svg)
+
+
+def _serve(connection):
+    """
+    The loop of a :class:`ForceDirectedRenderer` worker process: write each
+    (graph dict, file path) job received as svg, replying with None or the
+    error.
+    """
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        try:
+            _write_svg(*job)
+        except Exception as e:  # pylint: disable=broad-except
+            connection.send(repr(e))
+        else:
+            connection.send(None)
+
+
+def _get_process_context():
+    # Spawned, where we can, rather than forked with our process' state.
+    get_context = getattr(multiprocessing, 'get_context', None)
+    return get_context('spawn') if get_context is not None else multiprocessing
+
+
+class _Worker(object):
+    """
+    A render process, and our end of its pipe.
+    """
+
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_connection,))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+
+    def render(self, job, timeout):
+        """
+        Send the job, returning True and the reply of the process; or False
+        if it did not reply within the timeout.
+        """
+        self.connection.send(job)
+        readable, _, _ = select([self.connection], [], [], timeout)
+        if not readable:
+            return False, None
+        return True, self.connection.recv()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (IOError, OSError):
+            pass
+        self.connection.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.connection.close()
+
+
+@interface.implementer(IConnectionGraphRenderer)
+class ForceDirectedRenderer(object):
+    """
+    Lays graphs out with our built-in force-directed layout and writes
+    them as svg (and, if cairosvg is installed, png alongside). Needs no
+    external programs, so is always available.
+
+    The layout is quadratic in the nodes of a graph, so graphs are laid
+    out by a pool of (at most `concurrency`) long-lived python processes,
+    started as needed, rather than in the calling greenlet. A process
+    taking more than `timeout` seconds on a graph is killed.
+    """
+
+    name = BUILTIN_RENDERER
+
+    extension = 'svg'
+
+    available = True
+
+    def __init__(self, concurrency=None, timeout=RENDER_TIMEOUT):
+        self.concurrency = max(1, int(concurrency or _get_default_concurrency()))
+        self.timeout = timeout
+        self.pool = Pool(self.concurrency)
+        # Our idle workers; no more than the pool runs at once.
+        self.workers = Queue()
+
+    def _get_worker(self):
+        try:
+            return self.workers.get_nowait()
+        except Empty:
+            return _Worker(_get_process_context())
+
+    def _render(self, job):
+        _, file_path = job
+        try:
+            worker = self._get_worker()
+        except OSError:
+            logger.exception('Cannot start graph render process')
+            return None
+        try:
+            replied, error = worker.render(job, self.timeout)
+        except (EOFError, IOError, OSError):
+            logger.exception('Graph render process failed (%s)', file_path)
+            replied, error = False, None
+        else:
+            if not replied:
+                logger.warning('Timed out rendering graph (%s) after %ss',
+                               file_path, self.timeout)
+        if replied:
+            self.workers.put(worker)
+        else:
+            worker.kill()
+        if replied and error is None:
+            return file_path
+        if error is not None:
+            logger.warning('Cannot render graph (%s): %s', file_path, error)
+        # Anything partially written by a killed process.
+        for path in (file_path, _get_png_path(file_path)):
+            if os.path.exists('%s.tmp' % path):
+                os.remove('%s.tmp' % path)
+        return None
+
+    def render(self, jobs):
+        """
+        Render the (graph dict, file path) jobs, returning the paths of
+        those rendered.
+        """
+        return [x for x in self.pool.imap_unordered(self._render, jobs)
+                if x is not None]
+
+    def close(self):
+        """
+        Stop our idle workers.
+        """
+        while not self.workers.empty():
+            self.workers.get_nowait().stop()
+
+
+def get_graph_renderer(name=None):
+    """
+    Return the named :class:`.IConnectionGraphRenderer`, or None if there is
+    no such renderer. By default, Graphviz where pygraphviz is available and
+    our built-in renderer otherwise.
+    """
+    if name:
+        return component.queryUtility(IConnectionGraphRenderer, name=name)
+    result = component.queryUtility(IConnectionGraphRenderer,
+                                    name=GRAPHVIZ_RENDERER)
+    if result is None or not result.available:
+        result = component.queryUtility(IConnectionGraphRenderer,
+                                        name=BUILTIN_RENDERER)
+    return result
+
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Snapshots of computed learning network stats, served until they expire.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import os
+
+from calendar import timegm
+
+from collections import OrderedDict
+
+from six.moves import cPickle as pickle
+
+from zope import component
+from zope import interface
+
+from nti.app.learning_network.interfaces import IStatsSnapshots
+
+from nti.app.learning_network.stats import get_stats_for_users
+
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.dataserver.interfaces import IRedisClient
+
+from nti.externalization.externalization import to_external_object
+
+#: The default number of seconds a snapshot is served for.
+DEFAULT_SNAPSHOT_TTL = 60 * 60
+
+#: The environment variable with the number of seconds a snapshot is
+#: served for, overriding the default.
+SNAPSHOT_TTL_ENV = 'NTI_LEARNING_NETWORK_SNAPSHOT_TTL'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def get_snapshot_ttl():
+    """
+    The configured number of seconds a snapshot is served for.
+    """
+    value = os.getenv(SNAPSHOT_TTL_ENV)
+    if value:
+        try:
+            return int(value)
+        except ValueError:
+            logger.warning('Invalid %s (%s), using %s',
+                           SNAPSHOT_TTL_ENV, value, DEFAULT_SNAPSHOT_TTL)
+    return DEFAULT_SNAPSHOT_TTL
+
+
+def _get_timestamp_key(timestamp):
+    return str(timegm(timestamp.utctimetuple())) if timestamp is not None else ''
+
+
+@interface.implementer(IStatsSnapshots)
+class StatsSnapshots(object):
+    """
+    Stores the externalized stat sources in redis, keyed by course, user,
+    time window and source type, with a ttl (by default, from the
+    ``NTI_LEARNING_NETWORK_SNAPSHOT_TTL`` environment variable).
+    """
+
+    prefix = 'learning_network/stats'
+
+    def __init__(self, ttl=None):
+        self.ttl = int(ttl) if ttl is not None else get_snapshot_ttl()
+
+    @property
+    def redis(self):
+        return component.queryUtility(IRedisClient)
+
+    def _get_key(self, course, username, window, source_type=None):
+        entry = ICourseCatalogEntry(course, None)
+        parts = [self.prefix,
+                 getattr(entry, 'ntiid', None) or '',
+                 username.lower(),
+                 _get_timestamp_key(window[0]),
+                 _get_timestamp_key(window[1])]
+        if source_type is not None:
+            parts.append(source_type)
+        return '/'.join(parts)
+
+    def get(self, course, usernames, window):
+        redis = self.redis
+        if redis is None or not usernames:
+            return {}
+        # The user key holds the ordered source types of the snapshot.
+        user_keys = [self._get_key(course, x, window) for x in usernames]
+        source_types = {}
+        for username, value in zip(usernames, redis.mget(user_keys)):
+            if value is not None:
+                source_types[username] = pickle.loads(value)
+        keys = [self._get_key(course, username, window, source_type)
+                for username, types in source_types.items()
+                for source_type in types]
+        values = dict(zip(keys, redis.mget(keys))) if keys else {}
+        result = {}
+        for username, types in source_types.items():
+            snapshot = OrderedDict()
+            for source_type in types:
+                value = values.get(self._get_key(course, username, window, source_type))
+                if value is None:
+                    # Partially expired; recompute.
+                    break
+                snapshot[source_type] = pickle.loads(value)
+            else:
+                result[username] = snapshot
+        return result
+
+    def set(self, course, username, window, sources):
+        redis = self.redis
+        if redis is None:
+            return
+        try:
+            values = [(source.display_name,
+                       pickle.dumps(to_external_object(source), pickle.HIGHEST_PROTOCOL))
+                      for source in sources]
+        except (pickle.PicklingError, TypeError):
+            logger.exception('Cannot snapshot stats for user (%s)', username)
+            return
+        pipe = redis.pipeline()
+        for source_type, value in values:
+            pipe.setex(self._get_key(course, username, window, source_type),
+                       self.ttl, value)
+        source_types = [source_type for source_type, _ in values]
+        pipe.setex(self._get_key(course, username, window),
+                   self.ttl, pickle.dumps(source_types, pickle.HIGHEST_PROTOCOL))
+        pipe.execute()
+
+
+def get_stats_with_snapshots(course, users, timestamp=None,
+                             max_timestamp=None, refresh=False):
+    """
+    Return a list of (user, {source type: stats}) for the given users, in
+    order. Users with a live snapshot get its externalized stats; the rest
+    (or everyone, if `refresh`) are computed and snapshotted.
+    """
+    users = tuple(users)
+    window = (timestamp, max_timestamp)
+    snapshots = component.queryUtility(IStatsSnapshots)
+    cached = {}
+    if snapshots is not None and not refresh:
+        cached = snapshots.get(course, [x.username for x in users], window)
+    missing = [x for x in users if x.username not in cached]
+    computed = {}
+    for user, sources in get_stats_for_users(course, missing,
+                                             timestamp, max_timestamp):
+        computed[user.username] = OrderedDict((x.display_name, x) for x in sources)
+        if snapshots is not None:
+            snapshots.set(course, user.username, window, sources)
+    return [(x, cached[x.username] if x.username in cached else computed[x.username])
+            for x in users]
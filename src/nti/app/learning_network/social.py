@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Extraction of the social connections (who saw whose content) in a course.
+
+Each kind of connection is an :class:`.ISocialEdgeSource` subscriber on
+the course, yielding its edges in timestamp order; these streams are
+merged into a single time-ordered edge list in one pass.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import heapq
+
+from bisect import bisect_left
+
+from collections import namedtuple
+
+from zope import component
+from zope import interface
+
+from nti.analytics.boards import get_topic_views
+from nti.analytics.boards import get_forum_comments
+
+from nti.analytics.resource_tags import get_note_views
+
+from nti.analytics.users import get_user_record
+
+from nti.app.learning_network.interfaces import ISocialEdgeSource
+
+from nti.app.learning_network.pairs import IntPairSet
+
+from nti.dataserver import authorization as nauth
+
+from nti.dataserver.authorization_acl import has_permission
+
+#: A connection from the `source` user (analytics id) to the `target` user,
+#: e.g. the source viewed the target's comment.
+SocialEdge = namedtuple('SocialEdge', ('source', 'target', 'timestamp', 'label'))
+
+COMMENT_VIEWED = 'CommentViewed'
+NOTE_VIEWED = 'NoteViewed'
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _sorted_by_timestamp(objects):
+    return sorted(objects, key=lambda x: x.timestamp)
+
+
+@interface.implementer(ISocialEdgeSource)
+class TopicViewEdgeSource(object):
+    """
+    Edges from users to the authors of the comments created before they
+    viewed the topic; each comment is only seen the first time.
+    """
+
+    def __init__(self, course):
+        self.course = course
+
+    def _get_topic_comments(self, comments):
+        """
+        Group the comments by topic, each sorted by creation and paired with
+        their (sorted) timestamps to bisect on.
+        """
+        topic_comments = dict()
+        for comment in comments:
+            topic_comments.setdefault(comment.topic_id, []).append(comment)
+        result = dict()
+        for topic_id, comments in topic_comments.items():
+            comments = _sorted_by_timestamp(comments)
+            result[topic_id] = (comments, [x.timestamp for x in comments])
+        return result
+
+    def iter_edges(self, users, start_time=None, end_time=None):
+        views = get_topic_views(course=self.course,
+                                timestamp=start_time,
+                                max_timestamp=end_time)
+        # Views in the window may see any comment created before them.
+        comments = get_forum_comments(course=self.course, max_timestamp=end_time)
+        topic_comments = self._get_topic_comments(comments)
+
+        # (user_id, topic_id) -> the number of the topic's (sorted) comments
+        # already seen by the user. The comments created before a view
+        # are a prefix of these, so we only emit past the watermark.
+        watermarks = dict()
+        for view in _sorted_by_timestamp(views):
+            if view.user_id not in users:
+                continue
+            comments, timestamps = topic_comments.get(view.topic_id, ((), ()))
+            if not comments:
+                continue
+            # Comments created before view.
+            prefix = bisect_left(timestamps, view.timestamp)
+            key = (view.user_id, view.topic_id)
+            watermark = watermarks.get(key, 0)
+            if prefix <= watermark:
+                continue
+            watermarks[key] = prefix
+            for view_comment in comments[watermark:prefix]:
+                yield SocialEdge(view.user_id, view_comment.user_id,
+                                 view.timestamp, COMMENT_VIEWED)
+
+
+@interface.implementer(ISocialEdgeSource)
+class NoteViewEdgeSource(object):
+    """
+    Edges from users to the authors of the notes (and referents) created
+    before, and readable by, the user when they viewed the note; each note
+    is only seen (and so its permission checked) the first time.
+    """
+
+    def __init__(self, course):
+        self.course = course
+        # Creator username -> analytics user id
+        self._creator_user_ids = dict()
+
+    def _get_creator_user_id(self, note):
+        """
+        The analytics user id of the note creator, looked up once per
+        creator.
+        """
+        creator = getattr(note.creator, 'username', note.creator)
+        try:
+            return self._creator_user_ids[creator]
+        except KeyError:
+            user_record = get_user_record(note.creator)
+            result = getattr(user_record, 'user_id', None)
+            self._creator_user_ids[creator] = result
+            return result
+
+    def iter_edges(self, users, start_time=None, end_time=None):
+        views = get_note_views(course=self.course,
+                               timestamp=start_time,
+                               max_timestamp=end_time)
+        seen_notes = IntPairSet()
+        for view in _sorted_by_timestamp(views):
+            # Viewers are resolved by analytics id, never through `view.user`.
+            username = users.get(view.user_id)
+            if username is None or view.Note is None:
+                continue
+            notes = (view.Note,) + tuple(view.Note.referents)
+            for note in notes:
+                # Viewed if created and readable (which could have changed)...
+                # pylint: disable=protected-access
+                if not seen_notes.add(view.user_id, note._ds_intid):
+                    continue
+                if      note.created < view.timestamp \
+                    and has_permission(nauth.ACT_READ, note, username):
+                    creator_user_id = self._get_creator_user_id(note)
+                    if creator_user_id is not None:
+                        yield SocialEdge(view.user_id, creator_user_id,
+                                         view.timestamp, NOTE_VIEWED)
+
+
+def iter_social_edges(course, users, start_time=None, end_time=None):
+    """
+    Yield the :class:`SocialEdge` of the given users (a dict of analytics
+    user id to username) in the course, from every registered
+    :class:`.ISocialEdgeSource`, merged in a single time-ordered pass.
+    """
+    def _decorated(idx, edges):
+        # Ties are broken by source, then emission order, so the edges
+        # themselves are never compared.
+        for seq, edge in enumerate(edges):
+            yield edge.timestamp, idx, seq, edge
+
+    sources = component.subscribers((course,), ISocialEdgeSource)
+    streams = [_decorated(idx, source.iter_edges(users, start_time, end_time))
+               for idx, source in enumerate(sources)]
+    for decorated in heapq.merge(*streams):
+        yield decorated[-1]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from operator import attrgetter
+
+from itertools import islice
+
+import gevent
+
+from gevent.pool import Pool
+
+from zope import component
+from zope import interface
+
+from zope.component.hooks import getSite
+
+from zope.intid.interfaces import IIntIds
+
+from nti.analytics.stats.interfaces import IStats
+from nti.analytics.stats.interfaces import IAnalyticsStatsSource
+
+from nti.dataserver.interfaces import IDataserverTransactionRunner
+
+from nti.learning_network.interfaces import IAccessStatsSource
+from nti.learning_network.interfaces import IOutcomeStatsSource
+from nti.learning_network.interfaces import IProductionStatsSource
+from nti.learning_network.interfaces import IInteractionStatsSource
+
+#: The number of users we fetch stats for at once.
+STATS_BATCH_SIZE = 100
+
+#: The upper bound on concurrent stat workers for a single request.
+MAX_STATS_CONCURRENCY = 10
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def iter_chunks(iterable, size):
+    """
+    Lazily split the iterable into lists of at most `size` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def get_stat_source(iface, user, course, timestamp=None, max_timestamp=None):
+    if course and timestamp and max_timestamp:
+        stats_source = component.queryMultiAdapter((user, course, timestamp, max_timestamp),
+                                                   iface)
+    elif course and timestamp:
+        stats_source = component.queryMultiAdapter((user, course, timestamp),
+                                                   iface)
+    elif course:
+        stats_source = component.queryMultiAdapter((user, course), iface)
+    else:
+        stats_source = iface(user, None)
+    return stats_source
+
+
+def get_subscribers(user, course):
+    return component.subscribers((user, course), IAnalyticsStatsSource)
+
+
+def get_stats_for_user(user, course, timestamp=None,
+                       max_timestamp=None, exclude_outcome=False):
+    access_source = get_stat_source(IAccessStatsSource, user, course,
+                                    timestamp, max_timestamp)
+    prod_source = get_stat_source(IProductionStatsSource, user, course,
+                                  timestamp, max_timestamp)
+    social_source = get_stat_source(IInteractionStatsSource, user, course,
+                                    timestamp, max_timestamp)
+    stats = get_subscribers(user, course)
+    stats.append(access_source)
+    stats.append(prod_source)
+    stats.append(social_source)
+    if not exclude_outcome:
+        outcome_source = get_stat_source(IOutcomeStatsSource, user, course)
+        stats.append(outcome_source)
+    return stats
+
+
+class StatsWorkerPool(object):
+    """
+    A bounded pool of greenlets for computing user stats concurrently.
+
+    A ZODB connection is not safe to share between greenlets, so each
+    worker runs in its own (side effect free) transaction and connection,
+    in the caller's site, and re-resolves the user and course by intid.
+    Neither the worker's connection nor the analytics session it joins is
+    shared with, or leaked into, another greenlet.
+
+    If gevent has not patched threading, transactions are not greenlet
+    local and we simply compute in order in the calling greenlet.
+    """
+
+    def __init__(self, size):
+        self.size = max(1, min(size, MAX_STATS_CONCURRENCY))
+        self.site_name = getattr(getSite(), '__name__', None)
+        self.pool = Pool(self.size)
+
+    @property
+    def concurrent(self):
+        monkey = getattr(gevent, 'monkey', None)
+        return  self.size > 1 \
+            and monkey is not None \
+            and monkey.is_module_patched('threading')
+
+    def _run(self, func, user_id, course_id):
+        def _do():
+            intids = component.getUtility(IIntIds)
+            user = intids.getObject(user_id)
+            course = intids.getObject(course_id) if course_id is not None else None
+            return func(user, course)
+        runner = component.getUtility(IDataserverTransactionRunner)
+        return runner(_do, site_names=(self.site_name,), side_effect_free=True)
+
+    def imap(self, func, users, course=None):
+        """
+        Map `func(user, course)` over the users, returning results in
+        order. The worker's connection is closed once `func` returns, so
+        its result must not need to load any more persistent state.
+        """
+        if not self.concurrent:
+            return (func(user, course) for user in users)
+        intids = component.getUtility(IIntIds)
+        course_id = intids.getId(course) if course is not None else None
+        return self.pool.imap(lambda user: self._run(func, intids.getId(user), course_id),
+                              users)
+
+
+def _load_stats(sources, schemas=None):
+    """
+    Evaluate (and so cache) every stat of the given sources.
+    """
+    for source in sources:
+        if source is not None:
+            get_source_schema(source, schemas).values(source)
+    return sources
+
+
+def get_stats_for_users(course, users, timestamp=None,
+                        max_timestamp=None, exclude_outcome=False,
+                        pool=None):
+    """
+    Return a list of (user, stats) for the given users, in order, fanned
+    out over the given :class:`StatsWorkerPool` (if any).
+    """
+    def _user_stats(user, course):
+        return get_stats_for_user(user, course, timestamp,
+                                  max_timestamp, exclude_outcome)
+
+    # Schemas are shared by the workers of this call only.
+    schemas = {}
+
+    def _worker_user_stats(user, course):
+        # Stats are computed before the worker's connection is closed.
+        return _load_stats(_user_stats(user, course), schemas)
+
+    users = tuple(users)
+    if pool is not None:
+        stats = pool.imap(_worker_user_stats, users, course)
+    else:
+        stats = (_user_stats(x, course) for x in users)
+    return list(zip(users, stats))
+
+
+def get_stat_header(source_type, stat_name, stat_var):
+    return '%s_%s_%s' % (source_type, stat_name, stat_var)
+
+
+def _is_stat_name(source, name):
+    """
+    Whether the named attribute of the source holds a stat: it is
+    declared as an `IStats` field of the source's interfaces or, by
+    convention, named `*_stats`.
+    """
+    return name.endswith('_stats') \
+        or get_stat_fields(source, name) is not None
+
+
+def get_stat_fields(source, name):
+    """
+    Return the field names of the named stat of the source, as declared
+    by the `IStats` schema of the source's interfaces; or None if the
+    stat is not declared.
+    """
+    for iface in interface.providedBy(source).flattened():
+        schema = getattr(iface.get(name), 'schema', None)
+        if schema is not None and schema.isOrExtends(IStats):
+            return tuple(schema.names(all=True))
+    return None
+
+
+class StatSourceSchema(object):
+    """
+    The precompiled csv columns of a stat source class: the header labels
+    (sorted, as written in our csv) and an extractor for the column values
+    of any instance.
+
+    The columns are discovered from an instance, with the same rules used
+    for the csv headers: any public `IStats` attribute of the source and
+    any public field of those stats (except `parameters`). A schema built
+    from an instance with a stat that is None is not `complete`.
+    """
+
+    def __init__(self, source):
+        self.source_type = getattr(source, 'display_name', '')
+        self.complete = True
+        columns = []
+        stat_names = []
+        for source_var in dir(source):
+            if source_var.startswith('_'):
+                continue
+            stat = getattr(source, source_var)
+            if stat is None:
+                if _is_stat_name(source, source_var):
+                    self.complete = False
+            elif IStats.providedBy(stat):
+                stat_names.append(source_var)
+                for stat_var in vars(stat):
+                    # How do we get 'parameters'?
+                    if not stat_var.startswith('_') and stat_var != 'parameters':
+                        header = get_stat_header(self.source_type,
+                                                 source_var, stat_var)
+                        columns.append((header, len(stat_names) - 1, stat_var))
+        columns.sort()
+        self.headers = tuple(x[0] for x in columns)
+        self._stat_getters = tuple(attrgetter(x) for x in stat_names)
+        self._column_getters = tuple((idx, attrgetter(stat_var))
+                                     for _, idx, stat_var in columns)
+
+    def values(self, source):
+        """
+        Return the column values for the source, in header order. Missing
+        stats yield empty values.
+        """
+        stats = [getter(source) for getter in self._stat_getters]
+        return tuple(getter(stats[idx]) if stats[idx] is not None else ''
+                     for idx, getter in self._column_getters)
+
+
+def get_schema_key(source):
+    """
+    The key of the :class:`StatSourceSchema` of a stat source: its class
+    (that of the source a proxy is for) and display name.
+    """
+    return source.__class__, getattr(source, 'display_name', '')
+
+
+def get_source_schema(source, schemas=None):
+    """
+    Return the :class:`StatSourceSchema` for the class and display name
+    of the given stat source, cached in the given `schemas` dict, if any.
+
+    Stat fields may vary by instance, so schemas should only be cached
+    for a single request (as our csv headers are); schemas missing stats
+    (see :attr:`StatSourceSchema.complete`) are never cached.
+    """
+    key = get_schema_key(source)
+    result = schemas.get(key) if schemas is not None else None
+    if result is None:
+        result = StatSourceSchema(source)
+        if result.complete and schemas is not None:
+            schemas[key] = result
+    return result
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Streaming responses that outlive the request that started them.
+
+A response's ``app_iter`` is only drained by the WSGI server once the
+view, and the site and transaction tweens, have returned; by then the
+request site is gone and its transaction (and connection) finished. The
+work is instead run in a separate greenlet, in its own transaction in the
+request site, and handed to the server as it is produced.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import sys
+
+import six
+
+import gevent
+
+from gevent.queue import Queue
+
+from pyramid.request import Request
+
+from zope import component
+
+from nti.dataserver.interfaces import IDataserverTransactionRunner
+
+#: The number of chunks we produce ahead of a (slower) client.
+STREAM_BUFFER_SIZE = 8
+
+_END = object()
+
+logger = __import__('logging').getLogger(__name__)
+
+
+class _Failure(object):
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+def create_view(factory, query_string, context=None):
+    """
+    Re-create the view `factory` from the original request params (and
+    the given context), detached from the original request.
+    """
+    request = Request.blank('/?%s' % query_string)
+    request.context = context
+    return factory(request)
+
+
+def iter_in_transaction(func, site_name, buffer_size=STREAM_BUFFER_SIZE):
+    """
+    Yield the items of the iterable returned by `func()`, which is called
+    and drained in a separate greenlet, within its own (side effect free)
+    transaction in the named site.
+
+    Failures are raised to the consumer; closing the iterator (e.g. as
+    the client goes away) stops the producer and aborts its transaction.
+    """
+    queue = Queue(buffer_size)
+
+    def _drain():
+        for item in func():
+            queue.put(item)
+
+    def _produce():
+        runner = component.getUtility(IDataserverTransactionRunner)
+        try:
+            runner(_drain, site_names=(site_name,), side_effect_free=True)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Cannot stream response')
+            queue.put(_Failure(sys.exc_info()))
+        else:
+            queue.put(_END)
+
+    producer = gevent.spawn(_produce)
+    try:
+        while True:
+            item = queue.get()
+            if item is _END:
+                break
+            if isinstance(item, _Failure):
+                six.reraise(*item.exc_info)
+            yield item
+    finally:
+        producer.kill()
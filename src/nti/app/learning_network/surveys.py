@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Bulk loading of the survey submissions we export.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from zope import component
+
+from zope.intid.interfaces import IIntIds
+
+from nti.app.assessment.index import IX_COURSE
+from nti.app.assessment.index import IX_ASSESSMENT_ID
+from nti.app.assessment.index import get_submission_catalog
+
+from nti.app.assessment.interfaces import IUsersCourseInquiryItem
+
+from nti.app.learning_network.users import prefetch_objects
+
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.zope_catalog.catalog import ResultSet
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def _get_creator_username(item):
+    creator = getattr(item, 'creator', None)
+    username = getattr(creator, 'username', creator)
+    return username.lower() if username else None
+
+
+def get_course_survey_submissions(course, survey_ntiids):
+    """
+    Return a dict of survey ntiid to a dict of (lower-cased) username to
+    the inquiry submission for the given surveys in the course, found with
+    a single submission catalog query. Returns None if the submission
+    catalog is not available.
+    """
+    catalog = get_submission_catalog()
+    entry = ICourseCatalogEntry(course, None)
+    if catalog is None or entry is None:
+        return None
+    survey_ntiids = tuple(survey_ntiids)
+    query = {
+        IX_COURSE: {'any_of': (entry.ntiid,)},
+        IX_ASSESSMENT_ID: {'any_of': survey_ntiids},
+    }
+    intids = component.getUtility(IIntIds)
+    items = [x for x in ResultSet(catalog.apply(query) or (), intids, True)
+             if IUsersCourseInquiryItem.providedBy(x)]
+    prefetch_objects(items)
+    result = {x: {} for x in survey_ntiids}
+    for item in items:
+        username = _get_creator_username(item)
+        # Inquiry items are keyed by their survey ntiid.
+        survey_submissions = result.get(item.__name__)
+        if username and survey_submissions is not None:
+            survey_submissions[username] = item
+    logger.info('Loaded %s survey submissions for %s',
+                len(items), entry.ntiid)
+    return result
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+In-memory stand-ins shared by our unit tests.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+import six
+
+
+def _encode(value):
+    if not isinstance(value, bytes):
+        value = six.text_type(value).encode('utf-8')
+    return value
+
+
+class FakePipeline(object):
+    """
+    Queues any command, running them against the redis on `execute`.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return _queue
+
+    def execute(self):
+        for name, args, kwargs in self.commands:
+            getattr(self.redis, name)(*args, **kwargs)
+
+
+class FakeRedis(object):
+    """
+    The subset of the redis client we use, returning values (and hash
+    fields) as bytes, as redis does. Expiration times are recorded but
+    never applied.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(x) for x in keys]
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = _encode(value)
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    def setex(self, key, ttl, value):
+        self.values[key] = _encode(value)
+        self.ttls[key] = ttl
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.ttls.pop(key, None)
+
+    def hget(self, key, field):
+        return self.values.get(key, {}).get(_encode(field))
+
+    def hgetall(self, key):
+        return dict(self.values.get(key, {}))
+
+    def hmset(self, key, mapping):
+        self.values.setdefault(key, {}).update(
+            (_encode(k), _encode(v)) for k, v in mapping.items())
+
+    def hincrby(self, key, field, amount):
+        values = self.values.setdefault(key, {})
+        field = _encode(field)
+        values[field] = _encode(int(values.get(field) or 0) + amount)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakeUser(object):
+
+    def __init__(self, username):
+        self.username = username
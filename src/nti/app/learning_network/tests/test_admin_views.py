@@ -7,11 +7,42 @@ from __future__ import absolute_import
 
 # pylint: disable=protected-access,too-many-public-methods
 
+from hamcrest import is_
+from hamcrest import has_length
 from hamcrest import not_none
 from hamcrest import has_entry
 from hamcrest import assert_that
+from hamcrest import starts_with
+from hamcrest import has_entries
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from collections import namedtuple
+
+from io import BytesIO
+
+from nti.app.learning_network import admin_views
 
 from nti.app.learning_network.admin_views import STATS_VIEW_NAME
+from nti.app.learning_network.admin_views import EXPORT_JOB_STATUS_VIEW_NAME
+from nti.app.learning_network.admin_views import EXPORT_JOB_DOWNLOAD_VIEW_NAME
+
+from nti.app.learning_network.admin_views import LearningNetworkCSVStats
+
+from nti.app.learning_network.filters import UserExclusionFilter
+
+from nti.app.learning_network.jobs import JOB_SUCCESS
+
+from nti.app.learning_network.jobs import ExportJob
+
+from nti.app.learning_network.jobs import get_job_output_path
+
+from nti.app.learning_network.users import UserInfo
+
+from nti.app.products.courseware.tests import InstructedCourseApplicationTestLayer
 
 from nti.app.testing.application_webtest import ApplicationLayerTest
 
@@ -39,3 +70,173 @@ class TestAppLearningNetwork(ApplicationLayerTest):
         assert_that(body, has_entry('Access', not_none()))
         assert_that(body, has_entry('Production', not_none()))
         assert_that(body, has_entry('Interaction', not_none()))
+
+
+class TestStatsExport(ApplicationLayerTest):
+
+    layer = InstructedCourseApplicationTestLayer
+
+    default_origin = 'http://janux.ou.edu'
+
+    enrolled_courses_href = '/dataserver2/users/%s/Courses/EnrolledCourses'
+
+    def _enroll_student(self, username=u'student1'):
+        """
+        Enroll a (non-internal, so exported) user in the course.
+        """
+        with mock_dataserver.mock_db_trans(self.ds):
+            User.create_user(username=username, dataserver=self.ds,
+                             external_value={'realname': u'Jim Bob',
+                                             'email': u'%s@bar.com' % username})
+        environ = self._make_extra_environ(username=username)
+        return self.testapp.post_json(self.enrolled_courses_href % username,
+                                      'CLC 3403', status=201,
+                                      extra_environ=environ)
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_streamed_export(self):
+        """
+        A streamed export is written (after the request) in its own
+        transaction, and matches the buffered export.
+        """
+        self._enroll_student()
+        url = '/dataserver2/@@%s?filter=CLC3403&Stream=%s'
+        buffered = self.testapp.get(url % (STATS_VIEW_NAME, 'false'))
+        streamed = self.testapp.get(url % (STATS_VIEW_NAME, 'true'))
+        assert_that(streamed.content_type, is_('text/csv'))
+        assert_that(streamed.body, starts_with(b'course_title,course_ntiid'))
+        assert_that(streamed.body, is_(buffered.body))
+
+        # With every user filtered out there are no stat sources to take
+        # headers from, so (as ever) nothing is written.
+        url += '&ExcludeUserFilter=student'
+        buffered = self.testapp.get(url % (STATS_VIEW_NAME, 'false'))
+        streamed = self.testapp.get(url % (STATS_VIEW_NAME, 'true'))
+        assert_that(buffered.body, is_(b''))
+        assert_that(streamed.body, is_(b''))
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_streamed_course_stats(self):
+        """
+        Streamed course stats are rendered (after the request) in their
+        own transaction, and match the buffered stats.
+        """
+        href = self.enrolled_courses_href % 'sjohnson@nextthought.com'
+        res = self.testapp.post_json(href, 'CLC 3403', status=201)
+        course_href = res.json_body['CourseInstance']['href']
+        url = '%s/@@%s?Stream=%s'
+        buffered = self.testapp.get(url % (course_href, STATS_VIEW_NAME, 'false'))
+        streamed = self.testapp.get(url % (course_href, STATS_VIEW_NAME, 'true'))
+        assert_that(streamed.content_type, is_('application/json'))
+        body = streamed.json_body
+        assert_that(body, has_entries('Total', 1,
+                                      'ItemCount', 1,
+                                      'sjohnson@nextthought.com',
+                                      has_entry('Access', not_none())))
+        username = 'sjohnson@nextthought.com'
+        assert_that(body[username], is_(buffered.json_body[username]))
+
+
+class TestExportJobViews(ApplicationLayerTest):
+
+    def setUp(self):
+        super(TestExportJobViews, self).setUp()
+        self.old_dir = os.environ.get('DATASERVER_DIR')
+        self.tmp_dir = tempfile.mkdtemp()
+        os.environ['DATASERVER_DIR'] = self.tmp_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        if self.old_dir is None:
+            os.environ.pop('DATASERVER_DIR', None)
+        else:
+            os.environ['DATASERVER_DIR'] = self.old_dir
+        super(TestExportJobViews, self).tearDown()
+
+    @WithSharedApplicationMockDS(testapp=True, users=True)
+    def test_job_views(self):
+        url = '/dataserver2/@@%s?JobId=%s'
+        job = ExportJob('course_stats.csv')
+        job.start(2)
+
+        self.testapp.get(url % (EXPORT_JOB_STATUS_VIEW_NAME, 'unknown'),
+                         status=404)
+        result = self.testapp.get(url % (EXPORT_JOB_STATUS_VIEW_NAME, job.job_id))
+        assert_that(result.json_body,
+                    has_entries('JobId', job.job_id,
+                                'Status', 'Running',
+                                'Total', 2))
+        # Not done yet
+        self.testapp.get(url % (EXPORT_JOB_DOWNLOAD_VIEW_NAME, job.job_id),
+                         status=409)
+
+        with open(get_job_output_path(job.job_id), 'wb') as f:
+            f.write(b'course_title,course_ntiid\r\n')
+        job.finish(JOB_SUCCESS)
+        result = self.testapp.get(url % (EXPORT_JOB_STATUS_VIEW_NAME, job.job_id))
+        assert_that(result.json_body, has_entries('Status', JOB_SUCCESS,
+                                                  'href', not_none()))
+        result = self.testapp.get(url % (EXPORT_JOB_DOWNLOAD_VIEW_NAME, job.job_id))
+        assert_that(result.body, is_(b'course_title,course_ntiid\r\n'))
+        assert_that(result.content_disposition,
+                    is_('attachment; filename="course_stats.csv"'))
+
+
+_Entry = namedtuple('_Entry', ('ntiid',))
+
+
+class _ProgressView(LearningNetworkCSVStats):
+
+    def __init__(self, records):  # pylint: disable=super-init-not-called
+        self.records = records
+        self.user_filter = UserExclusionFilter(('skipped',))
+        self.course_filter = 'CLC3403'
+        self.concurrency = 1
+        self.exclude_outcome_stats = False
+        self.rows = []
+
+    def _iter_courses(self):
+        return [(_Entry('CLC3403'), None)]
+
+    def _get_user_records(self, unused_course):
+        return iter(self.records)
+
+    def _get_time_window(self, unused_entry):
+        return None, None
+
+    def _set_headers(self, writer, sources):
+        pass
+
+    def _write_stats_for_user(self, unused_writer, user_info, *unused_args):
+        self.rows.append(user_info.username)
+
+
+class TestExportProgress(unittest.TestCase):
+
+    def test_skipped_users(self):
+        """
+        Every user record, exported or skipped, is a unit of progress, so
+        export jobs reach the total of their enrollments.
+        """
+        records = [(username, None) for username in
+                   ('user1', 'skipped1', 'missing',
+                    'staff@nextthought.com', 'user2')]
+        emails = {'user1': 'user1@bar.com', 'user2': 'user2@nextthought.com'}
+
+        def _prefetch_users(usernames, **unused_kwargs):
+            return [UserInfo(x, x, emails[x], None, None) if x in emails else None
+                    for x in usernames]
+
+        def _get_stats_for_users(unused_course, users, *unused_args):
+            return [(x, ()) for x in users]
+
+        old = (admin_views.prefetch_users, admin_views.get_stats_for_users)
+        admin_views.prefetch_users = _prefetch_users
+        admin_views.get_stats_for_users = _get_stats_for_users
+        try:
+            view = _ProgressView(records)
+            steps = [x for x in view._write_csv(BytesIO()) if x is False]
+        finally:
+            admin_views.prefetch_users, admin_views.get_stats_for_users = old
+        assert_that(view.rows, is_(['user1']))
+        assert_that(steps, has_length(len(records)))
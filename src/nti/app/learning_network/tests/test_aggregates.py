@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import contains
+from hamcrest import has_entry
+from hamcrest import has_entries
+from hamcrest import assert_that
+
+import unittest
+
+from collections import namedtuple
+
+from nti.app.learning_network.aggregates import SurveyAggregate
+from nti.app.learning_network.aggregates import get_bucket_bounds
+
+_Keys = namedtuple('_Keys', ('original_part_key', 'part_keys'))
+_PartPlan = namedtuple('_PartPlan', ('index', 'part', 'keys', 'choice_labels', 'offset'))
+_QuestionPlan = namedtuple('_QuestionPlan', ('ntiid', 'parts'))
+_Survey = namedtuple('_Survey', ('ntiid',))
+_Provider = namedtuple('_Provider', ('survey', 'survey_title', 'plan'))
+_SubQuestion = namedtuple('_SubQuestion', ('inquiryId', 'parts'))
+_Submission = namedtuple('_Submission', ('parts',))
+_Item = namedtuple('_Item', ('Submission',))
+
+
+def _submission(*responses):
+    return _Item(_Submission((_SubQuestion('question', responses),)))
+
+
+class TestAggregates(unittest.TestCase):
+
+    def _provider(self):
+        parts = (_PartPlan(0, None, _Keys(b'[Survey] Color', [b'a', b'b']),
+                           (b'Red', b'Blue'), 0),
+                 _PartPlan(1, None, _Keys(b'[Survey] Why', None), None, 3))
+        return _Provider(_Survey('survey'), 'Survey',
+                         (_QuestionPlan('question', parts),))
+
+    def test_bucket_bounds(self):
+        assert_that(get_bucket_bounds((1, 5)),
+                    is_([(None, 1), (1, 5), (5, None)]))
+
+    def test_aggregate(self):
+        aggregate = SurveyAggregate(self._provider(), bounds=(5, 1))
+        assert_that(aggregate.get_bucket(''), none())
+        assert_that(aggregate.get_bucket(0), is_(0))
+        assert_that(aggregate.get_bucket(5), is_(2))
+
+        aggregate.add(_submission(0, u'text'), aggregate.get_bucket(0))
+        aggregate.add(_submission((0, 1), None), aggregate.get_bucket(3))
+        aggregate.add(None, aggregate.get_bucket(10))
+        aggregate.add(_submission(None, u'text'))
+
+        result = aggregate.to_external()
+        assert_that(result, has_entries('Total', 4,
+                                        'Buckets', contains(has_entry('Total', 1),
+                                                            has_entry('Total', 1),
+                                                            has_entry('Total', 1))))
+        choice_part, text_part = result['Questions'][0]['Parts']
+        assert_that(choice_part,
+                    has_entries('Label', u'[Survey] Color',
+                                'Responses', 2,
+                                'ResponseRate', 0.5,
+                                'Choices', contains(has_entries('Label', u'Red',
+                                                                'Count', 2,
+                                                                'Rate', 1.0),
+                                                    has_entries('Label', u'Blue',
+                                                                'Count', 1,
+                                                                'Rate', 0.5)),
+                                'CrossTab', contains(has_entries('Responses', 1,
+                                                                 'Counts', [1, 0]),
+                                                     has_entries('Responses', 1,
+                                                                 'Counts', [1, 1]),
+                                                     has_entries('Responses', 0,
+                                                                 'Counts', [0, 0]))))
+        assert_that(text_part, has_entries('Responses', 2,
+                                           'ResponseRate', 0.5))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import assert_that
+
+import unittest
+
+from datetime import datetime
+
+from zope import interface
+
+from nti.app.learning_network.catalog import CourseCatalogIndex
+
+from nti.app.learning_network.catalog import get_catalog_index
+from nti.app.learning_network.catalog import clear_catalog_indexes
+
+from nti.app.learning_network.catalog import _on_course_added
+from nti.app.learning_network.catalog import _on_catalog_synced
+from nti.app.learning_network.catalog import _on_course_removed
+from nti.app.learning_network.catalog import _on_entry_modified
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+FALL = u'tag:nextthought.com,2011-10:NTI-CourseInfo-Fall2015_CLC_3403'
+SPRING = u'tag:nextthought.com,2011-10:NTI-CourseInfo-Spring2016_CLC_3403'
+OTHER = u'tag:nextthought.com,2011-10:NTI-CourseInfo-Fall2015_LSTD_1153'
+
+
+SUMMER = u'tag:nextthought.com,2011-10:NTI-CourseInfo-Summer2016_CLC_3403'
+
+
+@interface.implementer(ICourseInstance, ICourseCatalogEntry)
+class _Entry(object):
+
+    def __init__(self, ntiid, start_date):
+        self.ntiid = ntiid
+        self.StartDate = start_date
+
+
+class _Catalog(object):
+
+    lastSynchronized = 1
+
+    def __init__(self):
+        self.scans = 0
+
+    def iterCatalogEntries(self):
+        self.scans += 1
+        return (_Entry(SPRING, datetime(2016, 1, 1)),
+                _Entry(FALL, datetime(2015, 8, 1)),
+                _Entry(OTHER, None))
+
+
+class TestCatalog(unittest.TestCase):
+
+    def test_query(self):
+        index = CourseCatalogIndex(_Catalog())
+        # Catalog order
+        assert_that(index.query('CLC_3403'), is_([SPRING, FALL]))
+        assert_that(index.query('LC_34'), is_([SPRING, FALL]))
+        assert_that(index.query('Fall2015_CLC_3403'), is_([FALL]))
+        assert_that(index.query('-Fall2015_'), is_([FALL, OTHER]))
+        assert_that(index.query(''), is_([]))
+        # Only courses starting after the given time
+        assert_that(index.query('CLC_3403', datetime(2015, 9, 1)), is_([SPRING]))
+        assert_that(index.query('Fall2015', datetime(2010, 1, 1)), is_([FALL]))
+
+    def test_update(self):
+        index = CourseCatalogIndex(_Catalog())
+        index.add(_Entry(SUMMER, datetime(2016, 5, 1)))
+        assert_that(index.query('CLC_3403'), is_([SPRING, FALL, SUMMER]))
+        assert_that(index.query('CLC_3403', datetime(2016, 2, 1)), is_([SUMMER]))
+
+        # Reindexed in place
+        index.add(_Entry(FALL, datetime(2016, 8, 1)))
+        assert_that(index.query('CLC_3403', datetime(2016, 2, 1)),
+                    is_([FALL, SUMMER]))
+
+        index.remove(SPRING)
+        index.remove(SPRING)
+        assert_that(index.query('CLC_3403'), is_([FALL, SUMMER]))
+        assert_that(index.query('Spring2016'), is_([]))
+        index.remove(OTHER)
+        assert_that(index.query('-Fall2015_'), is_([FALL]))
+        assert_that(index.tokens.get('LSTD'), is_(None))
+
+    def test_events(self):
+        catalog = _Catalog()
+        clear_catalog_indexes()
+        try:
+            index = get_catalog_index(catalog)
+            assert_that(get_catalog_index(catalog) is index, is_(True))
+
+            # Courses added, removed and modified are indexed without a scan.
+            _on_course_added(_Entry(SUMMER, datetime(2016, 5, 1)), None)
+            _on_course_removed(_Entry(SPRING, datetime(2016, 1, 1)), None)
+            _on_entry_modified(_Entry(FALL, None), None)
+            index = get_catalog_index(catalog)
+            assert_that(catalog.scans, is_(1))
+            assert_that(index.query('CLC_3403'), is_([FALL, SUMMER]))
+            assert_that(index.query('CLC_3403', datetime(2010, 1, 1)),
+                        is_([SUMMER]))
+
+            # Syncs (in any process) are scanned.
+            catalog.lastSynchronized = 2
+            get_catalog_index(catalog)
+            assert_that(catalog.scans, is_(2))
+            _on_catalog_synced(None)
+            index = get_catalog_index(catalog)
+            assert_that(catalog.scans, is_(3))
+            assert_that(index.query('CLC_3403'), is_([SPRING, FALL]))
+        finally:
+            clear_catalog_indexes()
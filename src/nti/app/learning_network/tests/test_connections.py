@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import assert_that
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from collections import namedtuple
+
+from calendar import timegm
+
+from datetime import datetime
+
+from nti.app.learning_network import connections
+
+from nti.app.learning_network.connections import build_edge_log
+from nti.app.learning_network.connections import ConnectionEdgeIndex
+
+from nti.app.learning_network.connections import _get_graphs
+from nti.app.learning_network.connections import _remove_graphs
+from nti.app.learning_network.connections import _get_graph_path
+
+_Connection = namedtuple('_Connection', ('Source', 'Target', 'Timestamp'))
+
+
+class _EdgeLog(object):
+
+    days = (datetime(2017, 1, 1), datetime(2017, 1, 2), datetime(2017, 1, 3))
+
+    def __init__(self):
+        self.built = []
+
+    def get_nodes_edges(self, timestamp):
+        self.built.append(timestamp)
+        return {timestamp.day: {}}
+
+
+class _Renderer(object):
+
+    name = 'builtin'
+
+    extension = 'svg'
+
+    def __init__(self):
+        self.rendered = []
+
+    def render(self, jobs):
+        result = []
+        for nodes_edges, file_path in jobs:
+            self.rendered.append(nodes_edges)
+            open(file_path, 'w').close()
+            result.append(file_path)
+        return result
+
+
+class TestConnections(unittest.TestCase):
+
+    def test_edge_log(self):
+        day1 = datetime(2017, 1, 1)
+        day2 = datetime(2017, 1, 2)
+        connections = (_Connection('b', 'c', datetime(2017, 1, 2, 12)),
+                       _Connection('a', 'b', datetime(2017, 1, 1, 10)),
+                       _Connection('a', 'c', datetime(2017, 1, 2, 9)),
+                       _Connection('a', 'b', datetime(2017, 1, 2, 9)))
+        edge_log = build_edge_log(connections)
+        assert_that(edge_log.days, is_([day1, day2]))
+        assert_that(edge_log.get_edges(), is_([('a', 'b'), ('b', 'c'), ('a', 'c')]))
+        # Earlier days are not affected by later edges.
+        assert_that(edge_log.get_nodes_edges(day1), is_({'a': {'b': None}}))
+        assert_that(edge_log.get_nodes_edges(day2),
+                    is_({'a': {'b': None, 'c': None}, 'b': {'c': None}}))
+        assert_that(edge_log.get_edges(datetime(2016, 12, 31)), is_([]))
+
+    def test_edge_index(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            index = ConnectionEdgeIndex(os.path.join(tmp_dir, 'edges.db'))
+            assert_that(index.watermark, is_(None))
+            connections = [_Connection('a', 'b', datetime(2017, 1, 1, 10)),
+                           _Connection('b', 'c', datetime(2017, 1, 2, 12))]
+            assert_that(index.update(connections), is_((2, datetime(2017, 1, 1))))
+            assert_that(index.watermark, is_(datetime(2017, 1, 2, 12)))
+
+            # Incremental (and repeated) connections.
+            connections = [_Connection('b', 'c', datetime(2017, 1, 2, 12)),
+                           _Connection('a', 'b', datetime(2017, 1, 3, 8))]
+            assert_that(index.update(connections), is_((2, None)))
+            assert_that(index.watermark, is_(datetime(2017, 1, 3, 8)))
+
+            edge_log = index.get_edge_log()
+            assert_that(edge_log.get_edges(), is_([('a', 'b'), ('b', 'c')]))
+            assert_that(edge_log.days,
+                        is_([datetime(2017, 1, 1), datetime(2017, 1, 2)]))
+
+            edge_log = index.get_edge_log(until=datetime(2017, 1, 1, 23))
+            assert_that(edge_log.get_edges(), is_([('a', 'b')]))
+
+            # Edges seen since the day, with older edges on that day.
+            edge_log = index.get_edge_log(since=datetime(2017, 1, 3))
+            assert_that(edge_log.get_edges(), is_([('a', 'b')]))
+            assert_that(edge_log.days, is_([datetime(2017, 1, 3)]))
+
+            # Late connections change earlier days, but not the watermark.
+            connections = [_Connection('c', 'a', datetime(2017, 1, 2, 8)),
+                           _Connection('a', 'b', datetime(2016, 12, 31, 8))]
+            assert_that(index.update(connections),
+                        is_((2, datetime(2016, 12, 31))))
+            assert_that(index.watermark, is_(datetime(2017, 1, 3, 8)))
+            assert_that(index.get_edge_log().days,
+                        is_([datetime(2016, 12, 31), datetime(2017, 1, 2)]))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_remove_graphs(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            names = ['edges.db', '1483228800.graphviz.png', '1483228800.builtin.svg',
+                     '1483315200.graphviz.png', '1483401600.builtin.svg']
+            for name in names:
+                open(os.path.join(tmp_dir, name), 'w').close()
+            assert_that(_remove_graphs(tmp_dir, datetime(2017, 1, 2)), is_(2))
+            assert_that(sorted(os.listdir(tmp_dir)), is_(sorted(names[:3])))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_get_graphs(self):
+        tmp_dir = tempfile.mkdtemp()
+        old = connections._initialize_dirs
+        connections._initialize_dirs = lambda unused_course: tmp_dir
+        try:
+            edge_log, renderer = _EdgeLog(), _Renderer()
+            days = edge_log.days
+            # Already rendered, by this renderer and another.
+            other = _Renderer()
+            other.name = 'graphviz'
+            open(_get_graph_path(tmp_dir, days[1], renderer), 'w').close()
+            open(_get_graph_path(tmp_dir, days[2], other), 'w').close()
+            graphs = _get_graphs(edge_log, None, renderer)
+            names = ['%s.builtin.svg' % timegm(x.timetuple()) for x in days]
+            assert_that(graphs,
+                        is_([(x, os.path.join(tmp_dir, y)) for x, y in zip(days, names)]))
+            # Only the missing days are built and rendered.
+            assert_that(edge_log.built, is_([days[0], days[2]]))
+            assert_that(renderer.rendered, is_([{1: {}}, {3: {}}]))
+
+            edge_log, renderer = _EdgeLog(), _Renderer()
+            assert_that(_get_graphs(edge_log, None, renderer), is_(graphs))
+            assert_that(edge_log.built, is_([]))
+            assert_that(renderer.rendered, is_([]))
+        finally:
+            connections._initialize_dirs = old
+            shutil.rmtree(tmp_dir)
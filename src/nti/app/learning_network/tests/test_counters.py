@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import not_none
+from hamcrest import has_entries
+from hamcrest import assert_that
+from hamcrest import same_instance
+
+import time
+import unittest
+
+from collections import namedtuple
+
+from datetime import datetime
+
+import transaction
+
+from zope import component
+from zope import interface
+
+from zope.schema import Object
+
+from nti.analytics.stats.interfaces import IStats
+
+from nti.app.learning_network import counters
+
+from nti.app.learning_network.counters import NOTE_COUNTER
+from nti.app.learning_network.counters import COMMENT_COUNTER
+from nti.app.learning_network.counters import VIEW_COUNTER_LAG
+from nti.app.learning_network.counters import ASSIGNMENT_COUNTER
+from nti.app.learning_network.counters import TOPIC_VIEW_COUNTER
+
+from nti.app.learning_network.counters import StatCounters
+from nti.app.learning_network.counters import CounterStatsSource
+
+from nti.app.learning_network.counters import _on_note_added
+from nti.app.learning_network.counters import _on_note_removed
+from nti.app.learning_network.counters import _on_comment_added
+
+from nti.app.learning_network.counters import verify_counters
+from nti.app.learning_network.counters import get_stats_with_counters
+from nti.app.learning_network.counters import update_view_counters
+
+from nti.app.learning_network.interfaces import IStatCounters
+
+from nti.app.learning_network.stats import get_schema_key
+from nti.app.learning_network.stats import get_source_schema
+
+from nti.app.learning_network.tests.fakes import FakeUser
+from nti.app.learning_network.tests.fakes import FakeRedis
+
+from nti.contenttypes.courses.interfaces import ICourseInstance
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+from nti.dataserver.interfaces import IRedisClient
+
+from nti.learning_network.interfaces import IProductionStatsSource
+
+_View = namedtuple('_View', ('user', 'timestamp'))
+
+
+@interface.implementer(ICourseInstance, ICourseCatalogEntry)
+class _Course(object):
+
+    ntiid = u'tag:nextthought.com,2011-10:NTI-CourseInfo-Fall2017_CS_1323'
+
+
+class _Created(object):
+
+    def __init__(self, creator, containerId=None, __parent__=None):
+        self.creator = creator
+        self.containerId = containerId
+        self.__parent__ = __parent__
+
+
+class ICountStats(IStats):
+    pass
+
+
+class INoteStats(IStats):
+
+    reply_count = interface.Attribute('The number of replies')
+
+
+class IProductionSource(interface.Interface):
+
+    note_stats = Object(INoteStats)
+    comment_stats = Object(ICountStats)
+
+
+@interface.implementer(IStats)
+class _Stats(object):
+
+    def __init__(self, count, **kwargs):
+        self.count = count
+        self.parameters = {}
+        self.__dict__.update(kwargs)
+
+    def toExternalObject(self, **unused_kwargs):
+        return dict(vars(self))
+
+
+@interface.implementer(IProductionSource)
+class _ProductionSource(object):
+
+    display_name = 'Production'
+
+    def __init__(self):
+        self.computed = []
+
+    @property
+    def note_stats(self):
+        self.computed.append('note_stats')
+        return _Stats(5, reply_count=2)
+
+    @property
+    def comment_stats(self):
+        self.computed.append('comment_stats')
+        return _Stats(7)
+
+
+class TestCounters(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.counters = StatCounters()
+        self.course = _Course()
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(self.redis, IRedisClient)
+        gsm.registerUtility(self.counters, IStatCounters)
+        self._old_find = counters.find_object_with_ntiid
+        counters.find_object_with_ntiid = \
+            lambda ntiid: self.course if ntiid == u'lesson' else None
+
+    def tearDown(self):
+        counters.find_object_with_ntiid = self._old_find
+        gsm = component.getGlobalSiteManager()
+        gsm.unregisterUtility(self.redis, IRedisClient)
+        gsm.unregisterUtility(self.counters, IStatCounters)
+        transaction.abort()
+
+    def test_counters(self):
+        store = self.counters
+        store.increment(self.course, u'User1', NOTE_COUNTER)
+        # Not served until seeded
+        assert_that(store.get(self.course, u'user1'), is_(none()))
+        store.seed(self.course, u'user1', {NOTE_COUNTER: 3})
+        assert_that(store.get_seed_time(self.course, u'user1'), is_(not_none()))
+        store.increment(self.course, u'user1', NOTE_COUNTER, 2)
+        store.increment(self.course, u'user1', COMMENT_COUNTER)
+        assert_that(store.get(self.course, u'USER1'),
+                    is_({NOTE_COUNTER: 5, COMMENT_COUNTER: 1,
+                         ASSIGNMENT_COUNTER: 0, TOPIC_VIEW_COUNTER: 0}))
+
+        assert_that(store.lock_views(self.course), is_(True))
+        assert_that(store.lock_views(self.course), is_(False))
+        store.unlock_views(self.course)
+        assert_that(store.lock_views(self.course), is_(True))
+
+    def test_subscribers(self):
+        store = self.counters
+        store.seed(self.course, u'user1', {})
+        note = _Created(FakeUser(u'user1'), containerId=u'lesson')
+        comment = _Created(FakeUser(u'user1'), __parent__=self.course)
+
+        # Only committed changes are counted.
+        transaction.begin()
+        _on_note_added(note, None)
+        _on_comment_added(comment, None)
+        assert_that(store.get(self.course, u'user1')[NOTE_COUNTER], is_(0))
+        transaction.commit()
+        assert_that(store.get(self.course, u'user1'),
+                    has_entries(NOTE_COUNTER, 1, COMMENT_COUNTER, 1))
+
+        transaction.begin()
+        _on_note_added(note, None)
+        transaction.abort()
+        assert_that(store.get(self.course, u'user1')[NOTE_COUNTER], is_(1))
+
+        transaction.begin()
+        _on_note_removed(note, None)
+        # Notes outside of a course are not counted.
+        _on_note_added(_Created(FakeUser(u'user1'), containerId=u'other'), None)
+        transaction.commit()
+        assert_that(store.get(self.course, u'user1')[NOTE_COUNTER], is_(0))
+
+    def test_view_counters(self):
+        store = self.counters
+        # Views are only counted after the user was seeded (now).
+        now = int(time.time()) + 3600
+        user1, user2 = FakeUser(u'user1'), FakeUser(u'user2')
+
+        def _at(seconds):
+            return datetime.utcfromtimestamp(now - VIEW_COUNTER_LAG + seconds)
+
+        views = []
+        old = counters.get_topic_views
+        counters.get_topic_views = lambda **unused_kwargs: views
+        try:
+            # The first update only records the watermark.
+            assert_that(update_view_counters(self.course, now), is_(0))
+
+            store.seed(self.course, u'user1', {})
+            views.extend((_View(user1, _at(0)),  # Already counted
+                          _View(user1, _at(5)),
+                          _View(user1, _at(10)),
+                          _View(user1, _at(20)),  # Too recent
+                          _View(user2, _at(5))))  # Not seeded
+            assert_that(update_view_counters(self.course, now + 10), is_(2))
+            assert_that(store.get(self.course, u'user1')[TOPIC_VIEW_COUNTER],
+                        is_(2))
+            # Nothing is counted twice.
+            assert_that(update_view_counters(self.course, now + 10), is_(0))
+
+            # Nor while another process is counting.
+            store.lock_views(self.course)
+            assert_that(update_view_counters(self.course, now + 30), is_(0))
+            store.unlock_views(self.course)
+            assert_that(update_view_counters(self.course, now + 30), is_(1))
+        finally:
+            counters.get_topic_views = old
+
+    def test_get_stats_with_counters(self):
+        store = self.counters
+        user = FakeUser(u'user1')
+        source = _ProductionSource()
+
+        def _get_stat_source(iface, *unused_args):
+            return source if iface is IProductionStatsSource else None
+
+        old = counters.get_stat_source, counters.get_subscribers
+        counters.get_stat_source = _get_stat_source
+        counters.get_subscribers = lambda *unused_args: []
+        try:
+            assert_that(get_stats_with_counters(user, self.course), is_(none()))
+            store.seed(self.course, u'user1', {NOTE_COUNTER: 3, COMMENT_COUNTER: 4})
+            stats = get_stats_with_counters(user, self.course)
+        finally:
+            counters.get_stat_source, counters.get_subscribers = old
+
+        # Only the stats our counters cover are read from them; the others
+        # (and the rest of the source) are computed.
+        counted = stats[1]
+        assert_that(type(counted), same_instance(CounterStatsSource))
+        assert_that(counted.comment_stats.count, is_(4))
+        assert_that(source.computed, is_([]))
+        assert_that(counted.note_stats.count, is_(5))
+        assert_that(counted.note_stats.reply_count, is_(2))
+        assert_that(counted.display_name, is_('Production'))
+        assert_that(IProductionSource.providedBy(counted), is_(True))
+
+        # With the same csv columns as the source.
+        assert_that(get_schema_key(counted), is_(get_schema_key(source)))
+        assert_that(get_source_schema(counted).headers,
+                    is_(get_source_schema(source).headers))
+        assert_that(get_source_schema(counted).values(counted), is_((4, 5, 2)))
+        assert_that(counted.toExternalObject(),
+                    has_entries('Class', '_ProductionSource',
+                                'comment_stats', has_entries('count', 4),
+                                'note_stats', has_entries('reply_count', 2)))
+
+    def test_verify_counters(self):
+        store = self.counters
+        computed = {NOTE_COUNTER: 2, COMMENT_COUNTER: 0,
+                    ASSIGNMENT_COUNTER: 1, TOPIC_VIEW_COUNTER: 4}
+        old = counters._get_computed_counts
+        counters._get_computed_counts = lambda *unused_args: dict(computed)
+        try:
+            users = [FakeUser(u'user1'), FakeUser(u'user2')]
+            store.seed(self.course, u'user1', computed)
+            checked, mismatches = verify_counters(self.course, users)
+            assert_that(checked, is_(users))
+            assert_that(mismatches, has_entries(
+                u'user2', has_entries('Production/note_stats',
+                                      {'Counter': None, 'Computed': 2})))
+            assert_that(sorted(mismatches), is_([u'user2']))
+
+            verify_counters(self.course, users, repair=True)
+            assert_that(store.get(self.course, u'user2'), is_(computed))
+            _, mismatches = verify_counters(self.course, users)
+            assert_that(mismatches, is_({}))
+        finally:
+            counters._get_computed_counts = old
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import assert_that
+
+import unittest
+
+from nti.app.learning_network.filters import UserExclusionFilter
+
+
+class TestFilters(unittest.TestCase):
+
+    def test_user_exclusion_filter(self):
+        user_filter = UserExclusionFilter(('test', 'a.b'))
+        assert_that(user_filter.exclude_username(u'student'), is_(False))
+        assert_that(user_filter.exclude_username(u'jzuech@nextthought.com'), is_(True))
+        assert_that(user_filter.exclude_username(u'my_test_user'), is_(True))
+        # Substrings are matched literally
+        assert_that(user_filter.exclude_username(u'axb'), is_(False))
+        assert_that(user_filter.exclude_username(u'a.b'), is_(True))
+        assert_that(user_filter.exclude_email(u'student@nextthought.com'), is_(True))
+        assert_that(user_filter.exclude_email(u'test@ou.edu'), is_(False))
+        assert_that(user_filter.excluded, is_(4))
+        user_filter.log_summary('course')
+        assert_that(user_filter.excluded, is_(0))
+
+        user_filter = UserExclusionFilter(exclude_internal=False)
+        assert_that(user_filter.exclude_username(u'jzuech@nextthought.com'), is_(False))
+        assert_that(user_filter.exclude_email(u'jzuech@nextthought.com'), is_(False))
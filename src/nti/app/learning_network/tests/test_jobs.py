@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import not_none
+from hamcrest import has_entry
+from hamcrest import assert_that
+from hamcrest import has_entries
+from hamcrest import calling
+from hamcrest import raises
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from nti.app.learning_network import jobs
+
+from nti.app.learning_network.jobs import JOB_FAILED
+from nti.app.learning_network.jobs import JOB_RUNNING
+from nti.app.learning_network.jobs import JOB_SUCCESS
+from nti.app.learning_network.jobs import JOB_EXPIRY
+from nti.app.learning_network.jobs import STALE_JOB_TIMEOUT
+
+from nti.app.learning_network.jobs import ExportJob
+
+from nti.app.learning_network.jobs import expire_jobs
+from nti.app.learning_network.jobs import get_job_status
+from nti.app.learning_network.jobs import is_valid_job_id
+from nti.app.learning_network.jobs import get_job_output_path
+
+
+class TestJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.old_dir = os.environ.get('DATASERVER_DIR')
+        self.tmp_dir = tempfile.mkdtemp()
+        os.environ['DATASERVER_DIR'] = self.tmp_dir
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        if self.old_dir is None:
+            os.environ.pop('DATASERVER_DIR', None)
+        else:
+            os.environ['DATASERVER_DIR'] = self.old_dir
+
+    def _set_updated(self, job_id, updated):
+        path = jobs._get_job_status_path(job_id)
+        with open(path) as f:
+            status = json.load(f)
+        status['Updated'] = updated
+        with open(path, 'w') as f:
+            json.dump(status, f)
+
+    def test_job_status(self):
+        job = ExportJob('course_stats.csv')
+        assert_that(is_valid_job_id(job.job_id), is_(True))
+        assert_that(is_valid_job_id('../etc/passwd'), is_(False))
+        assert_that(get_job_status(job.job_id), is_(none()))
+
+        job.save()
+        job.start(4)
+        job.step()
+        job.step()
+        assert_that(job.eta, is_(not_none()))
+        job.save()
+        assert_that(get_job_status(job.job_id),
+                    has_entries('Status', JOB_RUNNING,
+                                'Filename', 'course_stats.csv',
+                                'Total', 4,
+                                'Done', 2,
+                                'Pid', os.getpid()))
+
+        job.finish(JOB_SUCCESS)
+        assert_that(get_job_status(job.job_id),
+                    has_entries('Status', JOB_SUCCESS,
+                                'Finished', not_none()))
+
+    def test_stale_job(self):
+        job = ExportJob('course_stats.csv')
+        job.start(4)
+        self._set_updated(job.job_id, time.time() - STALE_JOB_TIMEOUT - 1)
+        assert_that(get_job_status(job.job_id),
+                    has_entry('Status', JOB_FAILED))
+
+        # Finished jobs are never stale.
+        job.finish(JOB_SUCCESS)
+        self._set_updated(job.job_id, time.time() - STALE_JOB_TIMEOUT - 1)
+        assert_that(get_job_status(job.job_id),
+                    has_entry('Status', JOB_SUCCESS))
+
+    def test_expire_jobs(self):
+        old = ExportJob('old.csv')
+        old.finish(JOB_SUCCESS)
+        with open(get_job_output_path(old.job_id), 'w') as f:
+            f.write('course_title\n')
+        expired = time.time() - JOB_EXPIRY - 1
+        for path in (jobs._get_job_status_path(old.job_id),
+                     get_job_output_path(old.job_id)):
+            os.utime(path, (expired, expired))
+        new = ExportJob('new.csv')
+        new.start(1)
+
+        expire_jobs()
+        assert_that(get_job_status(old.job_id), is_(none()))
+        assert_that(os.path.exists(get_job_output_path(old.job_id)), is_(False))
+        assert_that(get_job_status(new.job_id), is_(not_none()))
+
+    def test_no_dataserver_dir(self):
+        os.environ.pop('DATASERVER_DIR')
+        assert_that(calling(jobs._get_spool_dir), raises(ValueError))
+        assert_that(get_job_status(ExportJob('x.csv').job_id), is_(none()))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_length
+from hamcrest import assert_that
+from hamcrest import contains_string
+
+import unittest
+
+from nti.app.learning_network.layout import to_svg
+from nti.app.learning_network.layout import force_layout
+from nti.app.learning_network.layout import get_nodes_and_edges
+
+
+class TestLayout(unittest.TestCase):
+
+    nodes_edges = {
+        1: {2: 'CommentViewed', 3: 'NoteViewed'},
+        2: {1: 'NoteViewed', 2: 'NoteViewed'},
+        4: {},
+    }
+
+    def test_nodes_and_edges(self):
+        nodes, edges = get_nodes_and_edges(self.nodes_edges)
+        assert_that(nodes, is_([1, 2, 3, 4]))
+        # Self edges are dropped
+        assert_that(edges, is_([(0, 1), (0, 2), (1, 0)]))
+
+    def test_force_layout(self):
+        assert_that(force_layout(0, []), is_([]))
+        assert_that(force_layout(1, []), is_([(0.0, 0.0)]))
+
+        edges = [(0, 1), (1, 2), (2, 0), (3, 4)]
+        positions = force_layout(5, edges, seed=7)
+        assert_that(positions, has_length(5))
+        assert_that(force_layout(5, edges, seed=7), is_(positions))
+
+    def test_to_svg(self):
+        svg = to_svg(self.nodes_edges)
+        assert_that(svg, contains_string('<svg '))
+        assert_that(svg.count('<circle '), is_(4))
+        assert_that(svg.count('<line '), is_(3))
+        assert_that(svg, contains_string('>Connections</text>'))
+        assert_that(to_svg({}), contains_string('</svg>'))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_length
+from hamcrest import assert_that
+
+import unittest
+
+from nti.app.learning_network.pairs import IntPairSet
+
+
+class TestPairs(unittest.TestCase):
+
+    def test_int_pair_set(self):
+        pairs = IntPairSet()
+        assert_that(pairs.add(1, 2 ** 40), is_(True))
+        assert_that(pairs.add(1, 5), is_(True))
+        assert_that(pairs.add(2, 5), is_(True))
+        assert_that(pairs.add(1, 2 ** 40), is_(False))
+        assert_that(pairs, has_length(3))
+
+        assert_that((1, 5) in pairs, is_(True))
+        assert_that((2, 2 ** 40) in pairs, is_(False))
+        assert_that((3, 5) in pairs, is_(False))
+        assert_that(list(pairs._values[1]), is_([5, 2 ** 40]))
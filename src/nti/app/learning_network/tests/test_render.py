@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import has_length
+from hamcrest import assert_that
+from hamcrest import contains_string
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import gevent
+
+from nti.app.learning_network import render
+
+from nti.app.learning_network.render import GraphvizRenderer
+from nti.app.learning_network.render import ForceDirectedRenderer
+
+
+class _Graph(object):
+
+    def string(self):
+        return u'digraph {}'
+
+
+class _Process(object):
+    """
+    A neato process that hangs on `slow` graphs and fails `bad` ones.
+    """
+
+    running = 0
+    max_running = 0
+
+    def __init__(self, args, **unused_kwargs):
+        self.out_path = args[-1]
+        self.killed = False
+        self.returncode = None
+        # Started writing
+        open(self.out_path, 'w').close()
+
+    def kill(self):
+        self.killed = True
+
+    def communicate(self, unused_data=None, timeout=None):
+        if self.killed:
+            return b'', b''
+        cls = type(self)
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        try:
+            gevent.sleep(0.01)
+            if 'slow' in self.out_path:
+                raise render.TimeoutExpired('neato', timeout)
+        finally:
+            cls.running -= 1
+        self.returncode = 1 if 'bad' in self.out_path else 0
+        return b'', b'error' if self.returncode else b''
+
+
+class TestRender(unittest.TestCase):
+
+    nodes_edges = {
+        1: {2: 'CommentViewed', 3: None},
+        2: {1: 'NoteViewed'},
+        4: {},
+    }
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_force_directed(self):
+        renderer = ForceDirectedRenderer(concurrency=2)
+        try:
+            jobs = [(self.nodes_edges, os.path.join(self.tmp_dir, '%s.svg' % x))
+                    for x in range(3)]
+            rendered = renderer.render(jobs)
+            assert_that(sorted(rendered), is_(sorted(x[1] for x in jobs)))
+            with open(rendered[0], 'rb') as fp:
+                assert_that(fp.read(), contains_string(b'<svg'))
+
+            # Our worker processes are kept for the next graphs.
+            assert_that(renderer.workers.qsize(), is_(2))
+            pids = sorted(x.process.pid for x in renderer.workers.queue)
+            jobs = [(self.nodes_edges, os.path.join(self.tmp_dir, 'again%s.svg' % x))
+                    for x in range(3)]
+            assert_that(renderer.render(jobs), has_length(3))
+            assert_that(sorted(x.process.pid for x in renderer.workers.queue),
+                        is_(pids))
+        finally:
+            renderer.close()
+        assert_that(renderer.workers.qsize(), is_(0))
+
+    def test_force_directed_timeout(self):
+        renderer = ForceDirectedRenderer(timeout=0.001)
+        try:
+            file_path = os.path.join(self.tmp_dir, 'graph.svg')
+            assert_that(renderer.render([(self.nodes_edges, file_path)]), is_([]))
+            assert_that(os.listdir(self.tmp_dir), is_([]))
+            # The killed worker is not kept.
+            assert_that(renderer.workers.qsize(), is_(0))
+        finally:
+            renderer.close()
+
+    def test_graphviz(self):
+        old = render.Popen, render.AGraph, render._build_graph
+        render.Popen = _Process
+        render.AGraph = object
+        render._build_graph = lambda unused_nodes_edges: _Graph()
+        try:
+            renderer = GraphvizRenderer(concurrency=2, timeout=5)
+            names = ('good1.png', 'slow.png', 'bad.png', 'good2.png')
+            jobs = [(self.nodes_edges, os.path.join(self.tmp_dir, x))
+                    for x in names]
+            rendered = renderer.render(jobs)
+        finally:
+            render.Popen, render.AGraph, render._build_graph = old
+        # Slow (killed) and failed renders leave nothing behind.
+        assert_that(sorted(rendered), is_(sorted((jobs[0][1], jobs[3][1]))))
+        assert_that(sorted(os.listdir(self.tmp_dir)),
+                    is_(['good1.png', 'good2.png']))
+        assert_that(_Process.max_running, is_(2))
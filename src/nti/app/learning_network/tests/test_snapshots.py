@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import contains
+from hamcrest import assert_that
+
+import os
+import unittest
+
+from datetime import datetime
+
+from zope import component
+
+from nti.app.learning_network import snapshots
+
+from nti.app.learning_network.interfaces import IStatsSnapshots
+
+from nti.app.learning_network.snapshots import SNAPSHOT_TTL_ENV
+from nti.app.learning_network.snapshots import DEFAULT_SNAPSHOT_TTL
+
+from nti.app.learning_network.snapshots import StatsSnapshots
+
+from nti.app.learning_network.snapshots import get_stats_with_snapshots
+
+from nti.app.learning_network.tests.fakes import FakeUser
+from nti.app.learning_network.tests.fakes import FakeRedis
+
+from nti.dataserver.interfaces import IRedisClient
+
+
+class _Source(object):
+
+    def __init__(self, display_name, count):
+        self.display_name = display_name
+        self.count = count
+
+    def toExternalObject(self, **unused_kwargs):
+        return {'count': self.count}
+
+
+class TestSnapshots(unittest.TestCase):
+
+    window = (datetime(2017, 1, 1), None)
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        component.getGlobalSiteManager().registerUtility(self.redis, IRedisClient)
+
+    def tearDown(self):
+        component.getGlobalSiteManager().unregisterUtility(self.redis, IRedisClient)
+
+    def test_ttl(self):
+        old = os.environ.pop(SNAPSHOT_TTL_ENV, None)
+        try:
+            assert_that(StatsSnapshots().ttl, is_(DEFAULT_SNAPSHOT_TTL))
+            os.environ[SNAPSHOT_TTL_ENV] = '60'
+            assert_that(StatsSnapshots().ttl, is_(60))
+            os.environ[SNAPSHOT_TTL_ENV] = 'soon'
+            assert_that(StatsSnapshots().ttl, is_(DEFAULT_SNAPSHOT_TTL))
+            assert_that(StatsSnapshots(10).ttl, is_(10))
+        finally:
+            os.environ.pop(SNAPSHOT_TTL_ENV, None)
+            if old is not None:
+                os.environ[SNAPSHOT_TTL_ENV] = old
+
+    def test_get_set(self):
+        store = StatsSnapshots(ttl=30)
+        assert_that(store.get(None, ['user1'], self.window), is_({}))
+        store.set(None, 'user1', self.window,
+                  (_Source('Access', 1), _Source('Production', 2)))
+        store.set(None, 'user2', self.window, (_Source('Access', 3),))
+        assert_that(set(self.redis.ttls.values()), is_({30}))
+
+        result = store.get(None, ['user1', 'user2', 'user3'], self.window)
+        assert_that(sorted(result), is_(['user1', 'user2']))
+        # In source order
+        assert_that(list(result['user1'].items()),
+                    contains(('Access', {'count': 1}),
+                             ('Production', {'count': 2})))
+        # Other windows are not served.
+        assert_that(store.get(None, ['user1'], (None, None)), is_({}))
+
+        # A partially expired snapshot is not served.
+        del self.redis.values[store._get_key(None, 'user1', self.window, 'Production')]
+        result = store.get(None, ['user1', 'user2'], self.window)
+        assert_that(sorted(result), is_(['user2']))
+
+    def test_refresh(self):
+        store = StatsSnapshots()
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(store, IStatsSnapshots)
+        computed = []
+
+        def _get_stats_for_users(unused_course, users, *unused_args):
+            computed.extend(x.username for x in users)
+            return [(x, (_Source('Access', len(computed)),)) for x in users]
+
+        old = snapshots.get_stats_for_users
+        snapshots.get_stats_for_users = _get_stats_for_users
+        try:
+            users = (FakeUser('user1'), FakeUser('user2'))
+            get_stats_with_snapshots(None, users[:1], *self.window)
+            assert_that(computed, is_(['user1']))
+
+            # Only missing users are computed; snapshots are externalized.
+            result = get_stats_with_snapshots(None, users, *self.window)
+            assert_that(computed, is_(['user1', 'user2']))
+            assert_that(result[0][1]['Access'], is_({'count': 1}))
+            assert_that(result[1][1]['Access'].count, is_(2))
+
+            # Unless refreshed
+            result = get_stats_with_snapshots(None, users, *self.window,
+                                              refresh=True)
+            assert_that(computed, is_(['user1', 'user2', 'user1', 'user2']))
+            assert_that(result[0][1]['Access'].count, is_(4))
+            result = get_stats_with_snapshots(None, users, *self.window)
+            assert_that(result[0][1]['Access'], is_({'count': 4}))
+        finally:
+            snapshots.get_stats_for_users = old
+            gsm.unregisterUtility(store, IStatsSnapshots)
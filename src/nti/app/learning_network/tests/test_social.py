@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import calling
+from hamcrest import raises
+from hamcrest import assert_that
+
+import random
+import unittest
+
+from collections import namedtuple
+
+from zope import component
+from zope import interface
+
+from nti.app.learning_network import social
+
+from nti.app.learning_network.interfaces import ISocialEdgeSource
+
+from nti.app.learning_network.social import NOTE_VIEWED
+from nti.app.learning_network.social import COMMENT_VIEWED
+
+from nti.app.learning_network.social import SocialEdge
+from nti.app.learning_network.social import NoteViewEdgeSource
+from nti.app.learning_network.social import TopicViewEdgeSource
+
+from nti.app.learning_network.social import iter_social_edges
+
+_TopicView = namedtuple('_TopicView', ('user_id', 'topic_id', 'timestamp'))
+
+_Comment = namedtuple('_Comment', ('comment_id', 'user_id', 'topic_id', 'timestamp'))
+
+_NoteView = namedtuple('_NoteView', ('user_id', 'Note', 'timestamp'))
+
+_UserRecord = namedtuple('_UserRecord', ('user_id',))
+
+
+def _scan_topic_views(views, comments, users):
+    """
+    The former join of each view to every comment of its topic, keeping a
+    set of the (user, comment) pairs seen.
+    """
+    topic_comments = dict()
+    for comment in comments:
+        topic_comments.setdefault(comment.topic_id, []).append(comment)
+    seen_comments = set()
+    for view in sorted(views, key=lambda x: x.timestamp):
+        if view.user_id not in users:
+            continue
+        for comment in topic_comments.get(view.topic_id, ()):
+            key = (view.user_id, comment.comment_id)
+            if comment.timestamp < view.timestamp and key not in seen_comments:
+                seen_comments.add(key)
+                yield SocialEdge(view.user_id, comment.user_id,
+                                 view.timestamp, COMMENT_VIEWED)
+
+
+class TestTopicViewEdges(unittest.TestCase):
+
+    def _iter_edges(self, views, comments, users):
+        old_views = social.get_topic_views
+        old_comments = social.get_forum_comments
+        social.get_topic_views = lambda **unused_kwargs: views
+        social.get_forum_comments = lambda **unused_kwargs: comments
+        try:
+            return list(TopicViewEdgeSource(None).iter_edges(users))
+        finally:
+            social.get_topic_views = old_views
+            social.get_forum_comments = old_comments
+
+    def test_edges(self):
+        comments = [_Comment(1, 10, 'topic1', 5),
+                    _Comment(2, 11, 'topic1', 1),
+                    _Comment(3, 12, 'topic1', 5),
+                    _Comment(4, 13, 'topic2', 3)]
+        # Out of order, with views at the same time as comments and each
+        # other.
+        views = [_TopicView(1, 'topic1', 6),
+                 _TopicView(1, 'topic1', 5),
+                 _TopicView(2, 'topic1', 5),
+                 _TopicView(2, 'topic2', 5),
+                 _TopicView(2, 'topic1', 5),
+                 _TopicView(3, 'topic1', 9),  # Not a requested user
+                 _TopicView(1, 'topic3', 2)]
+        users = {1: 'user1', 2: 'user2'}
+        edges = self._iter_edges(views, comments, users)
+        assert_that(edges,
+                    is_([SocialEdge(1, 11, 5, COMMENT_VIEWED),
+                         SocialEdge(2, 11, 5, COMMENT_VIEWED),
+                         SocialEdge(2, 13, 5, COMMENT_VIEWED),
+                         SocialEdge(1, 10, 6, COMMENT_VIEWED),
+                         SocialEdge(1, 12, 6, COMMENT_VIEWED)]))
+        assert_that(sorted(edges),
+                    is_(sorted(_scan_topic_views(views, comments, users))))
+
+    def test_matches_scan(self):
+        rand = random.Random(1323)
+        for _ in range(20):
+            comments = [_Comment(idx, rand.randint(1, 10), rand.randint(1, 3),
+                                 rand.randint(0, 20))
+                        for idx in range(rand.randint(0, 30))]
+            views = [_TopicView(rand.randint(1, 10), rand.randint(1, 4),
+                                rand.randint(0, 20))
+                     for _ in range(rand.randint(0, 50))]
+            users = dict((x, 'user%s' % x) for x in range(1, 8))
+            edges = self._iter_edges(views, comments, users)
+            # Views (and so edges) are in timestamp order.
+            assert_that(edges, is_(sorted(edges, key=lambda x: x.timestamp)))
+            assert_that(sorted(edges),
+                        is_(sorted(_scan_topic_views(views, comments, users))))
+
+
+class _ICourse(interface.Interface):
+    pass
+
+
+@interface.implementer(_ICourse)
+class _Course(object):
+    pass
+
+
+class _EdgeSource(object):
+
+    edges = ()
+
+    def __init__(self, course):
+        self.course = course
+
+    def iter_edges(self, unused_users, unused_start_time=None, unused_end_time=None):
+        return iter(self.edges)
+
+
+class _FirstSource(_EdgeSource):
+    # Targets are not comparable, so edges must never be compared.
+    edges = (SocialEdge(1, object(), 1, 'first'),
+             SocialEdge(1, object(), 3, 'first'),
+             SocialEdge(0, object(), 3, 'first'))
+
+
+class _SecondSource(_EdgeSource):
+    edges = (SocialEdge(2, object(), 0, 'second'),
+             SocialEdge(2, object(), 3, 'second'),
+             SocialEdge(2, object(), 4, 'second'))
+
+
+class TestSocialEdges(unittest.TestCase):
+
+    def test_merge(self):
+        gsm = component.getGlobalSiteManager()
+        sources = (_FirstSource, _SecondSource)
+        for factory in sources:
+            gsm.registerSubscriptionAdapter(factory, (_ICourse,), ISocialEdgeSource)
+        try:
+            edges = list(iter_social_edges(_Course(), {}))
+        finally:
+            for factory in sources:
+                gsm.unregisterSubscriptionAdapter(factory, (_ICourse,),
+                                                  ISocialEdgeSource)
+        # In time order; ties by source, then as emitted.
+        first, second = _FirstSource.edges, _SecondSource.edges
+        assert_that(edges, is_([second[0], first[0], first[1], first[2],
+                                second[1], second[2]]))
+        assert_that(calling(sorted).with_args(first), raises(TypeError))
+
+
+class _Note(object):
+
+    def __init__(self, intid, creator, created, readers=(), referents=()):
+        self._ds_intid = intid
+        self.creator = creator
+        self.created = created
+        self.readers = readers
+        self.referents = referents
+
+
+class TestNoteViewEdges(unittest.TestCase):
+
+    def test_edges(self):
+        parent = _Note(1, u'author1', 1, readers=(u'user1', u'user2'))
+        reply = _Note(2, u'author2', 2, readers=(u'user1', u'user2'),
+                      referents=(parent,))
+        private = _Note(3, u'author1', 1, readers=(u'user2',))
+        later = _Note(4, u'author2', 8, readers=(u'user1',))
+        views = [_NoteView(10, reply, 5),
+                 _NoteView(10, parent, 3),
+                 _NoteView(10, private, 4),
+                 _NoteView(11, private, 4),
+                 _NoteView(11, reply, 6),
+                 _NoteView(10, later, 7),
+                 _NoteView(10, later, 9),  # Only the first view counts
+                 _NoteView(12, parent, 5),  # Not a requested user
+                 _NoteView(10, None, 5)]
+        users = {10: u'user1', 11: u'user2'}
+        user_ids = {u'author1': 20, u'author2': 21}
+
+        checks = []
+        records = []
+
+        def _has_permission(unused_permission, note, username):
+            checks.append((username, note._ds_intid))
+            return username in note.readers
+
+        def _get_user_record(username):
+            records.append(username)
+            return _UserRecord(user_ids[username])
+
+        old = (social.get_note_views, social.has_permission,
+               social.get_user_record)
+        social.get_note_views = lambda **unused_kwargs: views
+        social.has_permission = _has_permission
+        social.get_user_record = _get_user_record
+        try:
+            edges = list(NoteViewEdgeSource(None).iter_edges(users))
+        finally:
+            (social.get_note_views, social.has_permission,
+             social.get_user_record) = old
+
+        assert_that(edges,
+                    is_([SocialEdge(10, 20, 3, NOTE_VIEWED),
+                         SocialEdge(11, 20, 4, NOTE_VIEWED),
+                         SocialEdge(10, 21, 5, NOTE_VIEWED),
+                         SocialEdge(11, 21, 6, NOTE_VIEWED),
+                         SocialEdge(11, 20, 6, NOTE_VIEWED)]))
+        # Permissions are checked once per (user, note) and creators looked
+        # up once.
+        assert_that(sorted(checks),
+                    is_([(u'user1', 1), (u'user1', 2), (u'user1', 3),
+                         (u'user2', 1), (u'user2', 2), (u'user2', 3)]))
+        assert_that(sorted(records), is_([u'author1', u'author2']))
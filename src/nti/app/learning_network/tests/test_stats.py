@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import contains
+from hamcrest import has_length
+from hamcrest import assert_that
+from hamcrest import same_instance
+
+import csv
+import unittest
+
+import gevent
+
+from six import StringIO
+
+from zope import component
+from zope import interface
+
+from zope.intid.interfaces import IIntIds
+
+from nti.analytics.stats.interfaces import IStats
+
+from nti.app.learning_network.stats import StatsWorkerPool
+
+from nti.app.learning_network.stats import iter_chunks
+from nti.app.learning_network.stats import get_source_schema
+
+from nti.dataserver.interfaces import IDataserverTransactionRunner
+
+
+@interface.implementer(IStats)
+class _Stats(object):
+
+    def __init__(self, count, total):
+        self.count = count
+        self.total = total
+        self.parameters = {}
+
+
+class _Source(object):
+
+    display_name = 'Production'
+
+    def __init__(self, note_stats, comment_stats):
+        self.note_stats = note_stats
+        self.comment_stats = comment_stats
+        self.other = 'ignored'
+
+
+class _AccessSource(object):
+
+    display_name = 'Access'
+
+    def __init__(self, forum_stats, video_stats):
+        self.forum_stats = forum_stats
+        self.video_stats = video_stats
+
+
+def _get_stat_map(sources):
+    """
+    The former type->stat->stat_field map of our csv export, built from the
+    first sources.
+    """
+    result = {}
+    for source in sources:
+        result[source.display_name] = stat_map = {}
+        for source_var in dir(source):
+            if source_var.startswith('_'):
+                continue
+            stat = getattr(source, source_var)
+            if IStats.providedBy(stat):
+                stat_map[source_var] = [x for x in vars(stat)
+                                        if not x.startswith('_') and x != 'parameters']
+    return result
+
+
+def _write_dict_rows(all_sources):
+    """
+    The former csv export of stats: sorted headers per source, and a dict
+    per row of `'` prefixed values written by a `DictWriter`.
+    """
+    stream = StringIO()
+    stat_map = _get_stat_map(all_sources[0])
+    headers = []
+    for source in all_sources[0]:
+        source_headers = []
+        for stat_name, stat_vars in stat_map[source.display_name].items():
+            source_headers.extend('%s_%s_%s' % (source.display_name, stat_name, x)
+                                  for x in stat_vars)
+        headers.extend(sorted(source_headers))
+    writer = csv.DictWriter(stream, headers)
+    writer.writeheader()
+    for sources in all_sources:
+        row = {}
+        for source in sources:
+            for stat_name, stat_vars in stat_map[source.display_name].items():
+                stat = getattr(source, stat_name)
+                for stat_var in stat_vars:
+                    value = getattr(stat, stat_var) if stat is not None else ''
+                    header = '%s_%s_%s' % (source.display_name, stat_name, stat_var)
+                    row[header] = "'%s" % value
+        writer.writerow(row)
+    return stream.getvalue()
+
+
+def _write_schema_rows(all_sources):
+    stream = StringIO()
+    writer = csv.writer(stream)
+    schemas = {}
+    headers = []
+    for source in all_sources[0]:
+        headers.extend(get_source_schema(source, schemas).headers)
+    writer.writerow(headers)
+    for sources in all_sources:
+        row = []
+        for source in sources:
+            schema = get_source_schema(source, schemas)
+            row.extend("'%s" % x for x in schema.values(source))
+        writer.writerow(row)
+    return stream.getvalue()
+
+
+class _Object(object):
+
+    def __init__(self, name, intid):
+        self.name = name
+        self.intid = intid
+
+
+class _IntIds(object):
+
+    def __init__(self, objects):
+        self.objects = {x.intid: x for x in objects}
+
+    def getId(self, obj):
+        return obj.intid
+
+    def getObject(self, uid):
+        return self.objects[uid]
+
+
+class _Runner(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, func, site_names=(), side_effect_free=False):
+        self.calls.append((site_names, side_effect_free))
+        # Let the other workers run.
+        gevent.sleep(0)
+        return func()
+
+
+class _ConcurrentPool(StatsWorkerPool):
+
+    concurrent = True
+
+
+class TestStats(unittest.TestCase):
+
+    def test_iter_chunks(self):
+        chunks = list(iter_chunks(range(5), 2))
+        assert_that(chunks, contains([0, 1], [2, 3], [4]))
+        assert_that(list(iter_chunks((), 2)), is_([]))
+
+    def test_source_schema(self):
+        source = _Source(_Stats(1, 2), _Stats(3, 4))
+        schema = get_source_schema(source)
+        assert_that(schema.headers,
+                    contains('Production_comment_stats_count',
+                             'Production_comment_stats_total',
+                             'Production_note_stats_count',
+                             'Production_note_stats_total'))
+        assert_that(schema.values(source), is_((3, 4, 1, 2)))
+
+        # Only cached in the given schemas, per class; missing stats are
+        # empty.
+        schemas = {}
+        schema = get_source_schema(source, schemas)
+        other = _Source(_Stats(5, 6), None)
+        assert_that(get_source_schema(other, schemas), same_instance(schema))
+        assert_that(schema.values(other), is_(('', '', 5, 6)))
+        assert_that(get_source_schema(source) is schema, is_(False))
+
+        # Stat fields may vary by instance between requests.
+        source.note_stats.average = 1.5
+        assert_that(get_source_schema(source).headers,
+                    has_length(5))
+        assert_that(get_source_schema(source, schemas).headers,
+                    has_length(4))
+
+    def test_source_schema_missing_stats(self):
+        # The first instance seen is missing a stat.
+        source = _Source(None, _Stats(3, 4))
+        source.display_name = 'Production2'
+        schemas = {}
+        schema = get_source_schema(source, schemas)
+        assert_that(schema.complete, is_(False))
+        assert_that(schema.headers,
+                    contains('Production2_comment_stats_count',
+                             'Production2_comment_stats_total'))
+
+        # So is not cached for the next, complete, instance.
+        other = _Source(_Stats(1, 2), _Stats(3, 4))
+        other.display_name = 'Production2'
+        other_schema = get_source_schema(other, schemas)
+        assert_that(other_schema.complete, is_(True))
+        assert_that(other_schema.headers, has_length(4))
+        assert_that(get_source_schema(other, schemas), same_instance(other_schema))
+
+        # Sources of the same class with another name have their own.
+        renamed = _Source(_Stats(1, 2), _Stats(3, 4))
+        renamed.display_name = 'Renamed'
+        assert_that(get_source_schema(renamed, schemas).headers[0],
+                    is_('Renamed_comment_stats_count'))
+
+    def test_source_schema_rows(self):
+        # Our rows match those the export wrote from dicts, byte for byte.
+        all_sources = []
+        for idx in range(4):
+            note_stats = _Stats(idx, idx * 1.5)
+            note_stats.average = None
+            video_stats = _Stats(u'\u00e9%s' % idx, 'a,"b"')
+            if idx == 2:
+                # A missing stat
+                video_stats = None
+            all_sources.append((_Source(note_stats, _Stats(-idx, 0)),
+                                _AccessSource(_Stats(idx, 10 ** 12), video_stats)))
+        result = _write_schema_rows(all_sources)
+        assert_that(result, is_(_write_dict_rows(all_sources)))
+        assert_that(result.splitlines(), has_length(5))
+
+    def test_worker_pool(self):
+        course = _Object('course', 0)
+        users = [_Object('user%s' % x, x) for x in range(1, 6)]
+        # Workers resolve their own copies of the objects.
+        worker_objects = [_Object('worker_' + x.name, x.intid) for x in [course] + users]
+        intids = _IntIds(worker_objects)
+        runner = _Runner()
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(intids, IIntIds)
+        gsm.registerUtility(runner, IDataserverTransactionRunner)
+        try:
+            def _func(user, course):
+                return user.name, course.name
+
+            pool = _ConcurrentPool(3)
+            assert_that(pool.size, is_(3))
+            result = list(pool.imap(_func, users, course))
+            # In order, each in its own transaction.
+            assert_that(result,
+                        is_([('worker_user%s' % x, 'worker_course') for x in range(1, 6)]))
+            assert_that(runner.calls, is_([((None,), True)] * 5))
+
+            pool = StatsWorkerPool(1)
+            result = list(pool.imap(_func, users, course))
+            assert_that(result, is_([('user%s' % x, 'course') for x in range(1, 6)]))
+            assert_that(runner.calls, has_length(5))
+        finally:
+            gsm.unregisterUtility(intids, IIntIds)
+            gsm.unregisterUtility(runner, IDataserverTransactionRunner)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import assert_that
+
+import unittest
+
+from zope import component
+from zope import interface
+
+from zope.intid.interfaces import IIntIds
+
+from nti.app.assessment.index import IX_COURSE
+from nti.app.assessment.index import IX_ASSESSMENT_ID
+
+from nti.app.assessment.interfaces import IUsersCourseInquiryItem
+
+from nti.app.learning_network import surveys
+
+from nti.app.learning_network.surveys import get_course_survey_submissions
+
+from nti.app.learning_network.tests.fakes import FakeUser
+
+from nti.contenttypes.courses.interfaces import ICourseCatalogEntry
+
+
+@interface.implementer(ICourseCatalogEntry)
+class _Course(object):
+
+    def __init__(self, ntiid):
+        self.ntiid = ntiid
+
+
+class _Item(object):
+
+    def __init__(self, intid, course, creator, survey_ntiid):
+        self.intid = intid
+        self.course = course
+        self.creator = creator
+        self.__name__ = survey_ntiid
+
+
+@interface.implementer(IUsersCourseInquiryItem)
+class _InquiryItem(_Item):
+    pass
+
+
+class _IntIds(object):
+
+    def __init__(self, items):
+        self.items = {x.intid: x for x in items}
+
+    def getObject(self, uid):
+        return self.items[uid]
+
+    def queryObject(self, uid, default=None):
+        return self.items.get(uid, default)
+
+
+class _Catalog(object):
+
+    def __init__(self, items):
+        self.items = items
+        self.queries = []
+
+    def apply(self, query):
+        self.queries.append(query)
+        courses = query[IX_COURSE]['any_of']
+        ntiids = query[IX_ASSESSMENT_ID]['any_of']
+        return [x.intid for x in self.items
+                if x.course.ntiid in courses and x.__name__ in ntiids]
+
+
+class TestSurveys(unittest.TestCase):
+
+    def test_submissions(self):
+        course, other = _Course(u'course'), _Course(u'other')
+        users = [FakeUser(u'User%s' % x) for x in range(4)]
+        items = [_InquiryItem(1, course, users[0], u'survey1'),
+                 _InquiryItem(2, course, users[0], u'survey2'),
+                 _InquiryItem(3, course, users[1], u'survey1'),
+                 _InquiryItem(4, other, users[2], u'survey1'),
+                 # Not an inquiry
+                 _Item(5, course, users[3], u'survey1'),
+                 # Not a requested survey
+                 _InquiryItem(6, course, users[3], u'survey3')]
+
+        # The submissions each user's course inquiry holds.
+        inquiries = {}
+        for item in items:
+            if IUsersCourseInquiryItem.providedBy(item):
+                key = (item.course.ntiid, item.creator.username)
+                inquiries.setdefault(key, {})[item.__name__] = item
+
+        catalog = _Catalog(items)
+        intids = _IntIds(items)
+        gsm = component.getGlobalSiteManager()
+        gsm.registerUtility(intids, IIntIds)
+        old = surveys.get_submission_catalog
+        surveys.get_submission_catalog = lambda: catalog
+        try:
+            result = get_course_survey_submissions(course, (u'survey1', u'survey2'))
+            surveys.get_submission_catalog = lambda: None
+            assert_that(get_course_survey_submissions(course, (u'survey1',)),
+                        is_(none()))
+        finally:
+            surveys.get_submission_catalog = old
+            gsm.unregisterUtility(intids, IIntIds)
+
+        # A single query
+        assert_that(catalog.queries,
+                    is_([{IX_COURSE: {'any_of': (u'course',)},
+                          IX_ASSESSMENT_ID: {'any_of': (u'survey1', u'survey2')}}]))
+        # Matching the submissions found user by user.
+        for survey_ntiid in (u'survey1', u'survey2'):
+            for user in users:
+                inquiry = inquiries.get((u'course', user.username), {})
+                assert_that(result[survey_ntiid].get(user.username.lower()),
+                            is_(inquiry.get(survey_ntiid)))
+        assert_that(result, is_({u'survey1': {u'user0': items[0], u'user1': items[2]},
+                                 u'survey2': {u'user0': items[1]}}))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+# pylint: disable=protected-access,too-many-public-methods
+
+from hamcrest import is_
+from hamcrest import none
+from hamcrest import has_length
+from hamcrest import assert_that
+
+import unittest
+
+from collections import namedtuple
+
+from zope import component
+from zope import interface
+
+from zope.intid.interfaces import IIntIds
+
+from nti.app.learning_network import users
+
+from nti.app.learning_network.users import UserInfo
+
+from nti.app.learning_network.users import prefetch_users
+from nti.app.learning_network.users import get_user_records
+
+from nti.dataserver.users.interfaces import IUserProfile
+
+from nti.mailer.interfaces import IEmailAddressable
+
+_Record = namedtuple('_Record', ('user_ds_id', 'user_id'))
+
+
+@interface.implementer(IUserProfile, IEmailAddressable)
+class _User(object):
+
+    def __init__(self, username, intid=None):
+        self.username = username
+        self.intid = intid
+        self.email = u'%s@example.com' % username
+
+
+class _IntIds(object):
+
+    def queryId(self, obj):
+        return obj.intid
+
+
+class _Column(object):
+
+    def __init__(self):
+        self.queries = []
+
+    def in_(self, values):
+        self.queries.append(sorted(values))
+        return values
+
+
+class _Query(object):
+
+    def __init__(self, records):
+        self.records = records
+
+    def filter(self, ds_ids):
+        return [x for x in self.records if x.user_ds_id in ds_ids]
+
+
+class _Session(object):
+
+    def __init__(self, records):
+        self.records = records
+
+    def query(self, unused_table):
+        return _Query(self.records)
+
+
+class _DB(object):
+
+    def __init__(self, records):
+        self.session = _Session(records)
+
+
+class TestUsers(unittest.TestCase):
+
+    def setUp(self):
+        self.intids = _IntIds()
+        component.getGlobalSiteManager().registerUtility(self.intids, IIntIds)
+        # Users 1 and 2 have analytics records.
+        self.db = _DB([_Record(1, 101), _Record(2, 102), _Record(9, 109)])
+        self.fallback = []
+        self.users = {u'user%s' % x: _User(u'user%s' % x, x) for x in range(1, 4)}
+        self.users[u'nointid'] = _User(u'nointid')
+        self._old = (users.get_analytics_db, users.Users,
+                     users.get_user_record, users.User)
+        column = self.column = _Column()
+
+        class _Users(object):
+            user_ds_id = column
+
+        class _UserClass(object):
+            get_user = staticmethod(self.users.get)
+
+        users.get_analytics_db = lambda: self.db
+        users.Users = _Users
+        users.get_user_record = self._get_user_record
+        users.User = _UserClass
+
+    def tearDown(self):
+        (users.get_analytics_db, users.Users,
+         users.get_user_record, users.User) = self._old
+        component.getGlobalSiteManager().unregisterUtility(self.intids, IIntIds)
+
+    def _get_user_record(self, user):
+        self.fallback.append(user.username)
+        if user.username == u'nointid':
+            return _Record(None, 200)
+        return None
+
+    def test_get_user_records(self):
+        found = [self.users[x] for x in (u'user3', u'user1', u'nointid', u'user2')]
+        records = get_user_records(found)
+        # A single query for the users with intids.
+        assert_that(self.column.queries, is_([[1, 2, 3]]))
+        assert_that(records, is_({u'user1': _Record(1, 101),
+                                  u'user2': _Record(2, 102),
+                                  u'nointid': _Record(None, 200)}))
+        # The rest fall back to the standard lookup.
+        assert_that(self.fallback, is_([u'user3', u'nointid']))
+
+        # No query without intids.
+        self.fallback = []
+        records = get_user_records([self.users[u'nointid']])
+        assert_that(self.column.queries, is_([[1, 2, 3]]))
+        assert_that(records, is_({u'nointid': _Record(None, 200)}))
+
+    def test_prefetch_users(self):
+        user2 = self.users[u'user2']
+        result = prefetch_users([u'user3', u'missing', user2, u'user1'])
+        # In order, with None for users not found.
+        assert_that([getattr(x, 'username', None) for x in result],
+                    is_([u'user3', None, u'user2', u'user1']))
+        assert_that(result[1], is_(none()))
+        assert_that(result[2],
+                    is_(UserInfo(u'user2', user2, u'user2@example.com',
+                                 u'user2@example.com', _Record(2, 102))))
+        assert_that(result[0].user_record, is_(none()))
+        assert_that(result[3].user_record, is_(_Record(1, 101)))
+        assert_that(self.column.queries, is_([[1, 2, 3]]))
+
+        result = prefetch_users([u'user1'], records=False, profiles=False)
+        assert_that(result,
+                    is_([UserInfo(u'user1', self.users[u'user1'], u'', None, None)]))
+        assert_that(self.column.queries, has_length(1))
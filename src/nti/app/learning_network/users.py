@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Batch resolution of the users (and their analytics records) we export.
+
+.. $Id$
+"""
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+
+from collections import namedtuple
+
+import six
+
+from ZODB.interfaces import IConnection
+
+from zope import component
+
+from zope.intid.interfaces import IIntIds
+
+from nti.analytics.database import get_analytics_db
+
+from nti.analytics.database.users import Users
+
+from nti.analytics.users import get_user_record
+
+from nti.dataserver.users.interfaces import IUserProfile
+
+from nti.dataserver.users.users import User
+
+from nti.mailer.interfaces import IEmailAddressable
+
+#: A resolved user; `profile_email` is the profile email we filter on and
+#: `email` the addressable email we export.
+UserInfo = namedtuple('UserInfo', ('username', 'user', 'profile_email',
+                                   'email', 'user_record'))
+
+logger = __import__('logging').getLogger(__name__)
+
+
+def prefetch_objects(objects):
+    """
+    Load the state of the given persistent objects in as few storage
+    round trips as the connection supports.
+    """
+    objects = [x for x in objects if x is not None]
+    connection = IConnection(objects[0], None) if objects else None
+    prefetch = getattr(connection, 'prefetch', None)
+    if prefetch is not None:
+        prefetch(objects)
+
+
+def get_user_records(users):
+    """
+    Return a dict of username to analytics user record for the given users,
+    fetched with a single query. Users without a record are omitted.
+    """
+    intids = component.getUtility(IIntIds)
+    ds_ids = {}
+    for user in users:
+        ds_id = intids.queryId(user)
+        if ds_id is not None:
+            ds_ids[ds_id] = user.username
+    result = {}
+    if ds_ids:
+        db = get_analytics_db()
+        records = db.session.query(Users).filter(Users.user_ds_id.in_(list(ds_ids)))
+        for record in records:
+            result[ds_ids[record.user_ds_id]] = record
+    # Anything we did not find falls back to the standard lookup.
+    for user in users:
+        if user.username not in result:
+            record = get_user_record(user)
+            if record is not None:
+                result[user.username] = record
+    return result
+
+
+def prefetch_users(users, records=True, profiles=True):
+    """
+    Resolve the given users (or usernames) in a batch, returning a list of
+    :class:`UserInfo` (or None, for users that cannot be found) in order.
+    The user objects and profiles are prefetched from the database and the
+    analytics records fetched in one query.
+    """
+    resolved = []
+    for user in users:
+        if isinstance(user, six.string_types):
+            user = User.get_user(user)
+        resolved.append(user)
+    found = [x for x in resolved if x is not None]
+    prefetch_objects(found)
+
+    user_profiles = {}
+    if profiles:
+        user_profiles = {x.username: IUserProfile(x, None) for x in found}
+        prefetch_objects(user_profiles.values())
+
+    user_records = get_user_records(found) if records and found else {}
+
+    result = []
+    for user in resolved:
+        if user is None:
+            result.append(None)
+            continue
+        username = user.username
+        profile = user_profiles.get(username)
+        profile_email = getattr(profile, 'email', '') or ''
+        email = None
+        if profiles:
+            addr = IEmailAddressable(user, None)
+            email = addr and addr.email
+        result.append(UserInfo(username, user, profile_email,
+                               email, user_records.get(username)))
+    return result